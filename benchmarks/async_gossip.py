@@ -0,0 +1,309 @@
+"""
+Benchmark of the wall-clock time to reach a target mean test accuracy with the synchronous
+`PremioFsmBehaviour` and with the asynchronous `GossipFsmBehaviour`. Both modes run the real FSM states
+(`TrainAndApplyConsensusState`, `CommunicationState` and `ConsensusState`, or `GossipState`) and the real
+`LayerReceiverBehaviour` and `SimilarityReceiverBehaviour` of `PmacoflMinAgent`s connected in a ring.
+Every agent trains a small MLP on a non-IID shard of the same synthetic task, and one of them takes
+`--slow-seconds` longer per training, during which it does not serve its layers.
+
+The messages do not go through XMPP: `send` and `send_stream` deliver the bodies to in-memory mailboxes
+of the receiver after `--latency-seconds`, and `receive_all` reads them. The synchronous FSM waits in
+`CommunicationState` for the similarity vectors it requests (one round trip per consensus iteration,
+or `wait_for_responses_timeout` if a reply is lost), while the gossip FSM requests them without waiting
+and uses them in the next iterations. The `ConsensusState` wait of the synchronous FSM does not block,
+because the responses it waits for are never registered, so the similarity exchange is its only barrier.
+The times include the serialization of the messages, but not the XMPP server.
+
+Usage: python benchmarks/async_gossip.py [--agents 6] [--slow-seconds 0.5] [--latency-seconds 0.05]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Iterable, Optional
+
+import torch
+from aioxmpp import JID
+from spade.behaviour import CyclicBehaviour
+from spade.message import Message
+from torch import nn
+from torch.optim import Adam
+from torch.utils.data import DataLoader, TensorDataset
+
+from macofl.agent.premiofl.pmacofl_min import PmacoflMinAgent
+from macofl.behaviour.premiofl import LayerReceiverBehaviour
+from macofl.datatypes.consensus_manager import ConsensusManager
+from macofl.datatypes.data import DataLoaders
+from macofl.datatypes.metrics import ModelMetrics
+from macofl.datatypes.models import ModelManager
+from macofl.message.message import RfMessage
+from macofl.nn.executor import TrainingExecutor
+from macofl.similarity.function import EuclideanDistanceFunction
+from macofl.similarity.similarity_manager import SimilarityManager
+
+IN_FEATURES = 20
+CLASSES = 4
+
+
+class SimulatedExecutor(TrainingExecutor):
+    """
+    Thread executor that keeps the model training `delay_seconds` longer and records the test accuracy.
+    """
+
+    def __init__(self, delay_seconds: float) -> None:
+        super().__init__(mode="thread", max_workers=1)
+        self.delay_seconds = delay_seconds
+        self.accuracy = 0.0
+        self.trainings = 0
+
+    async def train(
+        self, model_manager: ModelManager, *args: Any, **kwargs: Any
+    ) -> list[ModelMetrics]:
+        metrics = await super().train(model_manager, *args, **kwargs)
+        if self.delay_seconds > 0:
+            # A slow device: the layers are not served until the training finishes
+            with model_manager.training_session():
+                await asyncio.sleep(self.delay_seconds)
+        self.trainings += 1
+        return metrics
+
+    async def test_inference(self, model_manager: ModelManager) -> ModelMetrics:
+        metrics = await super().test_inference(model_manager)
+        self.accuracy = metrics.accuracy
+        return metrics
+
+
+class InMemoryNetwork:
+    def __init__(self, latency_seconds: float) -> None:
+        self.latency_seconds = latency_seconds
+        self.agents: dict[str, "InMemoryAgent"] = {}
+        self.messages = 0
+
+    def deliver(self, message: Message) -> None:
+        receiver = self.agents[str(message.to.bare())]
+        conversation = (message.metadata or {}).get("rf.conversation", "")
+        rf_message = RfMessage.from_message(
+            message=message, is_multipart=False, is_multipart_completed=False
+        )
+        self.messages += 1
+        asyncio.get_running_loop().call_later(
+            self.latency_seconds,
+            receiver.mailboxes[conversation].put_nowait,
+            rf_message,
+        )
+
+
+class InMemoryAgent(PmacoflMinAgent):
+    """
+    PmacoflMinAgent whose messages are delivered by an `InMemoryNetwork` instead of XMPP.
+    """
+
+    def __init__(self, network: InMemoryNetwork, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.network = network
+        self.mailboxes: dict[str, asyncio.Queue[RfMessage]] = {
+            "layers": asyncio.Queue(),
+            "similarity": asyncio.Queue(),
+        }
+        self.stopped = False
+        network.agents[str(self.jid.bare())] = self
+
+    def get_available_neighbours(self) -> list[JID]:
+        return list(self.neighbours)
+
+    async def send(
+        self, message: Message, behaviour: Optional[CyclicBehaviour] = None
+    ) -> None:
+        self.network.deliver(message)
+
+    async def send_stream(
+        self,
+        message: Message,
+        length: int,
+        pieces: Iterable[str],
+        behaviour: Optional[CyclicBehaviour] = None,
+    ) -> None:
+        message.body = "".join(pieces)
+        self.network.deliver(message)
+
+    async def receive_all(
+        self,
+        behaviour: CyclicBehaviour,
+        timeout: Optional[float] = 0,
+        max_messages: Optional[int] = None,
+    ) -> list[RfMessage]:
+        mailbox = self.mailboxes[
+            "layers" if isinstance(behaviour, LayerReceiverBehaviour) else "similarity"
+        ]
+        try:
+            messages = [await asyncio.wait_for(mailbox.get(), timeout=timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not mailbox.empty():
+            messages.append(mailbox.get_nowait())
+        return messages
+
+    async def stop(self) -> None:
+        self.stopped = True
+
+
+def build_agents(
+    mode: str,
+    num_agents: int,
+    samples: int,
+    slow_seconds: float,
+    latency_seconds: float,
+    max_staleness_seconds: float,
+    seed: int,
+) -> tuple[list[InMemoryAgent], list[SimulatedExecutor], InMemoryNetwork]:
+    generator = torch.Generator().manual_seed(seed)
+    teacher = torch.randn((IN_FEATURES, CLASSES), generator=generator)
+    x = torch.randn((samples * (num_agents + 1), IN_FEATURES), generator=generator)
+    y = torch.argmax(x @ teacher, dim=1)
+    test = TensorDataset(x[:samples], y[:samples])
+    # Non-IID shards: half of the training samples sorted by class, the other half shuffled
+    order = torch.randperm(samples * num_agents, generator=generator) + samples
+    half = samples * num_agents // 2
+    order[:half] = order[:half][torch.argsort(y[order[:half]], stable=True)]
+    order = order.reshape(2, num_agents, samples // 2).transpose(0, 1).reshape(-1)
+    jids = [JID.fromstr(f"a{i}@localhost") for i in range(num_agents)]
+    network = InMemoryNetwork(latency_seconds=latency_seconds)
+    agents: list[InMemoryAgent] = []
+    executors: list[SimulatedExecutor] = []
+    for i, jid in enumerate(jids):
+        torch.manual_seed(seed + i)
+        model = nn.Sequential(
+            nn.Linear(IN_FEATURES, 32), nn.ReLU(), nn.Linear(32, CLASSES)
+        )
+        shard = order[samples * i : samples * (i + 1)]
+        model_manager = ModelManager(
+            model=model,
+            criterion=nn.CrossEntropyLoss(),
+            optimizer=Adam(model.parameters(), lr=0.01),
+            batch_size=32,
+            training_epochs=1,
+            dataloaders=DataLoaders(
+                train=DataLoader(
+                    TensorDataset(x[shard], y[shard]), batch_size=32, shuffle=True
+                ),
+                validation=DataLoader(test, batch_size=256),
+                test=DataLoader(test, batch_size=256),
+            ),
+            seed=seed + i,
+            device="cpu",
+        )
+        executor = SimulatedExecutor(delay_seconds=slow_seconds if i == 0 else 0.0)
+        agents.append(
+            InMemoryAgent(
+                network=network,
+                jid=str(jid),
+                password="123",
+                max_message_size=250_000,
+                consensus_manager=ConsensusManager(
+                    model_manager=model_manager,
+                    max_order=2,
+                    max_seconds_to_accept_consensus=60,
+                ),
+                model_manager=model_manager,
+                similarity_manager=SimilarityManager(
+                    model_manager=model_manager,
+                    function=EuclideanDistanceFunction(),
+                    wait_for_responses_timeout=60,
+                ),
+                neighbours=[jids[i - 1], jids[(i + 1) % num_agents]],
+                max_rounds=None,
+                training_executor=executor,
+                gossip_max_staleness_seconds=(
+                    max_staleness_seconds if mode == "gossip" else None
+                ),
+            )
+        )
+        executors.append(executor)
+    return agents, executors, network
+
+
+async def run_agents(
+    agents: list[InMemoryAgent],
+    executors: list[SimulatedExecutor],
+    target_accuracy: float,
+    max_seconds: float,
+) -> Optional[float]:
+    async def run_behaviour(agent: InMemoryAgent, behaviour: CyclicBehaviour) -> None:
+        behaviour.set_agent(agent)
+        while not agent.stopped:
+            await behaviour.run()
+
+    async def run_fsm(agent: InMemoryAgent) -> None:
+        fsm = agent.fsm_behaviour
+        fsm.set_agent(agent)
+        fsm.setup()
+        while not agent.stopped:
+            await fsm._run()
+
+    tasks = [asyncio.create_task(run_fsm(agent)) for agent in agents]
+    for agent in agents:
+        for behaviour in (
+            agent.layer_receiver_behaviour,
+            agent.similarity_receiver_behaviour,
+        ):
+            tasks.append(asyncio.create_task(run_behaviour(agent, behaviour)))
+
+    start = time.perf_counter()
+    reached: Optional[float] = None
+    while time.perf_counter() - start < max_seconds:
+        if sum(e.accuracy for e in executors) / len(executors) >= target_accuracy:
+            reached = time.perf_counter() - start
+            break
+        await asyncio.sleep(0.01)
+    for agent in agents:
+        agent.stopped = True
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return reached
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--agents", type=int, default=6)
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--slow-seconds", type=float, default=0.5)
+    parser.add_argument("--latency-seconds", type=float, default=0.05)
+    parser.add_argument("--target-accuracy", type=float, default=0.8)
+    parser.add_argument("--max-seconds", type=float, default=60.0)
+    parser.add_argument("--max-staleness-seconds", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':>7} {'seconds':>10} {'trainings':>10} {'messages':>9} {'accuracy':>9}"
+    )
+    for mode in ("sync", "gossip"):
+        random.seed(args.seed)
+        agents, executors, network = build_agents(
+            mode=mode,
+            num_agents=args.agents,
+            samples=args.samples,
+            slow_seconds=args.slow_seconds,
+            latency_seconds=args.latency_seconds,
+            max_staleness_seconds=args.max_staleness_seconds,
+            seed=args.seed,
+        )
+        try:
+            seconds = asyncio.run(
+                run_agents(agents, executors, args.target_accuracy, args.max_seconds)
+            )
+        finally:
+            for executor in executors:
+                executor.shutdown()
+        elapsed = "timeout" if seconds is None else f"{seconds:.3f}"
+        trainings = sum(e.trainings for e in executors)
+        accuracy = sum(e.accuracy for e in executors) / len(executors)
+        print(
+            f"{mode:>7} {elapsed:>10} {trainings:>10} {network.messages:>9} {accuracy:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark of the MultipartHandler reassembly. It splits payloads from 1 MB to 200 MB into parts
+of `max_message_size` characters, shuffles them and measures the time needed to rebuild the
+original content. Linear scaling shows up as a constant time per MB.
+
+Usage: python benchmarks/multipart_reassembly.py [--sizes 1 10 100] [--max-message-size 250000]
+"""
+
+import argparse
+import random
+import time
+
+from spade.message import Message
+
+from macofl.message import MultipartHandler
+
+
+def benchmark_reassembly(size_mb: int, max_message_size: int) -> tuple[int, float]:
+    sender = MultipartHandler()
+    receiver = MultipartHandler()
+    content = "x" * (size_mb * 1024 * 1024)
+    message = Message(to="dest@localhost", sender="sender@localhost", body=content)
+    messages = sender.generate_multipart_messages(
+        content=content, max_size=max_message_size, message_base=message
+    )
+    messages = [] if messages is None else messages
+    random.shuffle(messages)
+
+    result: Message | None = None
+    start = time.perf_counter()
+    for msg in messages:
+        result = receiver.rebuild_multipart(msg)
+    seconds = time.perf_counter() - start
+
+    if result is None or len(result.body) != len(content):
+        raise RuntimeError(f"The payload of {size_mb} MB was not rebuilt.")
+    return len(messages), seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1, 2, 5, 10, 20, 50, 100, 200]
+    )
+    parser.add_argument("--max-message-size", type=int, default=250_000)
+    args = parser.parse_args()
+
+    print(f"{'MB':>6} {'parts':>7} {'seconds':>10} {'ms/MB':>8}")
+    for size_mb in args.sizes:
+        parts, seconds = benchmark_reassembly(size_mb, args.max_message_size)
+        print(
+            f"{size_mb:>6} {parts:>7} {seconds:>10.4f} {1000 * seconds / size_mb:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,7 @@ async def main() -> None:
     max_message_size = 250_000  # do not be close to 262 144
     number_of_agents = 10
     number_of_observers = 1
+    launcher_processes = 1  # > 1 shards the agents across processes
 
     uuid4 = str(uuid.uuid4()) if uuid4_enabled else ""
 
@@ -66,6 +67,7 @@ async def main() -> None:
         agents_observers=observer_jids,
         agents_to_launch=initial_agents,
         verify_security=False,
+        num_processes=launcher_processes,
     )
 
     try:
@@ -97,7 +99,7 @@ async def main() -> None:
         # await spade.wait_until_finished(launcher.agents)
         # logger.info("Agents finished.")
 
-        while launcher.is_alive() or any(ag.is_alive() for ag in launcher.agents):
+        while launcher.is_alive() or launcher.any_agent_alive():
             await asyncio.sleep(5)
 
     except KeyboardInterrupt as e:
@@ -4,11 +4,23 @@ __author__ = """Francisco Enguix"""
 __email__ = "enguixfco@gmail.com"
 __version__ = "0.1.0"
 
-from . import agent, behaviour, dataset, datatypes, log, message, nn, similarity, utils
+from . import (
+    agent,
+    behaviour,
+    codec,
+    dataset,
+    datatypes,
+    log,
+    message,
+    nn,
+    similarity,
+    utils,
+)
 
 __all__ = [
     "agent",
     "behaviour",
+    "codec",
     "dataset",
     "datatypes",
     "log",
@@ -1,5 +1,7 @@
+import asyncio
+import logging
 import traceback
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 from aioxmpp import JID, PresenceType
 from aioxmpp.stanza import Presence
@@ -9,10 +11,12 @@ from spade.message import Message
 from spade.template import Template
 
 from ..behaviour.coordination import PresenceNodeFSM
+from ..log.csv import CsvLogManager
 from ..log.general import GeneralLogManager
 from ..log.message import MessageLogManager
+from ..log.preview import PayloadPreview
 from ..message.message import RfMessage
-from ..message.multipart import MultipartHandler
+from ..message.multipart import MultipartEviction, MultipartHandler
 
 
 class AgentBase(Agent):
@@ -24,6 +28,7 @@ class AgentBase(Agent):
         web_address: str = "0.0.0.0",
         web_port: int = 10000,
         verify_security: bool = False,
+        multipart_handler: Optional[MultipartHandler] = None,
     ):
         extra_log_name = f"agent.{JID.fromstr(jid).localpart}"
         self.logger = GeneralLogManager(extra_logger_name=extra_log_name)
@@ -31,31 +36,67 @@ class AgentBase(Agent):
         self.max_message_size = max_message_size
         self.web_address = web_address
         self.web_port = web_port
-        self._multipart_handler = MultipartHandler()
+        self._multipart_handler = (
+            MultipartHandler() if multipart_handler is None else multipart_handler
+        )
         super().__init__(jid=jid, password=password, verify_security=verify_security)
 
     async def setup(self) -> None:
         self.setup_presence_handlers()
 
+    async def stop(self) -> None:
+        await super().stop()
+        # Write the CSV rows buffered by the asynchronous handlers
+        await asyncio.to_thread(CsvLogManager.flush_all)
+
     async def send(
         self, message: Message, behaviour: Optional[CyclicBehaviour] = None
     ) -> None:
-        messages = self._multipart_handler.generate_multipart_messages(
+        messages = self._multipart_handler.iter_multipart_messages(
             content=message.body,
             max_size=self.max_message_size,
             message_base=message,
         )
-        if messages is None:
-            messages = [message]
+        await self.__dispatch_messages(messages=messages, behaviour=behaviour)
+
+    async def send_stream(
+        self,
+        message: Message,
+        length: int,
+        pieces: Iterable[str],
+        behaviour: Optional[CyclicBehaviour] = None,
+    ) -> None:
+        """
+        Sends a body produced in pieces. Each multipart message is built and sent as soon as its
+        content is produced, so the whole body is never held in memory.
+
+        Args:
+            message (Message): The message whose receiver, sender, thread and metadata are used. Its body is ignored.
+            length (int): The length of the body.
+            pieces (Iterable[str]): The pieces of the body.
+            behaviour (Optional[CyclicBehaviour], optional): The behaviour that sends the messages. Defaults to None.
+        """
+        messages = self._multipart_handler.iter_multipart_messages_from_stream(
+            length=length,
+            pieces=pieces,
+            max_size=self.max_message_size,
+            message_base=message,
+        )
+        await self.__dispatch_messages(messages=messages, behaviour=behaviour)
+
+    async def __dispatch_messages(
+        self, messages: Iterator[Message], behaviour: Optional[CyclicBehaviour]
+    ) -> None:
         for msg in messages:
             if behaviour is not None:
                 await behaviour.send(msg=msg)
             else:
-                futures = self.dispatch(msg=msg)
-                for f in futures:
-                    f.result()
+                await asyncio.gather(*self.dispatch(msg=msg))
             self.logger.debug(
-                f"Message ({msg.sender.bare()}) -> ({msg.to.bare()}): {msg.body}"
+                "Message (%s) -> (%s): %s",
+                msg.sender.bare(),
+                msg.to.bare(),
+                PayloadPreview(msg.body),
             )
 
     async def receive(
@@ -77,36 +118,97 @@ class AgentBase(Agent):
         """
         msg: Message | None = await behaviour.receive(timeout=timeout)
         if msg is not None:
-            is_multipart = self._multipart_handler.is_multipart(msg)
-            if is_multipart:
-                header = self._multipart_handler.get_header(msg.body)
-                self.logger.debug(
-                    f"Multipart message received from {msg.sender}: {header} with length {len(msg.body)}"
+            return self.__process_received(msg)
+        # Nothing arrived, so the abandoned transfers are only evicted here
+        self._multipart_handler.evict_expired()
+        return None
+
+    async def receive_all(
+        self,
+        behaviour: CyclicBehaviour,
+        timeout: Optional[float] = 0,
+        max_messages: Optional[int] = None,
+    ) -> list[RfMessage]:
+        """
+        Waits until a message arrives and then drains all the messages already queued in the behaviour
+        mailbox, so the behaviour processes them in a batch in one wake-up. The multipart messages are
+        rebuilt as in `receive`, but only the completed messages are returned. The messages that can not
+        be rebuilt are logged and discarded.
+
+        Args:
+            behaviour (CyclicBehaviour): The receiver behaviour.
+            timeout (Optional[float], optional): Timeout in seconds to wait for the first message. Defaults to 0.
+            max_messages (Optional[int], optional): Maximum number of received messages (and multipart parts)
+            per call. Defaults to None (all the queued messages).
+
+        Returns:
+            list[RfMessage]: The completed messages, in arrival order. Empty if nothing arrived before the timeout.
+        """
+        completed: list[RfMessage] = []
+        msg: Message | None = await behaviour.receive(timeout=timeout)
+        if msg is None:
+            self._multipart_handler.evict_expired()
+            return completed
+        received = 0
+        while msg is not None:
+            received += 1
+            try:
+                rf_message = self.__process_received(msg)
+            except ValueError as e:
+                # A malformed message is discarded without losing the rest of the batch
+                self.logger.warning(
+                    f"Message from {msg.sender} discarded because it can not be rebuilt: {e!r}"
                 )
-                multipart_msg = self._multipart_handler.rebuild_multipart(message=msg)
-                is_multipart_completed = multipart_msg is not None
-                if is_multipart_completed:
-                    return RfMessage.from_message(
-                        message=multipart_msg,
-                        is_multipart=is_multipart,
-                        is_multipart_completed=is_multipart_completed,
-                    )
-                return RfMessage.from_message(
-                    message=msg,
-                    is_multipart=is_multipart,
-                    is_multipart_completed=is_multipart_completed,
+            else:
+                if RfMessage.is_completed(rf_message):
+                    completed.append(rf_message)
+            if max_messages is not None and received >= max_messages:
+                break
+            msg = behaviour.queue.get_nowait() if behaviour.mailbox_size() > 0 else None
+        return completed
+
+    def __process_received(self, msg: Message) -> RfMessage:
+        is_multipart = self._multipart_handler.is_multipart(msg)
+        if is_multipart:
+            if self.logger.is_enabled_for(logging.DEBUG):
+                self.logger.debug(
+                    "Multipart message received from %s: %s with length %d",
+                    msg.sender,
+                    self._multipart_handler.get_header(msg.body),
+                    len(msg.body),
                 )
-            self.logger.debug(
-                f"Message received from {msg.sender}: with length {len(msg.body)}"
-            )
+            multipart_msg = self._multipart_handler.rebuild_multipart(message=msg)
+            is_multipart_completed = multipart_msg is not None
             return RfMessage.from_message(
-                message=msg, is_multipart=False, is_multipart_completed=False
+                message=msg if multipart_msg is None else multipart_msg,
+                is_multipart=is_multipart,
+                is_multipart_completed=is_multipart_completed,
             )
-        return None
+        self.logger.debug(
+            "Message received from %s: with length %d", msg.sender, len(msg.body)
+        )
+        return RfMessage.from_message(
+            message=msg, is_multipart=False, is_multipart_completed=False
+        )
 
     def any_multipart_waiting(self) -> bool:
         return self._multipart_handler.any_multipart_waiting()
 
+    @property
+    def multipart_handler(self) -> MultipartHandler:
+        return self._multipart_handler
+
+    def pop_multipart_evictions(self) -> list[MultipartEviction]:
+        """
+        Returns the multipart transfers evicted since the last call, to log them.
+        """
+        return self._multipart_handler.pop_evictions()
+
+    def on_unavailable(self, jid: str, stanza) -> None:
+        self.logger.debug(f"{jid} is unavailable with stanza {stanza}.")
+        # Its partial transfers will never be completed
+        self._multipart_handler.forget_sender(JID.fromstr(str(jid)))
+
     def on_available(self, jid: str, stanza) -> None:
         self.logger.debug(f"{jid} is available with stanza {stanza}.")
 
@@ -122,6 +224,7 @@ class AgentBase(Agent):
         self.presence.on_subscribe = self.on_subscribe
         self.presence.on_subscribed = self.on_subscribed
         self.presence.on_available = self.on_available
+        self.presence.on_unavailable = self.on_unavailable
 
 
 class AgentNodeBase(AgentBase):
@@ -139,6 +242,7 @@ class AgentNodeBase(AgentBase):
         web_address: str = "0.0.0.0",
         web_port: int = 10000,
         verify_security: bool = False,
+        multipart_handler: Optional[MultipartHandler] = None,
     ):
         self.observers = [] if observers is None else observers
         self.neighbours = [] if neighbours is None else neighbours
@@ -154,6 +258,7 @@ class AgentNodeBase(AgentBase):
             web_address=web_address,
             web_port=web_port,
             verify_security=verify_security,
+            multipart_handler=multipart_handler,
         )
 
     async def setup(self) -> None:
@@ -1,16 +1,189 @@
+import asyncio
+import logging
+import logging.handlers
+import multiprocessing
+from dataclasses import dataclass, field
+from multiprocessing.process import BaseProcess
+from typing import Any, Optional
+
 from aioxmpp import JID
 
 from ..behaviour.launcher import LaunchAgentsBehaviour, Wait
+from ..codec.compression import LayerCompressor
+from ..codec.delta import DeltaTransport
 from ..datatypes.consensus_manager import ConsensusManager
 from ..datatypes.data import NonIidDirichletDatasetSettings
+from ..message.multipart import MultipartHandler
+from ..nn.executor import TrainingExecutor
 from ..nn.model_factory import ModelManagerFactory
 from ..similarity.function import EuclideanDistanceFunction
 from ..similarity.similarity_manager import SimilarityManager
 from .base import AgentBase
 from .premiofl.pmacofl_min import PmacoflMinAgent
 
+# Base loggers of the log managers, their levels are copied to the agent processes
+LOGGER_NAMES = (
+    "rf.log",
+    "rf.message",
+    "rf.algorithm",
+    "rf.nn.inference",
+    "rf.nn.train",
+)
+
+
+@dataclass
+class LaunchSettings:
+    """
+    Picklable settings to build the launched agents, in the launcher process or in the agent processes.
+    """
+
+    max_message_size: int
+    agents_coordinator: str
+    agents_observers: list[str]
+    agents_to_launch: list[str]
+    training_mode: str = "inline"
+    training_workers: Optional[int] = None
+    delta_mode: Optional[str] = None
+    compression: Optional[str] = None
+    multipart_max_bytes: Optional[int] = None
+    multipart_ttl_seconds: Optional[float] = 600.0
+    max_parallel_sends: Optional[int] = None
+    piggyback_similarity: bool = False
+    pipelined_training: bool = False
+    gossip_max_staleness_seconds: Optional[float] = None
+    log_levels: dict[str, int] = field(default_factory=dict)
+
+
+def build_launched_agent(
+    settings: LaunchSettings,
+    agent_jid: JID,
+    training_executor: TrainingExecutor,
+) -> PmacoflMinAgent:
+    """
+    Builds the agent `agent_jid` with all the other launched agents as neighbours.
+    """
+    agents_to_launch = [JID.fromstr(j) for j in settings.agents_to_launch]
+    neighbour_jids = [j for j in agents_to_launch if j != agent_jid]
+    max_order = len(agents_to_launch) - 1
+
+    dataset_settings = NonIidDirichletDatasetSettings(
+        seed=13,
+        num_clients=len(agents_to_launch),
+        client_index=agents_to_launch.index(agent_jid),
+    )
+    model_manager = ModelManagerFactory.get_cifar10_cnn5(settings=dataset_settings)
+    consensus = ConsensusManager(
+        model_manager=model_manager,
+        max_order=max_order,
+        max_seconds_to_accept_consensus=24 * 60 * 60,
+        consensus_iterations=10,
+    )
+    similarity_manager = SimilarityManager(
+        model_manager=model_manager,
+        function=EuclideanDistanceFunction(),
+        wait_for_responses_timeout=5 * 60,
+    )
+    return PmacoflMinAgent(
+        jid=str(agent_jid.bare()),
+        password="123",
+        max_message_size=settings.max_message_size,
+        consensus_manager=consensus,
+        model_manager=model_manager,
+        similarity_manager=similarity_manager,
+        observers=[JID.fromstr(j) for j in settings.agents_observers],
+        neighbours=neighbour_jids,
+        coordinator=JID.fromstr(settings.agents_coordinator),
+        max_rounds=70,
+        training_executor=training_executor,
+        delta_transport=(
+            None
+            if settings.delta_mode is None
+            else DeltaTransport(mode=settings.delta_mode)
+        ),
+        layer_compressor=(
+            None
+            if settings.compression is None
+            else LayerCompressor.from_name(settings.compression)
+        ),
+        multipart_handler=MultipartHandler(
+            max_bytes=settings.multipart_max_bytes,
+            ttl_seconds=settings.multipart_ttl_seconds,
+        ),
+        max_parallel_sends=settings.max_parallel_sends,
+        piggyback_similarity=settings.piggyback_similarity,
+        pipelined_training=settings.pipelined_training,
+        gossip_max_staleness_seconds=settings.gossip_max_staleness_seconds,
+    )
+
+
+class LogRecordForwarder(logging.Handler):
+    """
+    Handles the log records received from the agent processes with the logger of the same name in
+    this process, so they are written by the handlers set up by `setup_loggers`.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+
+def setup_process_logging(log_queue: Any, log_levels: dict[str, int]) -> None:
+    """
+    Sends all the log records of the current process to `log_queue`, to be handled by the launcher process.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    for name, level in log_levels.items():
+        logging.getLogger(name).setLevel(level)
+
+
+async def run_launched_agents(
+    settings: LaunchSettings, agent_jids: list[str], check_seconds: float = 5
+) -> None:
+    """
+    Builds and starts the agents `agent_jids` and waits until all of them finish.
+    """
+    training_executor = TrainingExecutor(
+        mode=settings.training_mode, max_workers=settings.training_workers
+    )
+    agents = [
+        build_launched_agent(settings, JID.fromstr(j), training_executor)
+        for j in agent_jids
+    ]
+    try:
+        for agent in agents:
+            await agent.start()
+        while any(agent.is_alive() for agent in agents):
+            await asyncio.sleep(check_seconds)
+    finally:
+        for agent in agents:
+            if agent.is_alive():
+                await agent.stop()
+        training_executor.shutdown(wait=False)
+
+
+def run_agents_process(
+    settings: LaunchSettings, agent_jids: list[str], log_queue: Any
+) -> None:
+    """
+    Entry point of an agent process: runs its own SPADE loop with a shard of the launched agents.
+    """
+    import spade
+
+    setup_process_logging(log_queue=log_queue, log_levels=settings.log_levels)
+    spade.run(run_launched_agents(settings=settings, agent_jids=agent_jids))
+
 
 class LauncherAgent(AgentBase):
+    """
+    Launches the agents of an experiment. With `num_processes` > 1 the agents are sharded across
+    that number of processes, each one with its own SPADE loop, so their trainings and serializations
+    use several cores. The coordinator and the observers are still reached through XMPP, and the log
+    records of the agent processes are written by the loggers of this process.
+    """
 
     def __init__(
         self,
@@ -23,11 +196,43 @@ class LauncherAgent(AgentBase):
         web_address: str = "0.0.0.0",
         web_port: int = 10000,
         verify_security: bool = False,
+        training_mode: str = "inline",
+        training_workers: Optional[int] = None,
+        delta_mode: Optional[str] = None,
+        compression: Optional[str] = None,
+        multipart_max_bytes: Optional[int] = None,
+        multipart_ttl_seconds: Optional[float] = 600.0,
+        max_parallel_sends: Optional[int] = None,
+        num_processes: int = 1,
+        piggyback_similarity: bool = False,
+        pipelined_training: bool = False,
+        gossip_max_staleness_seconds: Optional[float] = None,
     ):
+        if num_processes <= 0:
+            raise ValueError(
+                f"The num_processes must be a positive integer, but the current value is: {num_processes}"
+            )
         self.agents: list[PmacoflMinAgent] = []
         self.agents_coordinator = agents_coordinator
         self.agents_observers = [] if agents_observers is None else agents_observers
         self.agents_to_launch = [] if agents_to_launch is None else agents_to_launch
+        # Shared by all the launched agents, so max_workers bounds the concurrent trainings
+        self.training_executor = TrainingExecutor(
+            mode=training_mode, max_workers=training_workers
+        )
+        self.training_mode = training_mode
+        self.training_workers = training_workers
+        self.delta_mode = delta_mode
+        self.compression = compression
+        self.multipart_max_bytes = multipart_max_bytes
+        self.multipart_ttl_seconds = multipart_ttl_seconds
+        self.max_parallel_sends = max_parallel_sends
+        self.num_processes = num_processes
+        self.piggyback_similarity = piggyback_similarity
+        self.pipelined_training = pipelined_training
+        self.gossip_max_staleness_seconds = gossip_max_staleness_seconds
+        self.processes: list[BaseProcess] = []
+        self._log_listener: Optional[logging.handlers.QueueListener] = None
         super().__init__(
             jid, password, max_message_size, web_address, web_port, verify_security
         )
@@ -41,50 +246,94 @@ class LauncherAgent(AgentBase):
         self.add_behaviour(LaunchAgentsBehaviour())
         self.add_behaviour(Wait())
 
+    def get_launch_settings(self) -> LaunchSettings:
+        return LaunchSettings(
+            max_message_size=self.max_message_size,
+            agents_coordinator=str(self.agents_coordinator.bare()),
+            agents_observers=[str(j.bare()) for j in self.agents_observers],
+            agents_to_launch=[str(j.bare()) for j in self.agents_to_launch],
+            training_mode=self.training_mode,
+            training_workers=self.training_workers,
+            delta_mode=self.delta_mode,
+            compression=self.compression,
+            multipart_max_bytes=self.multipart_max_bytes,
+            multipart_ttl_seconds=self.multipart_ttl_seconds,
+            max_parallel_sends=self.max_parallel_sends,
+            piggyback_similarity=self.piggyback_similarity,
+            pipelined_training=self.pipelined_training,
+            gossip_max_staleness_seconds=self.gossip_max_staleness_seconds,
+            log_levels={name: logging.getLogger(name).level for name in LOGGER_NAMES},
+        )
+
+    @staticmethod
+    def shard_agents(agents: list[JID], num_processes: int) -> list[list[JID]]:
+        """
+        Splits the agents in at most `num_processes` shards of similar size, keeping their order.
+        """
+        num_shards = min(num_processes, len(agents))
+        shards: list[list[JID]] = [[] for _ in range(num_shards)]
+        for i, agent in enumerate(agents):
+            shards[i * num_shards // len(agents)].append(agent)
+        return shards
+
     async def launch_agents(self) -> None:
         self.logger.debug(
             f"Initializating launch of {[str(j.bare()) for j in self.agents_to_launch]}"
         )
-        max_order = len(self.agents_to_launch) - 1
-        for agent_jid in self.agents_to_launch:
-            neighbour_jids = [j for j in self.agents_to_launch if j != agent_jid]
+        settings = self.get_launch_settings()
+        if self.num_processes > 1:
+            self.launch_agent_processes(settings)
+            return
 
-            agent_index = int(str(agent_jid.localpart)[1])
-            dataset_settings = NonIidDirichletDatasetSettings(
-                seed=13,
-                num_clients=len(self.agents_to_launch),
-                client_index=agent_index,
-            )
-            model_manager = ModelManagerFactory.get_cifar10_cnn5(
-                settings=dataset_settings
-            )
-            consensus = ConsensusManager(
-                model_manager=model_manager,
-                max_order=max_order,
-                max_seconds_to_accept_consensus=24 * 60 * 60,
-                consensus_iterations=10,
-            )
-            similarity_manager = SimilarityManager(
-                model_manager=model_manager,
-                function=EuclideanDistanceFunction(),
-                wait_for_responses_timeout=5 * 60,
-            )
-            agent = PmacoflMinAgent(
-                jid=str(agent_jid.bare()),
-                password="123",
-                max_message_size=self.max_message_size,
-                consensus_manager=consensus,
-                model_manager=model_manager,
-                similarity_manager=similarity_manager,
-                observers=self.agents_observers,
-                neighbours=neighbour_jids,
-                coordinator=self.agents_coordinator,
-                max_rounds=70,
+        for agent_jid in self.agents_to_launch:
+            agent = build_launched_agent(
+                settings, agent_jid.bare(), self.training_executor
             )
             self.logger.debug(
-                f"The neighbour JIDs for agent {agent_jid.bare()} are {[str(j.bare()) for j in neighbour_jids]}"
+                f"The neighbour JIDs for agent {agent_jid.bare()} are {[str(j.bare()) for j in agent.neighbours]}"
             )
             self.agents.append(agent)
 
         for agent in self.agents:
             await agent.start()
+
+    def launch_agent_processes(self, settings: LaunchSettings) -> None:
+        context = multiprocessing.get_context("spawn")
+        log_queue = context.Queue()
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, LogRecordForwarder()
+        )
+        self._log_listener.start()
+        for i, shard in enumerate(
+            LauncherAgent.shard_agents(self.agents_to_launch, self.num_processes)
+        ):
+            process = context.Process(
+                target=run_agents_process,
+                args=(settings, [str(j.bare()) for j in shard], log_queue),
+                name=f"rf-agents-{i}",
+            )
+            process.start()
+            self.processes.append(process)
+            self.logger.debug(
+                f"Process {process.name} ({process.pid}) launched with agents {[str(j.bare()) for j in shard]}"
+            )
+
+    def any_agent_alive(self) -> bool:
+        """
+        Returns True while any launched agent, or any process with launched agents, is running.
+        """
+        return any(agent.is_alive() for agent in self.agents) or any(
+            process.is_alive() for process in self.processes
+        )
+
+    async def stop(self) -> None:
+        await super().stop()
+        self.training_executor.shutdown(wait=False)
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            await asyncio.to_thread(process.join, 10)
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
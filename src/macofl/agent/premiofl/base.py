@@ -1,22 +1,29 @@
+import asyncio
 from abc import ABCMeta, abstractmethod
 from queue import Queue
-from typing import Optional, OrderedDict
+from typing import Any, Optional, OrderedDict
 
 from aioxmpp import JID
-from spade.behaviour import CyclicBehaviour
+from spade.behaviour import CyclicBehaviour, FSMBehaviour
 from spade.message import Message
 from spade.template import Template
 from torch import Tensor
 
 from ...behaviour.premiofl.fsm import PremioFsmBehaviour
+from ...behaviour.premiofl.gossip import GossipFsmBehaviour
 from ...behaviour.premiofl.layer_receiver import LayerReceiverBehaviour
 from ...behaviour.premiofl.similarity_receiver import SimilarityReceiverBehaviour
-from ...datatypes.consensus import Consensus
+from ...codec.cache import LayerPayloadCache
+from ...codec.compression import LayerCompressor, TopKCompressor
+from ...codec.delta import DeltaTransport
+from ...datatypes.consensus import Consensus, ConsensusStreamDecoder
 from ...datatypes.consensus_manager import ConsensusManager
 from ...datatypes.models import ModelManager
 from ...log.algorithm import AlgorithmLogManager
 from ...log.message import MessageLogManager
 from ...log.nn import NnInferenceLogManager, NnTrainLogManager
+from ...message.multipart import MultipartHandler
+from ...nn.executor import TrainingExecutor
 from ...similarity.similarity_manager import SimilarityManager
 from ...similarity.similarity_vector import SimilarityVector
 from ..base import AgentNodeBase
@@ -39,11 +46,60 @@ class PremioFlAgent(AgentNodeBase, metaclass=ABCMeta):
         web_address: str = "0.0.0.0",
         web_port: int = 10000,
         verify_security: bool = False,
+        training_executor: Optional[TrainingExecutor] = None,
+        delta_transport: Optional[DeltaTransport] = None,
+        layer_compressor: Optional[LayerCompressor] = None,
+        multipart_handler: Optional[MultipartHandler] = None,
+        max_parallel_sends: Optional[int] = None,
+        piggyback_similarity: bool = False,
+        pipelined_training: bool = False,
+        gossip_max_staleness_seconds: Optional[float] = None,
     ):
+        if max_parallel_sends is not None and max_parallel_sends <= 0:
+            raise ValueError(
+                f"The max_parallel_sends must be a positive integer, but the current value is: {max_parallel_sends}"
+            )
+        if (
+            delta_transport is not None
+            and layer_compressor is not None
+            and layer_compressor.name != "none"
+        ):
+            raise ValueError(
+                "The delta transport and the lossy layer compression can not be used at the same time."
+            )
+        if pipelined_training and (
+            training_executor is None or training_executor.mode == "inline"
+        ):
+            raise ValueError(
+                "The pipelined training needs a thread or process training executor, with the inline "
+                + "executor the training blocks the event loop and nothing is sent while it trains."
+            )
         extra_name = f"agent.{JID.fromstr(jid).localpart}"
         self.consensus_manager = consensus_manager
         self.model_manager = model_manager
         self.similarity_manager = similarity_manager
+        self.training_executor = (
+            TrainingExecutor(mode="inline")
+            if training_executor is None
+            else training_executor
+        )
+        self.delta_transport = delta_transport
+        self.layer_compressor = layer_compressor
+        # References of the top-k differences received from the neighbours, and sent to them if the
+        # layers are compressed with top-k
+        self.topk_decoder = (
+            layer_compressor
+            if isinstance(layer_compressor, TopKCompressor)
+            else TopKCompressor()
+        )
+        # Maximum number of neighbours receiving layers at the same time (None = all of them)
+        self.max_parallel_sends = max_parallel_sends
+        self.payload_cache = LayerPayloadCache()
+        # Attach the similarity vector to the layers instead of exchanging it before sending them
+        self.piggyback_similarity = piggyback_similarity
+        # Train in the background while the layers of the last stable weights are exchanged
+        self.pipelined_training = pipelined_training
+        self.training_task: Optional[asyncio.Task] = None
         self.max_rounds = max_rounds  # None = inf
         self.current_round: int = 0
         self.consensus_transmissions: Queue[Consensus] = Queue()
@@ -52,7 +108,13 @@ class PremioFlAgent(AgentNodeBase, metaclass=ABCMeta):
         self.nn_train_logger = NnTrainLogManager(extra_logger_name=extra_name)
         self.nn_inference_logger = NnInferenceLogManager(extra_logger_name=extra_name)
 
-        self.fsm_behaviour = PremioFsmBehaviour()
+        # Asynchronous gossip without barriers, with bounded staleness (None = synchronous rounds)
+        self.gossip_max_staleness_seconds = gossip_max_staleness_seconds
+        self.fsm_behaviour: FSMBehaviour = (
+            PremioFsmBehaviour()
+            if gossip_max_staleness_seconds is None
+            else GossipFsmBehaviour(max_staleness_seconds=gossip_max_staleness_seconds)
+        )
         self.layer_receiver_behaviour = LayerReceiverBehaviour()
         self.similarity_receiver_behaviour = SimilarityReceiverBehaviour()
         post_coordination_behaviours = [
@@ -78,6 +140,11 @@ class PremioFlAgent(AgentNodeBase, metaclass=ABCMeta):
             web_address,
             web_port,
             verify_security,
+            multipart_handler=multipart_handler,
+        )
+        # The layers are decoded while their multipart messages arrive
+        self._multipart_handler.register_stream_decoder(
+            "layers", lambda message: ConsensusStreamDecoder(sender=message.sender)
         )
 
     def select_neighbours(self) -> list[JID]:
@@ -143,6 +210,49 @@ class PremioFlAgent(AgentNodeBase, metaclass=ABCMeta):
             selected_neighbours=selected_neighbours,
         )
 
+    def get_assigned_layers(
+        self, assignments: dict[JID, list[str]]
+    ) -> dict[JID, OrderedDict[str, Tensor]]:
+        """
+        Builds the result of `_assign_layers` from the layer names of each neighbour, e.g. the result of a
+        `LayerAssigner`. The stable layers are read once, so the neighbours with the same layer share its tensor.
+
+        Args:
+            assignments (dict[JID, list[str]]): The layer names of each neighbour.
+
+        Returns:
+            dict[JID, OrderedDict[str, Tensor]]: The layers of each neighbour.
+        """
+        all_layers = self.model_manager.get_stable_layers()
+        return {
+            neighbour: OrderedDict((name, all_layers[name]) for name in names)
+            for neighbour, names in assignments.items()
+        }
+
+    def get_piggyback_similarity(self, neighbour: JID) -> Optional[str]:
+        """
+        Returns the encoded similarity vector to attach to the layers sent to `neighbour`, or None if
+        the vectors are not piggybacked or there is no similarity function.
+        """
+        if not self.piggyback_similarity:
+            return None
+        vector = self.similarity_manager.get_own_similarity_vector()
+        if vector is None:
+            return None
+        vector.owner = self.jid
+        return self.similarity_manager.encode_vector(
+            vector=vector, neighbour=neighbour
+        ).body
+
+    def get_neighbours_without_similarity(self, neighbours: list[JID]) -> list[JID]:
+        """
+        Returns the neighbours whose similarity vector must be requested before assigning them layers.
+        Without piggybacking all of them, otherwise only those without a cached vector.
+        """
+        if not self.piggyback_similarity:
+            return neighbours
+        return [n for n in neighbours if self.similarity_manager.get_vector(n) is None]
+
     async def send_similarity_vector(
         self,
         neighbour: JID,
@@ -151,7 +261,7 @@ class PremioFlAgent(AgentNodeBase, metaclass=ABCMeta):
         metadata: Optional[dict[str, str]] = None,
         behaviour: Optional[CyclicBehaviour] = None,
     ) -> None:
-        msg = vector.to_message()
+        msg = self.similarity_manager.encode_vector(vector=vector, neighbour=neighbour)
         msg.sender = str(self.jid.bare())
         msg.to = str(neighbour.bare())
         msg.thread = thread
@@ -171,18 +281,136 @@ class PremioFlAgent(AgentNodeBase, metaclass=ABCMeta):
         behaviour: Optional[CyclicBehaviour] = None,
     ) -> None:
         ct = Consensus(layers=layers, sender=self.jid, request_reply=request_reply)
-        msg = ct.to_message()
-        msg.sender = str(self.jid.bare())
-        msg.to = str(neighbour.bare())
-        msg.thread = thread
-        msg.metadata = metadata
+        ct.similarity = self.get_piggyback_similarity(neighbour)
+        if self.topk_decoder.pop_resync(neighbour):
+            # Our top-k references of the neighbour are lost, its next layers must be complete
+            ct.transport["topk_resync"] = True
+        encoded_layers: Optional[tuple[str, dict[str, Any]]] = None
+        key = self.get_payload_cache_key(layers)
+        if key is not None:
+            encoded_layers = self.payload_cache.get(key)
+            if encoded_layers is None:
+                encoded_layers = ct.encode_layers(compressor=self.layer_compressor)
+                self.payload_cache.put(key, encoded_layers)
+        if encoded_layers is not None:
+            length, pieces = ct.iter_body(encoded_layers=encoded_layers)
+        else:
+            if self.delta_transport is not None:
+                ct.layers, ct.transport = self.delta_transport.encode(
+                    neighbour=neighbour, layers=layers
+                )
+            # The body is serialized while it is sent, tensor by tensor
+            length, pieces = ct.iter_body(
+                compressor=self.layer_compressor, neighbour=neighbour
+            )
+        msg = Message(
+            to=str(neighbour.bare()),
+            sender=str(self.jid.bare()),
+            thread=thread,
+            metadata=metadata,
+        )
+        await self.send_stream(
+            message=msg, length=length, pieces=pieces, behaviour=behaviour
+        )
         tag = "-REQREPLY" if request_reply else ""
-        await self.__send_message(
-            message=msg, behaviour=behaviour, log_tag=f"-LAYERS{tag}"
+        self.message_logger.log(
+            current_round=self.current_round,
+            sender=msg.sender,
+            to=msg.to,
+            msg_type=f"SEND-LAYERS{tag}",
+            size=length,
+            thread=msg.thread,
+            codec=(
+                "none" if self.layer_compressor is None else self.layer_compressor.name
+            ),
         )
 
+    def get_payload_cache_key(
+        self, layers: OrderedDict[str, Tensor]
+    ) -> Optional[tuple[int, tuple[str, ...], str]]:
+        """
+        Returns the key of the layers in the payload cache, or None if they can not be cached: the layers
+        must be the stable tensors of the model (the current ones when it is not training, or the frozen ones),
+        and their encoding must not depend on the neighbour (no delta transport nor stateful compressor).
+        """
+        if self.delta_transport is not None:
+            return None
+        if (
+            self.model_manager.is_training()
+            and not self.model_manager.has_stable_layers()
+        ):
+            return None
+        if self.layer_compressor is not None and self.layer_compressor.stateful:
+            return None
+        stable_layers = self.model_manager.get_stable_layers()
+        if any(
+            stable_layers.get(name) is not tensor for name, tensor in layers.items()
+        ):
+            return None
+        return LayerPayloadCache.get_key(
+            model_version=self.model_manager.stable_version,
+            layer_names=tuple(layers.keys()),
+            codec=(
+                "none" if self.layer_compressor is None else self.layer_compressor.name
+            ),
+        )
+
+    async def send_local_layers_to_neighbours(
+        self,
+        assignments: dict[JID, OrderedDict[str, Tensor]],
+        request_reply: bool,
+        threads: Optional[dict[JID, str]] = None,
+        metadata: Optional[dict[str, str]] = None,
+        behaviour: Optional[CyclicBehaviour] = None,
+    ) -> dict[JID, Optional[BaseException]]:
+        """
+        Sends the layers to several neighbours concurrently, with at most `max_parallel_sends` sends
+        in flight. The layers that can be cached (see `get_payload_cache_key`) are encoded once and
+        shared by all the neighbours that receive them.
+
+        Args:
+            assignments (dict[JID, OrderedDict[str, Tensor]]): The layers to send to each neighbour.
+            request_reply (bool): Whether the neighbours must reply with their layers.
+            threads (Optional[dict[JID, str]], optional): The thread of the message of each neighbour. Defaults to None.
+            metadata (Optional[dict[str, str]], optional): The metadata of the messages. Defaults to None.
+            behaviour (Optional[CyclicBehaviour], optional): The behaviour that sends the messages. Defaults to None.
+
+        Returns:
+            dict[JID, Optional[BaseException]]: The result of the send of each neighbour: None if the layers
+            were sent or the exception raised otherwise.
+        """
+        threads = {} if threads is None else threads
+        semaphore = asyncio.Semaphore(
+            len(assignments)
+            if self.max_parallel_sends is None
+            else self.max_parallel_sends
+        )
+
+        async def send(neighbour: JID, layers: OrderedDict[str, Tensor]) -> None:
+            async with semaphore:
+                await self.send_local_layers(
+                    neighbour=neighbour,
+                    request_reply=request_reply,
+                    layers=layers,
+                    thread=threads.get(neighbour),
+                    metadata=metadata,
+                    behaviour=behaviour,
+                )
+
+        neighbours = list(assignments.keys())
+        results = await asyncio.gather(
+            *(send(n, assignments[n]) for n in neighbours), return_exceptions=True
+        )
+        return {
+            n: result if isinstance(result, BaseException) else None
+            for n, result in zip(neighbours, results)
+        }
+
     async def __send_message(
-        self, message: Message, behaviour: CyclicBehaviour, log_tag: str = ""
+        self,
+        message: Message,
+        behaviour: CyclicBehaviour,
+        log_tag: str = "",
     ) -> None:
         await self.send(message=message, behaviour=behaviour)
         self.message_logger.log(
@@ -197,6 +425,12 @@ class PremioFlAgent(AgentNodeBase, metaclass=ABCMeta):
     def are_max_iterations_reached(self) -> bool:
         return self.max_rounds is not None and self.current_round > self.max_rounds
 
+    def on_unavailable(self, jid: str, stanza) -> None:
+        super().on_unavailable(jid, stanza)
+        # It may come back without our layer table nor our top-k references
+        self.similarity_manager.forget_neighbour(JID.fromstr(str(jid)))
+        self.topk_decoder.forget(JID.fromstr(str(jid)))
+
     async def stop(self) -> None:
         await super().stop()
         self.logger.info("Agent stopped.")
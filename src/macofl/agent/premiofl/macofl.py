@@ -4,8 +4,12 @@ from typing import Optional, OrderedDict
 from aioxmpp import JID
 from torch import Tensor
 
+from macofl.codec.compression import LayerCompressor
+from macofl.codec.delta import DeltaTransport
 from macofl.datatypes.consensus_manager import ConsensusManager
 from macofl.datatypes.models import ModelManager
+from macofl.message.multipart import MultipartHandler
+from macofl.nn.executor import TrainingExecutor
 
 from ...similarity.similarity_manager import SimilarityManager
 from ...similarity.similarity_vector import SimilarityVector
@@ -29,6 +33,14 @@ class MacoflAgent(PremioFlAgent):
         web_address: str = "0.0.0.0",
         web_port: int = 10000,
         verify_security: bool = False,
+        training_executor: Optional[TrainingExecutor] = None,
+        delta_transport: Optional[DeltaTransport] = None,
+        layer_compressor: Optional[LayerCompressor] = None,
+        multipart_handler: Optional[MultipartHandler] = None,
+        max_parallel_sends: Optional[int] = None,
+        piggyback_similarity: bool = False,
+        pipelined_training: bool = False,
+        gossip_max_staleness_seconds: Optional[float] = None,
     ):
         super().__init__(
             jid,
@@ -44,6 +56,14 @@ class MacoflAgent(PremioFlAgent):
             web_address,
             web_port,
             verify_security,
+            training_executor=training_executor,
+            delta_transport=delta_transport,
+            layer_compressor=layer_compressor,
+            multipart_handler=multipart_handler,
+            max_parallel_sends=max_parallel_sends,
+            piggyback_similarity=piggyback_similarity,
+            pipelined_training=pipelined_training,
+            gossip_max_staleness_seconds=gossip_max_staleness_seconds,
         )
 
     def _select_neighbours(self, neighbours: list[JID]) -> list[JID]:
@@ -58,11 +78,11 @@ class MacoflAgent(PremioFlAgent):
         selected_neighbours: list[JID],
     ) -> dict[JID, OrderedDict[str, Tensor]]:
         result: dict[JID, OrderedDict[str, Tensor]] = {}
+        all_layers = self.model_manager.get_stable_layers()
+        layer_names = list(all_layers.keys())
         for n in neighbours_vectors.keys():
             layers: OrderedDict[str, Tensor] = OrderedDict()
-            layer_name = random.choice(
-                list(self.model_manager.model.state_dict().keys())
-            )
-            layers[layer_name] = self.model_manager.model.state_dict()[layer_name]
+            layer_name = random.choice(layer_names)
+            layers[layer_name] = all_layers[layer_name]
             result[n] = layers
         return result
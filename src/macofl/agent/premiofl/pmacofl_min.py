@@ -4,9 +4,14 @@ from typing import Optional, OrderedDict
 from aioxmpp import JID
 from torch import Tensor
 
+from macofl.codec.compression import LayerCompressor
+from macofl.codec.delta import DeltaTransport
 from macofl.datatypes.consensus_manager import ConsensusManager
 from macofl.datatypes.models import ModelManager
+from macofl.message.multipart import MultipartHandler
+from macofl.nn.executor import TrainingExecutor
 
+from ...similarity.assignment import LayerAssigner
 from ...similarity.similarity_manager import SimilarityManager
 from ...similarity.similarity_vector import SimilarityVector
 from .base import PremioFlAgent
@@ -29,6 +34,14 @@ class PmacoflMinAgent(PremioFlAgent):
         web_address: str = "0.0.0.0",
         web_port: int = 10000,
         verify_security: bool = False,
+        training_executor: Optional[TrainingExecutor] = None,
+        delta_transport: Optional[DeltaTransport] = None,
+        layer_compressor: Optional[LayerCompressor] = None,
+        multipart_handler: Optional[MultipartHandler] = None,
+        max_parallel_sends: Optional[int] = None,
+        piggyback_similarity: bool = False,
+        pipelined_training: bool = False,
+        gossip_max_staleness_seconds: Optional[float] = None,
     ):
         super().__init__(
             jid,
@@ -44,7 +57,17 @@ class PmacoflMinAgent(PremioFlAgent):
             web_address,
             web_port,
             verify_security,
+            training_executor=training_executor,
+            delta_transport=delta_transport,
+            layer_compressor=layer_compressor,
+            multipart_handler=multipart_handler,
+            max_parallel_sends=max_parallel_sends,
+            piggyback_similarity=piggyback_similarity,
+            pipelined_training=pipelined_training,
+            gossip_max_staleness_seconds=gossip_max_staleness_seconds,
         )
+        # Each neighbour receives the layer with the most similar coefficient
+        self.layer_assigner = LayerAssigner(criterion="min", k=1)
 
     def _select_neighbours(self, neighbours: list[JID]) -> list[JID]:
         if not neighbours:
@@ -59,25 +82,10 @@ class PmacoflMinAgent(PremioFlAgent):
     ) -> dict[JID, OrderedDict[str, Tensor]]:
         if not my_vector:
             raise ValueError("PMACoFLs algorithms must have a similarity function.")
-        result: dict[JID, OrderedDict[str, Tensor]] = {}
-
-        for neighbour in selected_neighbours:
-            neighbour_vector = neighbours_vectors[neighbour].vector
-
-            min_layer: str | None = None
-            min_difference = float("inf")
-
-            for layer_name, my_layer_value in my_vector.vector.items():
-                neighbour_layer_value = neighbour_vector[layer_name]
-
-                difference = abs(my_layer_value - neighbour_layer_value)
-
-                if difference < min_difference:
-                    min_difference = difference
-                    min_layer = layer_name
-
-            if min_layer:
-                layer_tensor = self.model_manager.model.state_dict()[min_layer]
-                result[neighbour] = OrderedDict({min_layer: layer_tensor})
-
-        return result
+        return self.get_assigned_layers(
+            self.layer_assigner.assign(
+                my_vector=my_vector,
+                neighbours_vectors=neighbours_vectors,
+                neighbours=selected_neighbours,
+            )
+        )
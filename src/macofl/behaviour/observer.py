@@ -1,17 +1,23 @@
-import asyncio
 import logging
+from typing import Optional
 
 from spade.behaviour import CyclicBehaviour
 
 
 class ObserverBehaviour(CyclicBehaviour):
 
-    def __init__(self, logger_name: str):
+    def __init__(self, logger_name: str, max_messages: Optional[int] = None):
         self.logger = logging.getLogger(logger_name)
+        # Maximum number of messages logged per wake-up (None = all the queued messages)
+        self.max_messages = max_messages
         super().__init__()
 
     async def run(self) -> None:
-        await asyncio.sleep(0.1)
         msg = await self.receive(1)
-        if msg:
+        logged = 0
+        while msg:
             self.logger.info(msg.body)
+            logged += 1
+            if self.max_messages is not None and logged >= self.max_messages:
+                break
+            msg = await self.receive(0)
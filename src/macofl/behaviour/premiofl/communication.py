@@ -1,6 +1,6 @@
 import traceback
 import uuid
-from typing import TYPE_CHECKING, OrderedDict
+from typing import TYPE_CHECKING, Optional, OrderedDict
 
 from aioxmpp import JID
 from spade.behaviour import State
@@ -43,23 +43,37 @@ class CommunicationState(State):
                     + f"{[jid.localpart for jid in selected_neighbours]}"
                 )
 
-                if self.agent.similarity_manager.function is not None:
+                # With piggybacking the vectors that came with the last layers are reused
+                request_neighbours = self.agent.get_neighbours_without_similarity(
+                    selected_neighbours
+                )
+                if (
+                    self.agent.similarity_manager.function is not None
+                    and request_neighbours
+                ):
                     all_responses_received = await self.similarity_vector_exchange(
-                        neighbours=selected_neighbours
+                        neighbours=request_neighbours
                     )
                     self.agent.logger.info(
                         f"[{self.agent.current_round}] ({consensus_it_id}) Vector exchange completed "
                         + f"{'with all responses' if all_responses_received else 'by timeout'}."
                     )
 
+                assignments = self.agent.assign_layers(selected_neighbours)
+                results = await self.send_layers_to_neighbours(assignments=assignments)
                 sent_layers = False
-                for n, ls in self.agent.assign_layers(selected_neighbours).items():
-                    await self.send_layers(neighbour=n, layers=ls)
-                    self.agent.logger.debug(
-                        f"[{self.agent.current_round}] ({consensus_it_id}) Consensus layers of CommunicationState: "
-                        + f"{[jid.localpart for jid in selected_neighbours]} -> {list(ls.keys())}"
-                    )
-                    sent_layers = True
+                for n, error in results.items():
+                    if error is None:
+                        self.agent.logger.debug(
+                            f"[{self.agent.current_round}] ({consensus_it_id}) Consensus layers of CommunicationState: "
+                            + f"{n.localpart} -> {list(assignments[n].keys())}"
+                        )
+                        sent_layers = True
+                    else:
+                        self.agent.logger.error(
+                            f"[{self.agent.current_round}] ({consensus_it_id}) Consensus layers of CommunicationState "
+                            + f"not sent to {n.localpart}: {error!r}"
+                        )
 
                 if sent_layers:
                     self.agent.logger.info(
@@ -78,24 +92,17 @@ class CommunicationState(State):
             self.agent.logger.exception(e)
             traceback.print_exc()
 
-    async def send_layers(
-        self,
-        neighbour: JID,
-        layers: OrderedDict[str, Tensor],
-    ) -> None:
+    async def send_layers_to_neighbours(
+        self, assignments: dict[JID, OrderedDict[str, Tensor]]
+    ) -> dict[JID, Optional[BaseException]]:
         metadata = {"rf.conversation": "layers"}
-        thread = str(uuid.uuid4())
-        await self.agent.send_local_layers(
-            neighbour=neighbour,
+        return await self.agent.send_local_layers_to_neighbours(
+            assignments=assignments,
             request_reply=True,
-            layers=layers,
-            thread=thread,
+            threads={n: str(uuid.uuid4()) for n in assignments},
             metadata=metadata,
             behaviour=self,
         )
-        self.agent.logger.debug(
-            f"[{self.agent.current_round}] Message sent to {neighbour.localpart} with the layers: {list(layers.keys())}."
-        )
 
     async def similarity_vector_exchange(self, neighbours: list[JID]) -> bool:
         vector = self.agent.similarity_manager.get_own_similarity_vector()
@@ -128,6 +135,9 @@ class CommunicationState(State):
             behaviour=self,
         )
         self.agent.logger.debug(
-            f"[{self.agent.current_round}] Sent to {neighbour.localpart} the vector: {vector.to_message().body} "
-            + f"with thread {thread}."
+            "[%s] Sent to %s the vector: %s with thread %s.",
+            self.agent.current_round,
+            neighbour.localpart,
+            vector.vector,
+            thread,
         )
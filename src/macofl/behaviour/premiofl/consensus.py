@@ -31,13 +31,25 @@ class ConsensusState(State):
             self.agent.logger.debug(
                 f"[{self.agent.current_round}] Receive consensus finished by timeout."
             )
+        if self.agent.model_manager.has_stable_layers():
+            # The model is training in the background, the consensus are merged when it finishes
+            self.agent.logger.debug(
+                f"[{self.agent.current_round}] ({consensus_it_id}) Consensus deferred until the training finishes."
+            )
+            return
         # Try to apply consensus
         self.agent.logger.debug(f"[{self.agent.current_round}] Starting consensus...")
         consensuateds = self.agent.consensus_manager.apply_all_consensus()
         if consensuateds:
+            start_t = consensuateds[0].processed_start_time_z
+            end_t = consensuateds[0].processed_end_time_z
+            seconds = (
+                (end_t - start_t).total_seconds() if start_t and end_t else float("nan")
+            )
             self.agent.logger.info(
                 f"[{self.agent.current_round}] ({consensus_it_id}) Consensus completed in ConsensusState "
-                + f"with neighbours: {[ct.sender.localpart for ct in consensuateds if ct.sender]}."
+                + f"in {seconds:.4f} seconds with neighbours: "
+                + f"{[ct.sender.localpart for ct in consensuateds if ct.sender]}."
             )
         else:
             self.agent.logger.debug(
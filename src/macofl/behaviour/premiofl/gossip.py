@@ -0,0 +1,184 @@
+import asyncio
+import traceback
+import uuid
+from typing import TYPE_CHECKING, Optional
+
+from aioxmpp import JID
+from spade.behaviour import FSMBehaviour, State
+
+from ...datatypes.consensus import Consensus
+from .train import TrainAndApplyConsensusState
+
+if TYPE_CHECKING:
+    from ...agent.premiofl.base import PremioFlAgent
+
+
+def apply_consensus_by_staleness(
+    agent: "PremioFlAgent", max_staleness_seconds: float, half_life_seconds: float
+) -> list[Consensus]:
+    applied, discarded = agent.consensus_manager.apply_all_consensus_by_staleness(
+        max_staleness_seconds=max_staleness_seconds,
+        half_life_seconds=half_life_seconds,
+    )
+    if discarded:
+        agent.logger.debug(
+            f"[{agent.current_round}] Stale consensus discarded from neighbours: "
+            + f"{[ct.sender.localpart for ct in discarded if ct.sender]}."
+        )
+    return applied
+
+
+class GossipTrainState(TrainAndApplyConsensusState):
+    def __init__(self, max_staleness_seconds: float, half_life_seconds: float) -> None:
+        self.max_staleness_seconds = max_staleness_seconds
+        self.half_life_seconds = half_life_seconds
+        super().__init__()
+
+    def apply_queued_consensus(self) -> list[Consensus]:
+        return apply_consensus_by_staleness(
+            agent=self.agent,
+            max_staleness_seconds=self.max_staleness_seconds,
+            half_life_seconds=self.half_life_seconds,
+        )
+
+
+class GossipState(State):
+    """
+    Pushes the assigned layers to the selected neighbours and merges the layers that have already
+    arrived, without waiting for any neighbour. The similarity vectors that are missing are requested
+    and used by the next iterations.
+    """
+
+    def __init__(self, max_staleness_seconds: float, half_life_seconds: float) -> None:
+        self.agent: PremioFlAgent
+        self.max_staleness_seconds = max_staleness_seconds
+        self.half_life_seconds = half_life_seconds
+        super().__init__()
+
+    async def run(self) -> None:
+        try:
+            selected_neighbours = self.agent.select_neighbours()
+            if selected_neighbours:
+                self.agent.logger.debug(
+                    f"[{self.agent.current_round}] Selected neighbours of GossipState: "
+                    + f"{[jid.localpart for jid in selected_neighbours]}"
+                )
+                request_neighbours = self.agent.get_neighbours_without_similarity(
+                    selected_neighbours
+                )
+                if (
+                    self.agent.similarity_manager.function is not None
+                    and request_neighbours
+                ):
+                    await self.request_similarity_vectors(neighbours=request_neighbours)
+
+                assignments = self.agent.assign_layers(selected_neighbours)
+                results = await self.agent.send_local_layers_to_neighbours(
+                    assignments=assignments,
+                    request_reply=False,
+                    metadata={"rf.conversation": "layers"},
+                    behaviour=self,
+                )
+                for n, error in results.items():
+                    if error is None:
+                        self.agent.logger.debug(
+                            f"[{self.agent.current_round}] Gossip layers of GossipState: "
+                            + f"{n.localpart} -> {list(assignments[n].keys())}"
+                        )
+                    else:
+                        self.agent.logger.error(
+                            f"[{self.agent.current_round}] Gossip layers of GossipState not sent to "
+                            + f"{n.localpart}: {error!r}"
+                        )
+            else:
+                # Lets the receiver behaviours run between the trainings
+                await asyncio.sleep(0)
+
+            if self.agent.model_manager.has_stable_layers():
+                # The model is training in the background, the consensus are merged when it finishes
+                self.agent.logger.debug(
+                    f"[{self.agent.current_round}] Consensus deferred until the training finishes."
+                )
+            else:
+                consensuateds = apply_consensus_by_staleness(
+                    agent=self.agent,
+                    max_staleness_seconds=self.max_staleness_seconds,
+                    half_life_seconds=self.half_life_seconds,
+                )
+                if consensuateds:
+                    self.agent.logger.info(
+                        f"[{self.agent.current_round}] Gossip consensus completed with neighbours: "
+                        + f"{[ct.sender.localpart for ct in consensuateds if ct.sender]}."
+                    )
+            self.set_next_state("train")
+
+        except Exception as e:
+            self.agent.logger.exception(e)
+            traceback.print_exc()
+
+    async def request_similarity_vectors(self, neighbours: list[JID]) -> None:
+        vector = self.agent.similarity_manager.get_own_similarity_vector()
+        if not vector:
+            raise ValueError(
+                "Trying to request similarity vectors without similarity function."
+            )
+        thread = str(uuid.uuid4())
+        vector.owner = self.agent.jid
+        vector.request_reply = True
+        for neighbour in neighbours:
+            await self.agent.send_similarity_vector(
+                neighbour=neighbour,
+                vector=vector,
+                thread=thread,
+                metadata={"rf.conversation": "similarity"},
+                behaviour=self,
+            )
+
+
+class GossipFsmBehaviour(FSMBehaviour):
+    """
+    Asynchronous variant of `PremioFsmBehaviour`: each iteration trains, pushes the layers and merges the
+    layers received so far, without barriers. The consensus are weighted by their staleness, so the layers
+    sent `half_life_seconds` ago move the model half as much as the fresh ones, and the consensus older than
+    `max_staleness_seconds` are discarded.
+    """
+
+    def __init__(
+        self,
+        max_staleness_seconds: float = 60,
+        half_life_seconds: Optional[float] = None,
+    ) -> None:
+        if max_staleness_seconds <= 0:
+            raise ValueError(
+                f"The max_staleness_seconds must be positive, but the current value is: {max_staleness_seconds}"
+            )
+        if half_life_seconds is None:
+            half_life_seconds = max_staleness_seconds / 4
+        if half_life_seconds <= 0:
+            raise ValueError(
+                f"The half_life_seconds must be positive, but the current value is: {half_life_seconds}"
+            )
+        self.agent: PremioFlAgent
+        self.max_staleness_seconds = max_staleness_seconds
+        self.half_life_seconds = half_life_seconds
+        self.train_state = GossipTrainState(
+            max_staleness_seconds=max_staleness_seconds,
+            half_life_seconds=half_life_seconds,
+        )
+        self.gossip_state = GossipState(
+            max_staleness_seconds=max_staleness_seconds,
+            half_life_seconds=half_life_seconds,
+        )
+        super().__init__()
+
+    def setup(self) -> None:
+        self.add_state(name="train", state=self.train_state, initial=True)
+        self.add_state(name="communication", state=self.gossip_state)
+        self.add_transition(source="train", dest="communication")
+        self.add_transition(source="communication", dest="train")
+
+    async def on_start(self) -> None:
+        self.agent.logger.debug("Gossip FSM algorithm started.")
+
+    async def on_end(self) -> None:
+        self.agent.logger.debug("Gossip FSM algorithm finished.")
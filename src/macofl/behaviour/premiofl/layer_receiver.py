@@ -3,8 +3,10 @@ from typing import TYPE_CHECKING, Optional, OrderedDict
 
 from aioxmpp import JID
 from spade.behaviour import CyclicBehaviour
+from spade.message import Message
 from torch import Tensor
 
+from ...codec.compression import TopKCompressor
 from ...datatypes.consensus import Consensus
 from ...message.message import RfMessage
 
@@ -20,65 +22,155 @@ class LayerReceiverBehaviour(CyclicBehaviour):
 
     async def run(self) -> None:
         timeout = 5
-        msg = await self.agent.receive(self, timeout=timeout)
-        if (
-            msg
-            and RfMessage.is_completed(message=msg)
-            and not self.agent.are_max_iterations_reached()
-        ):
-            self.agent.message_logger.log(
-                current_round=self.agent.current_round,
-                sender=msg.sender,
-                to=msg.to,
-                msg_type="RECV-LAYERS",
-                size=len(msg.body),
-                thread=msg.thread,
-            )
-            consensus_tr = Consensus.from_message(message=msg)
-            consensus_tr.sender = msg.sender.bare()
-            consensus_tr.received_time_z = datetime.now(tz=timezone.utc)  # zulu = utc+0
-
-            if not consensus_tr.sent_time_z:
-                error_msg = (
-                    f"[{self.agent.current_round}] Consensus message from {msg.sender.bare()} without "
-                    + "timestamp."
-                )
-                self.agent.logger.exception(error_msg)
-                raise ValueError(error_msg)
-
-            time_elapsed = consensus_tr.received_time_z - consensus_tr.sent_time_z
-            max_seconds_consensus = (
-                self.agent.consensus_manager.max_seconds_to_accept_consensus
-            )
-
-            if time_elapsed.total_seconds() <= max_seconds_consensus:
-                self.agent.logger.debug(
-                    f"[{self.agent.current_round}] Consensus message accepted in LayerReceiverBehaviour with "
-                    + f"time elapsed {time_elapsed.total_seconds():.2f}"
-                )
-                self.agent.consensus_manager.add_consensus(
-                    consensus=consensus_tr, thread=msg.thread
-                )
-
-            else:
-                self.agent.logger.debug(
-                    f"[{self.agent.current_round}] Consensus message discarted in LayerReceiverBehaviour because"
-                    + f" time elapsed is {time_elapsed.total_seconds():.2f} and maximum is {max_seconds_consensus:.2f}"
-                )
+        # Wakes up as soon as a message arrives and processes all the queued messages
+        msgs = await self.agent.receive_all(self, timeout=timeout)
+        self.log_multipart_evictions()
+        if msgs and not self.agent.are_max_iterations_reached():
+            for msg in msgs:
+                try:
+                    self.accept_consensus(msg)
+                except Exception as e:
+                    self.agent.logger.exception(
+                        f"[{self.agent.current_round}] Layers from {msg.sender.bare()} discarded: {e!r}"
+                    )
 
-            if not self.agent.model_manager.is_training():
+            # While the model trains, only the frozen stable layers can be sent
+            if (
+                not self.agent.model_manager.is_training()
+                or self.agent.model_manager.has_stable_layers()
+            ):
                 # Send consensus messages that require my response
                 pending_to_send = self.agent.consensus_manager.prepare_replies_to_send(
                     # sender=self.agent.jid.bare()
                 )
+                stable_layers = self.agent.model_manager.get_stable_layers()
                 for consensus, thread in pending_to_send:
-                    layers = self.agent.model_manager.get_layers(
-                        layers=list(consensus.layers.keys())
+                    layers = OrderedDict(
+                        (name, stable_layers[name]) for name in consensus.layers
                     )
                     await self.send_layers(
                         neighbour=consensus.sender, layers=layers, thread=thread
                     )
 
+    def accept_consensus(self, msg: RfMessage) -> None:
+        consensus_tr = (
+            msg.decoded
+            if isinstance(msg.decoded, Consensus)
+            else Consensus.from_message(message=msg)
+        )
+        self.agent.message_logger.log(
+            current_round=self.agent.current_round,
+            sender=msg.sender,
+            to=msg.to,
+            msg_type="RECV-LAYERS",
+            size=msg.size,
+            thread=msg.thread,
+            codec=consensus_tr.codec,
+        )
+        consensus_tr.sender = msg.sender.bare()
+        if self.agent.delta_transport is not None:
+            consensus_tr.layers = self.agent.delta_transport.decode(
+                sender=msg.sender,
+                payload=consensus_tr.layers,
+                transport=consensus_tr.transport,
+            )
+        compression = consensus_tr.transport.get("compression")
+        if compression is not None and compression["codec"] == TopKCompressor.name:
+            consensus_tr.layers = self.agent.topk_decoder.decode(
+                sender=msg.sender, payload=consensus_tr.layers, info=compression
+            )
+        if consensus_tr.transport.get("topk_resync", False):
+            # The neighbour lost our references, the next layers will be sent complete
+            self.agent.topk_decoder.reset(msg.sender)
+        consensus_tr.received_time_z = datetime.now(tz=timezone.utc)  # zulu = utc+0
+        if consensus_tr.similarity is not None:
+            self.accept_similarity(msg=msg, similarity=consensus_tr.similarity)
+
+        if not consensus_tr.sent_time_z:
+            error_msg = (
+                f"[{self.agent.current_round}] Consensus message from {msg.sender.bare()} without "
+                + "timestamp."
+            )
+            self.agent.logger.exception(error_msg)
+            raise ValueError(error_msg)
+
+        time_elapsed = consensus_tr.received_time_z - consensus_tr.sent_time_z
+        max_seconds_consensus = (
+            self.agent.consensus_manager.max_seconds_to_accept_consensus
+        )
+
+        if time_elapsed.total_seconds() <= max_seconds_consensus:
+            self.agent.logger.debug(
+                "[%s] Consensus message accepted in LayerReceiverBehaviour with time elapsed %.2f",
+                self.agent.current_round,
+                time_elapsed.total_seconds(),
+            )
+            self.agent.consensus_manager.add_consensus(
+                consensus=consensus_tr, thread=msg.thread
+            )
+
+        else:
+            self.agent.logger.debug(
+                "[%s] Consensus message discarted in LayerReceiverBehaviour because time elapsed is %.2f "
+                + "and maximum is %.2f",
+                self.agent.current_round,
+                time_elapsed.total_seconds(),
+                max_seconds_consensus,
+            )
+
+    def accept_similarity(self, msg: RfMessage, similarity: str) -> None:
+        """
+        Caches the similarity vector piggybacked on the layers, it is used by the next layer assignment.
+        The vector is discarded if the cached vector of the sender was sent later, e.g. the reply of a
+        similarity request that arrived before these layers.
+        """
+        try:
+            vector = self.agent.similarity_manager.decode_vector(
+                message=Message(sender=str(msg.sender), body=similarity)
+            )
+        except ValueError as e:
+            self.agent.logger.warning(
+                f"[{self.agent.current_round}] Similarity vector attached by {msg.sender.bare()} discarded: {e}"
+            )
+            return
+        cached = self.agent.similarity_manager.get_vector(msg.sender)
+        if (
+            cached is not None
+            and cached.sent_time_z is not None
+            and (vector.sent_time_z is None or vector.sent_time_z < cached.sent_time_z)
+        ):
+            self.agent.logger.debug(
+                f"[{self.agent.current_round}] Similarity vector attached by {msg.sender.bare()} discarded "
+                + "because the cached vector is newer."
+            )
+            return
+        self.agent.similarity_manager.add_similarity_vector(
+            neighbour=msg.sender, vector=vector, thread=None
+        )
+
+    def log_multipart_evictions(self) -> None:
+        for eviction in self.agent.pop_multipart_evictions():
+            self.agent.logger.warning(
+                "[%s] Multipart transfer %s from %s evicted by %s with %d/%d parts (%d bytes). "
+                + "Completed transfers: %d, evicted transfers: %d.",
+                self.agent.current_round,
+                eviction.uuid4,
+                eviction.sender,
+                eviction.reason,
+                eviction.received_parts,
+                eviction.total_parts,
+                eviction.stored_bytes,
+                self.agent.multipart_handler.completed_transfers,
+                self.agent.multipart_handler.evicted_transfers,
+            )
+            self.agent.message_logger.log(
+                current_round=self.agent.current_round,
+                sender="" if eviction.sender is None else eviction.sender,
+                to=self.agent.jid,
+                msg_type=f"EVICT-{eviction.reason.upper()}",
+                size=eviction.stored_bytes,
+            )
+
     async def send_layers(
         self,
         neighbour: JID,
@@ -95,5 +187,8 @@ class LayerReceiverBehaviour(CyclicBehaviour):
             behaviour=self,
         )
         self.agent.logger.debug(
-            f"[{self.agent.current_round}] Sent to {neighbour.localpart} the layers: {list(layers.keys())}."
+            "[%s] Sent to %s the layers: %s.",
+            self.agent.current_round,
+            neighbour.localpart,
+            list(layers.keys()),
         )
@@ -19,56 +19,73 @@ class SimilarityReceiverBehaviour(CyclicBehaviour):
 
     async def run(self) -> None:
         timeout = 5
-        msg = await self.agent.receive(self, timeout=timeout)
-        if (
-            msg
-            and RfMessage.is_completed(message=msg)
-            and not self.agent.are_max_iterations_reached()
-        ):
-            self.agent.message_logger.log(
-                current_round=self.agent.current_round,
-                sender=str(msg.sender.bare()),
-                to=str(msg.to.bare()),
-                msg_type="RECV-SIMILARITY",
-                size=len(msg.body),
-                thread=msg.thread,
-            )
-            vector = SimilarityVector.from_message(message=msg)
-            vector.received_time_z = datetime.now(tz=timezone.utc)  # zulu = utc+0
-
-            if not vector.sent_time_z:
-                error_msg = (
-                    f"[{self.agent.current_round}] Similarity vector from {msg.sender.bare()} without "
-                    + "timestamp."
+        # Wakes up as soon as a message arrives and processes all the queued messages
+        msgs = await self.agent.receive_all(self, timeout=timeout)
+        for msg in msgs:
+            if self.agent.are_max_iterations_reached():
+                break
+            try:
+                await self.accept_similarity_vector(msg)
+            except Exception as e:
+                self.agent.logger.exception(
+                    f"[{self.agent.current_round}] Similarity vector from {msg.sender.bare()} discarded: {e!r}"
                 )
-                self.agent.logger.exception(error_msg)
-                raise ValueError(error_msg)
 
-            self.agent.similarity_manager.add_similarity_vector(
-                neighbour=msg.sender, vector=vector, thread=msg.thread
+    async def accept_similarity_vector(self, msg: RfMessage) -> None:
+        self.agent.message_logger.log(
+            current_round=self.agent.current_round,
+            sender=str(msg.sender.bare()),
+            to=str(msg.to.bare()),
+            msg_type="RECV-SIMILARITY",
+            size=len(msg.body),
+            thread=msg.thread,
+        )
+        try:
+            vector = self.agent.similarity_manager.decode_vector(message=msg)
+        except ValueError as e:
+            self.agent.logger.warning(
+                f"[{self.agent.current_round}] Similarity vector from {msg.sender.bare()} discarded: {e}"
             )
+            return
+        vector.received_time_z = datetime.now(tz=timezone.utc)  # zulu = utc+0
 
-            seconds_since_message_sent = vector.received_time_z - vector.sent_time_z
-            self.agent.logger.debug(
-                f"[{self.agent.current_round}] Similarity vector ({msg.thread}) received from "
-                + f"{msg.sender.bare()} in SimilarityReceiverBehaviour with time elapsed "
-                + f"{seconds_since_message_sent.total_seconds():.2f}"
+        if not vector.sent_time_z:
+            error_msg = (
+                f"[{self.agent.current_round}] Similarity vector from {msg.sender.bare()} without "
+                + "timestamp."
             )
+            self.agent.logger.exception(error_msg)
+            raise ValueError(error_msg)
 
-            if vector.request_reply:
-                reply_vector = self.agent.similarity_manager.get_own_similarity_vector()
-                if not reply_vector:
-                    raise RuntimeError(
-                        "Trying to compute the similarity vector without similarity function."
-                    )
-                reply_vector.owner = self.agent.jid
-                await self.send_similarity_vector(
-                    thread=msg.thread, vector=reply_vector, neighbour=msg.sender
-                )
-                self.agent.logger.debug(
-                    f"[{self.agent.current_round}] Similarity vector ({msg.thread}) sent to "
-                    + f"{msg.sender.bare()} because it is an answer to request reply."
+        self.agent.similarity_manager.add_similarity_vector(
+            neighbour=msg.sender, vector=vector, thread=msg.thread
+        )
+
+        seconds_since_message_sent = vector.received_time_z - vector.sent_time_z
+        self.agent.logger.debug(
+            "[%s] Similarity vector (%s) received from %s in SimilarityReceiverBehaviour with time elapsed %.2f",
+            self.agent.current_round,
+            msg.thread,
+            msg.sender.bare(),
+            seconds_since_message_sent.total_seconds(),
+        )
+
+        if vector.request_reply:
+            reply_vector = self.agent.similarity_manager.get_own_similarity_vector()
+            if not reply_vector:
+                raise RuntimeError(
+                    "Trying to compute the similarity vector without similarity function."
                 )
+            reply_vector.owner = self.agent.jid
+            await self.send_similarity_vector(
+                thread=msg.thread, vector=reply_vector, neighbour=msg.sender
+            )
+            self.agent.logger.debug(
+                "[%s] Similarity vector (%s) sent to %s because it is an answer to request reply.",
+                self.agent.current_round,
+                msg.thread,
+                msg.sender.bare(),
+            )
 
     async def send_similarity_vector(
         self,
@@ -85,6 +102,9 @@ class SimilarityReceiverBehaviour(CyclicBehaviour):
             behaviour=self,
         )
         self.agent.logger.debug(
-            f"[{self.agent.current_round}] Sent to {neighbour.localpart} the vector: {vector.to_message().body} "
-            + f"with thread {thread}."
+            "[%s] Sent to %s the vector: %s with thread %s.",
+            self.agent.current_round,
+            neighbour.localpart,
+            vector.vector,
+            thread,
         )
@@ -1,8 +1,10 @@
+import asyncio
 import traceback
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 from spade.behaviour import State
 
+from ...datatypes.consensus import Consensus
 from ...datatypes.metrics import ModelMetrics
 
 if TYPE_CHECKING:
@@ -24,6 +26,7 @@ class TrainAndApplyConsensusState(State):
         self.agent.algorithm_logger.restart_chrono()
         self.agent.current_round += 1
         if self.agent.are_max_iterations_reached():
+            await self.finish_background_training()
             self.agent.logger.info(
                 f"[{self.agent.current_round - 1}] Stopping agent because max rounds "
                 + f"reached: {self.agent.current_round - 1}/{self.agent.max_rounds}"
@@ -38,23 +41,17 @@ class TrainAndApplyConsensusState(State):
     async def run(self) -> None:
         try:
             if not self.agent.are_max_iterations_reached():
-                # Train the model
-                self.agent.logger.debug(
-                    f"[{self.agent.current_round}] Starting training..."
-                )
-                metrics_train = self.agent.model_manager.train(
-                    train_logger=self.agent.nn_train_logger.log_train_epoch,
-                    agent_jid=self.agent.jid,
-                    current_round=self.agent.current_round,
-                )
-
-                metrics_validation = self.agent.model_manager.inference()
-                metrics_test = self.agent.model_manager.test_inference()
-                self.log_model_results(
-                    trains=metrics_train,
-                    validation=metrics_validation,
-                    test=metrics_test,
-                )
+                if self.agent.pipelined_training:
+                    # Safe point: the previous training has finished and the queued consensus are merged
+                    await self.finish_background_training()
+                    self.agent.model_manager.freeze_stable_layers()
+                    self.agent.training_task = asyncio.create_task(
+                        self.train_and_evaluate(current_round=self.agent.current_round)
+                    )
+                else:
+                    await self.train_and_evaluate(
+                        current_round=self.agent.current_round
+                    )
 
                 self.set_next_state("communication")
 
@@ -62,9 +59,61 @@ class TrainAndApplyConsensusState(State):
             self.agent.logger.exception(e)
             traceback.print_exc()
 
+    async def train_and_evaluate(self, current_round: int) -> None:
+        # Train the model
+        self.agent.logger.debug(f"[{current_round}] Starting training...")
+        executor = self.agent.training_executor
+        metrics_train = await executor.train(
+            model_manager=self.agent.model_manager,
+            train_logger=self.agent.nn_train_logger.log_train_epoch,
+            agent_jid=self.agent.jid,
+            current_round=current_round,
+        )
+
+        metrics_validation = await executor.inference(self.agent.model_manager)
+        metrics_test = await executor.test_inference(self.agent.model_manager)
+        self.log_model_results(
+            trains=metrics_train,
+            validation=metrics_validation,
+            test=metrics_test,
+            current_round=current_round,
+        )
+
+    async def finish_background_training(self) -> None:
+        """
+        Waits for the training started in the background by the previous round, if any, and merges the
+        consensus received meanwhile into the trained model. Then the stable layers are released.
+        """
+        task = self.agent.training_task
+        if task is None:
+            return
+        self.agent.training_task = None
+        try:
+            await task
+        finally:
+            consensuateds = self.apply_queued_consensus()
+            self.agent.model_manager.release_stable_layers()
+            if consensuateds:
+                self.agent.logger.info(
+                    f"[{self.agent.current_round}] Consensus merged after the background training with "
+                    + f"neighbours: {[ct.sender.localpart for ct in consensuateds if ct.sender]}."
+                )
+
+    def apply_queued_consensus(self) -> list[Consensus]:
+        """
+        Applies the consensus received while the model was training in the background.
+        """
+        return self.agent.consensus_manager.apply_all_consensus()
+
     def log_model_results(
-        self, trains: list[ModelMetrics], validation: ModelMetrics, test: ModelMetrics
+        self,
+        trains: list[ModelMetrics],
+        validation: ModelMetrics,
+        test: ModelMetrics,
+        current_round: Optional[int] = None,
     ) -> None:
+        if current_round is None:
+            current_round = self.agent.current_round
         if trains:
             start_t = trains[0].start_time_z
             end_t = trains[-1].end_time_z
@@ -73,12 +122,12 @@ class TrainAndApplyConsensusState(State):
                 mean_accuracy = sum(m.accuracy for m in trains) / len(trains)
                 mean_loss = sum(m.loss for m in trains) / len(trains)
                 self.agent.logger.info(
-                    f"[{self.agent.current_round}] Train completed in "
+                    f"[{current_round}] Train completed in "
                     + f"{train_time.total_seconds():.2f} seconds with mean accuracy {mean_accuracy:.6f} and mean"
                     + f" loss {mean_loss:.6f} iterating {len(trains)} epochs."
                 )
                 self.agent.nn_inference_logger.log(
-                    current_round=self.agent.current_round,
+                    current_round=current_round,
                     agent=self.agent.jid,
                     seconds=train_time.total_seconds(),
                     epochs=len(trains),
@@ -0,0 +1,6 @@
+from .binary import BinaryLayerCodec
+from .cache import LayerPayloadCache
+from .compression import LayerCompressor
+from .delta import DeltaTransport
+
+__all__ = ["BinaryLayerCodec", "DeltaTransport", "LayerCompressor", "LayerPayloadCache"]
@@ -0,0 +1,314 @@
+import base64
+import struct
+from typing import Iterator, Optional, OrderedDict
+
+import numpy as np
+import torch
+from torch import Tensor
+
+
+class BinaryLayerCodec:
+    """
+    Compact and versioned binary format to transfer the layers of a neural network model.
+
+    The payload is a header with the name, dtype and shape of each layer followed by the raw contiguous
+    bytes of every tensor (little-endian and aligned to `ALIGNMENT` bytes). The layout is:
+
+        magic (4s) | version (B) | num_layers (I)
+        for each layer: name_length (H) | name (utf-8) | dtype (B) | ndim (B) | shape (ndim * Q)
+        for each layer: padding | raw tensor bytes
+
+    Decoding copies the raw bytes straight into the destination tensors, so no intermediate
+    Python objects are built for the weights.
+    """
+
+    MAGIC: bytes = b"RFLC"
+    VERSION: int = 1
+    ALIGNMENT: int = 8
+    # Multiple of 3 bytes, so the base64 encoding of consecutive chunks can be concatenated
+    CHUNK_SIZE: int = 3 * 64 * 1024
+
+    # code: (torch dtype, numpy dtype used to move the raw bytes)
+    DTYPES: dict[int, tuple[torch.dtype, np.dtype]] = {
+        1: (torch.float32, np.dtype("<f4")),
+        2: (torch.float64, np.dtype("<f8")),
+        3: (torch.float16, np.dtype("<f2")),
+        4: (torch.bfloat16, np.dtype("<i2")),
+        5: (torch.int64, np.dtype("<i8")),
+        6: (torch.int32, np.dtype("<i4")),
+        7: (torch.int16, np.dtype("<i2")),
+        8: (torch.int8, np.dtype("i1")),
+        9: (torch.uint8, np.dtype("u1")),
+        10: (torch.bool, np.dtype("?")),
+    }
+    DTYPE_CODES: dict[torch.dtype, int] = {
+        torch_dtype: code for code, (torch_dtype, _) in DTYPES.items()
+    }
+
+    _PREAMBLE = struct.Struct("<4sBI")
+    _NAME_LENGTH = struct.Struct("<H")
+    _LAYER_INFO = struct.Struct("<BB")
+
+    @staticmethod
+    def _align(offset: int) -> int:
+        return -(-offset // BinaryLayerCodec.ALIGNMENT) * BinaryLayerCodec.ALIGNMENT
+
+    @staticmethod
+    def _as_numpy(tensor: Tensor) -> np.ndarray:
+        tensor = tensor.detach().cpu().contiguous()
+        if tensor.dtype == torch.bfloat16:
+            tensor = tensor.view(torch.int16)
+        return tensor.numpy().reshape(-1)
+
+    @staticmethod
+    def encode_header(layers: OrderedDict[str, Tensor]) -> bytes:
+        """
+        Builds the header of the binary payload without touching the tensor data.
+
+        Args:
+            layers (OrderedDict[str, Tensor]): The layer names with their tensors.
+
+        Raises:
+            ValueError: If a tensor dtype is not supported by the codec.
+
+        Returns:
+            bytes: The header of the payload.
+        """
+        chunks = [
+            BinaryLayerCodec._PREAMBLE.pack(
+                BinaryLayerCodec.MAGIC, BinaryLayerCodec.VERSION, len(layers)
+            )
+        ]
+        for name, tensor in layers.items():
+            if tensor.dtype not in BinaryLayerCodec.DTYPE_CODES:
+                raise ValueError(
+                    f"Layer {name} has the dtype {tensor.dtype} that is not supported by BinaryLayerCodec."
+                )
+            encoded_name = name.encode("utf-8")
+            chunks.append(BinaryLayerCodec._NAME_LENGTH.pack(len(encoded_name)))
+            chunks.append(encoded_name)
+            chunks.append(
+                BinaryLayerCodec._LAYER_INFO.pack(
+                    BinaryLayerCodec.DTYPE_CODES[tensor.dtype], tensor.dim()
+                )
+            )
+            chunks.append(struct.pack(f"<{tensor.dim()}Q", *tensor.shape))
+        return b"".join(chunks)
+
+    @staticmethod
+    def decode_header(
+        data: bytes | bytearray | memoryview,
+    ) -> tuple[list[tuple[str, torch.dtype, tuple[int, ...], int]], int]:
+        """
+        Parses the header of a binary payload.
+
+        Args:
+            data (bytes | bytearray | memoryview): The payload, or at least its header.
+
+        Raises:
+            ValueError: If the payload is not a `BinaryLayerCodec` payload, its version is not supported or
+                its header is truncated.
+
+        Returns:
+            tuple[list[tuple[str, torch.dtype, tuple[int, ...], int]], int]: The name, dtype, shape and
+            data offset of each layer, and the total size of the payload.
+        """
+        if len(data) < BinaryLayerCodec._PREAMBLE.size:
+            raise ValueError(
+                "The payload is too short to be a BinaryLayerCodec payload."
+            )
+        try:
+            return BinaryLayerCodec._read_header(data)
+        except struct.error as e:
+            raise ValueError(
+                f"The header of the BinaryLayerCodec payload is truncated: {e}"
+            ) from e
+
+    @staticmethod
+    def _read_header(
+        data: bytes | bytearray | memoryview,
+    ) -> tuple[list[tuple[str, torch.dtype, tuple[int, ...], int]], int]:
+        # Raises struct.error if the header is not complete, so the stream decoder can wait for more data
+        view = memoryview(data)
+        magic, version, num_layers = BinaryLayerCodec._PREAMBLE.unpack_from(view, 0)
+        if magic != BinaryLayerCodec.MAGIC:
+            raise ValueError("The payload is not a BinaryLayerCodec payload.")
+        if version != BinaryLayerCodec.VERSION:
+            raise ValueError(
+                f"BinaryLayerCodec payload version {version} is not supported (expected {BinaryLayerCodec.VERSION})."
+            )
+        offset = BinaryLayerCodec._PREAMBLE.size
+        infos: list[tuple[str, torch.dtype, tuple[int, ...]]] = []
+        for _ in range(num_layers):
+            (name_length,) = BinaryLayerCodec._NAME_LENGTH.unpack_from(view, offset)
+            offset += BinaryLayerCodec._NAME_LENGTH.size
+            if offset + name_length > len(view):
+                raise struct.error(f"the name of layer {len(infos)} is truncated")
+            name = bytes(view[offset : offset + name_length]).decode("utf-8")
+            offset += name_length
+            code, ndim = BinaryLayerCodec._LAYER_INFO.unpack_from(view, offset)
+            offset += BinaryLayerCodec._LAYER_INFO.size
+            shape: tuple[int, ...] = struct.unpack_from(f"<{ndim}Q", view, offset)
+            offset += 8 * ndim
+            if code not in BinaryLayerCodec.DTYPES:
+                raise ValueError(f"Unknown dtype code {code} for layer {name}.")
+            infos.append((name, BinaryLayerCodec.DTYPES[code][0], shape))
+
+        layers: list[tuple[str, torch.dtype, tuple[int, ...], int]] = []
+        for name, dtype, shape in infos:
+            offset = BinaryLayerCodec._align(offset)
+            layers.append((name, dtype, shape, offset))
+            offset += BinaryLayerCodec._nbytes(dtype, shape)
+        return layers, offset
+
+    @staticmethod
+    def _nbytes(dtype: torch.dtype, shape: tuple[int, ...]) -> int:
+        numel = 1
+        for dim in shape:
+            numel *= dim
+        return (
+            numel
+            * BinaryLayerCodec.DTYPES[BinaryLayerCodec.DTYPE_CODES[dtype]][1].itemsize
+        )
+
+    @staticmethod
+    def encode(layers: OrderedDict[str, Tensor]) -> bytearray:
+        """
+        Serializes the layers into a single preallocated buffer.
+
+        Args:
+            layers (OrderedDict[str, Tensor]): The layer names with their tensors.
+
+        Returns:
+            bytearray: The binary payload.
+        """
+        header = BinaryLayerCodec.encode_header(layers)
+        infos, total_size = BinaryLayerCodec.decode_header(header)
+        buffer = bytearray(total_size)
+        buffer[: len(header)] = header
+        for (_, _, _, offset), tensor in zip(infos, layers.values()):
+            source = BinaryLayerCodec._as_numpy(tensor)
+            target = np.frombuffer(
+                buffer, dtype=source.dtype, count=source.size, offset=offset
+            )
+            target[:] = source
+        return buffer
+
+    @staticmethod
+    def encoded_size(layers: OrderedDict[str, Tensor]) -> int:
+        """
+        Returns the size in bytes of the binary payload of the layers without serializing them.
+        """
+        return BinaryLayerCodec.decode_header(BinaryLayerCodec.encode_header(layers))[1]
+
+    @staticmethod
+    def iter_encode(
+        layers: OrderedDict[str, Tensor], chunk_size: int = CHUNK_SIZE
+    ) -> Iterator[bytes | memoryview]:
+        """
+        Serializes the layers tensor by tensor. The concatenation of the yielded chunks is the payload
+        of `encode`, but the payload is never held in memory: the tensor chunks are views of the tensor
+        memory (or of a contiguous copy of one tensor, if it is not contiguous).
+
+        Args:
+            layers (OrderedDict[str, Tensor]): The layer names with their tensors.
+            chunk_size (int, optional): Maximum size in bytes of the tensor chunks. Defaults to CHUNK_SIZE.
+
+        Raises:
+            ValueError: If `chunk_size` is not positive or a tensor dtype is not supported by the codec.
+
+        Returns:
+            Iterator[bytes | memoryview]: The chunks of the payload.
+        """
+        if chunk_size <= 0:
+            raise ValueError(
+                f"The chunk size must be a positive integer, but the current value is: {chunk_size}"
+            )
+        header = BinaryLayerCodec.encode_header(layers)
+        infos, _ = BinaryLayerCodec.decode_header(header)
+        yield header
+        position = len(header)
+        for (_, _, _, offset), tensor in zip(infos, layers.values()):
+            if offset > position:
+                yield bytes(offset - position)
+            data = memoryview(BinaryLayerCodec._as_numpy(tensor)).cast("B")
+            for start in range(0, len(data), chunk_size):
+                yield data[start : start + chunk_size]
+            position = offset + len(data)
+
+    @staticmethod
+    def decode(
+        data: bytes | bytearray | memoryview,
+        out: Optional[OrderedDict[str, Tensor]] = None,
+    ) -> OrderedDict[str, Tensor]:
+        """
+        Deserializes a binary payload. If `out` is given, the tensors with the same names are
+        filled in-place instead of allocating new ones.
+
+        Args:
+            data (bytes | bytearray | memoryview): The binary payload.
+            out (Optional[OrderedDict[str, Tensor]], optional): Preallocated tensors. Defaults to None.
+
+        Raises:
+            ValueError: If the payload is malformed or a preallocated tensor does not match the layer.
+
+        Returns:
+            OrderedDict[str, Tensor]: The layer names with their tensors.
+        """
+        infos, total_size = BinaryLayerCodec.decode_header(data)
+        if len(data) < total_size:
+            raise ValueError(
+                f"The payload is truncated: {len(data)} bytes of {total_size}."
+            )
+        layers: OrderedDict[str, Tensor] = OrderedDict()
+        for name, dtype, shape, offset in infos:
+            tensor: Tensor
+            if out is not None and name in out:
+                tensor = out[name]
+                if tensor.dtype != dtype or tuple(tensor.shape) != shape:
+                    raise ValueError(
+                        f"Preallocated tensor of layer {name} is {tensor.dtype}{tuple(tensor.shape)} "
+                        + f"but the payload has {dtype}{shape}."
+                    )
+            else:
+                tensor = torch.empty(shape, dtype=dtype)
+            BinaryLayerCodec.read_into(tensor, data, offset)
+            layers[name] = tensor
+        return layers
+
+    @staticmethod
+    def read_into(
+        tensor: Tensor, data: bytes | bytearray | memoryview, offset: int
+    ) -> None:
+        """
+        Copies the raw bytes stored at `offset` into `tensor`.
+        """
+        np_dtype = BinaryLayerCodec.DTYPES[BinaryLayerCodec.DTYPE_CODES[tensor.dtype]][
+            1
+        ]
+        source = np.frombuffer(
+            data, dtype=np_dtype, count=tensor.numel(), offset=offset
+        )
+        target = tensor.detach()
+        if target.dtype == torch.bfloat16:
+            target = target.view(torch.int16)
+        if target.device.type == "cpu" and target.is_contiguous():
+            target.numpy().reshape(-1)[:] = source
+        else:
+            target.copy_(torch.from_numpy(source.copy()).view(target.shape))
+
+    @staticmethod
+    def encode_base64(layers: OrderedDict[str, Tensor]) -> str:
+        """
+        Serializes the layers into a base64 string ready to be sent inside a XMPP message body.
+        """
+        return base64.b64encode(BinaryLayerCodec.encode(layers)).decode("ascii")
+
+    @staticmethod
+    def decode_base64(
+        content: str, out: Optional[OrderedDict[str, Tensor]] = None
+    ) -> OrderedDict[str, Tensor]:
+        """
+        Deserializes the layers of a base64 string generated by `encode_base64`.
+        """
+        return BinaryLayerCodec.decode(base64.b64decode(content), out=out)
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class LayerPayloadCache:
+    """
+    Cache of the encoded layers of a model, so the same layers are serialized once no matter how many
+    neighbours receive them. The entries are keyed by (model version, layer names, codec): when a
+    newer model version is requested (after a training or a consensus) all the entries of the older
+    versions are discarded. At most `max_entries` layer sets of the same version are kept (LRU).
+    """
+
+    def __init__(self, max_entries: int = 8) -> None:
+        if max_entries <= 0:
+            raise ValueError(
+                f"The max_entries must be a positive integer, but the current value is: {max_entries}"
+            )
+        self.max_entries = max_entries
+        self._entries: OrderedDict[
+            tuple[int, tuple[str, ...], str], tuple[str, dict[str, Any]]
+        ] = OrderedDict()
+        self._version: Optional[int] = None
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def get_key(
+        model_version: int, layer_names: tuple[str, ...], codec: str
+    ) -> tuple[int, tuple[str, ...], str]:
+        return (model_version, layer_names, codec)
+
+    def get(
+        self, key: tuple[int, tuple[str, ...], str]
+    ) -> Optional[tuple[str, dict[str, Any]]]:
+        """
+        Returns the encoded layers and their transport information, or None if they are not cached.
+        """
+        self._discard_older_versions(key[0])
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(
+        self,
+        key: tuple[int, tuple[str, ...], str],
+        encoded: tuple[str, dict[str, Any]],
+    ) -> None:
+        self._discard_older_versions(key[0])
+        self._entries[key] = encoded
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+        self._version = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard_older_versions(self, model_version: int) -> None:
+        if self._version != model_version:
+            self._entries.clear()
+            self._version = model_version
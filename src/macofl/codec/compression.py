@@ -0,0 +1,355 @@
+import threading
+from abc import ABCMeta, abstractmethod
+from typing import Any, Optional, OrderedDict
+
+import torch
+from aioxmpp import JID
+from torch import Tensor
+
+
+class LayerCompressor(object, metaclass=ABCMeta):
+    """
+    Lossy compression of the layers before they are serialized. Only the floating point layers are
+    compressed, the rest are sent as they are. The compressed tensors can use extra entries named
+    `<layer>:<part>` and the information needed to decompress them travels in a JSON-serializable
+    dict, so the receiver does not need to know the settings of the sender.
+    """
+
+    name: str = "none"
+    # True if the result depends on the previous messages to the same neighbour
+    stateful: bool = False
+
+    def compress(
+        self, layers: OrderedDict[str, Tensor], neighbour: Optional[JID] = None
+    ) -> tuple[OrderedDict[str, Tensor], dict[str, Any]]:
+        """
+        Compresses the layers.
+
+        Args:
+            layers (OrderedDict[str, Tensor]): The layers to compress.
+            neighbour (Optional[JID], optional): The receiver, used by the stateful compressors. Defaults to None.
+
+        Returns:
+            tuple[OrderedDict[str, Tensor], dict[str, Any]]: The tensors to send and the compression information.
+        """
+        payload: OrderedDict[str, Tensor] = OrderedDict()
+        info: dict[str, Any] = {"codec": self.name, "layers": {}}
+        for name, tensor in layers.items():
+            tensor = tensor.detach()
+            if tensor.is_floating_point():
+                payload.update(self._compress_tensor(name, tensor, neighbour))
+                info["layers"][name] = [
+                    str(tensor.dtype).replace("torch.", ""),
+                    list(tensor.shape),
+                ]
+            else:
+                payload[name] = tensor
+        return payload, info
+
+    @staticmethod
+    def decompress(
+        payload: OrderedDict[str, Tensor], info: dict[str, Any]
+    ) -> OrderedDict[str, Tensor]:
+        """
+        Decompresses the layers compressed by any `LayerCompressor`.
+
+        Args:
+            payload (OrderedDict[str, Tensor]): The received tensors.
+            info (dict[str, Any]): The compression information sent with the tensors.
+
+        Raises:
+            ValueError: If the codec is not known.
+
+        Returns:
+            OrderedDict[str, Tensor]: The decompressed layers with their original dtypes.
+        """
+        compressor_cls = COMPRESSORS.get(info["codec"])
+        if compressor_cls is None:
+            raise ValueError(f"Unknown layer compression codec {info['codec']}.")
+        compressed_layers: dict[str, list[Any]] = info["layers"]
+        layers: OrderedDict[str, Tensor] = OrderedDict()
+        for name, tensor in payload.items():
+            base_name = name.split(":", 1)[0]
+            if base_name in layers:
+                continue
+            if base_name in compressed_layers:
+                dtype_name, shape = compressed_layers[base_name]
+                layers[base_name] = compressor_cls._decompress_tensor(
+                    base_name, payload, getattr(torch, dtype_name), tuple(shape)
+                )
+            else:
+                layers[name] = tensor
+        return layers
+
+    @staticmethod
+    def is_stateful_codec(codec: str) -> bool:
+        """
+        Returns whether the layers of `codec` depend on the previous messages of the sender, so they
+        can not be decompressed by `decompress` (e.g. the top-k differences).
+        """
+        compressor_cls = COMPRESSORS.get(codec)
+        return compressor_cls is not None and compressor_cls.stateful
+
+    @staticmethod
+    def from_name(name: str, **kwargs: Any) -> "LayerCompressor":
+        """
+        Builds the compressor registered with `name` ("none", "fp16", "bf16", "int8" or "topk").
+        """
+        if name not in COMPRESSORS:
+            raise ValueError(
+                f"Layer compression codec must be one of {list(COMPRESSORS.keys())} and it is {name}."
+            )
+        return COMPRESSORS[name](**kwargs)
+
+    def _compress_tensor(
+        self, name: str, tensor: Tensor, neighbour: Optional[JID]
+    ) -> OrderedDict[str, Tensor]:
+        return OrderedDict({name: tensor})
+
+    @staticmethod
+    def _decompress_tensor(
+        name: str,
+        payload: OrderedDict[str, Tensor],
+        dtype: torch.dtype,
+        shape: tuple[int, ...],
+    ) -> Tensor:
+        return payload[name].to(dtype)
+
+
+class NoCompressor(LayerCompressor):
+    name = "none"
+
+
+class Fp16Compressor(LayerCompressor):
+    """
+    Casts the floating point layers to float16.
+    """
+
+    name = "fp16"
+
+    def _compress_tensor(
+        self, name: str, tensor: Tensor, neighbour: Optional[JID]
+    ) -> OrderedDict[str, Tensor]:
+        return OrderedDict({name: tensor.to(torch.float16)})
+
+
+class Bf16Compressor(LayerCompressor):
+    """
+    Casts the floating point layers to bfloat16, with the float32 range and less precision than float16.
+    """
+
+    name = "bf16"
+
+    def _compress_tensor(
+        self, name: str, tensor: Tensor, neighbour: Optional[JID]
+    ) -> OrderedDict[str, Tensor]:
+        return OrderedDict({name: tensor.to(torch.bfloat16)})
+
+
+class Int8Compressor(LayerCompressor):
+    """
+    Per-tensor affine quantization to int8. Each layer sends its int8 values with the scale and
+    the zero point (the minimum value) as `<layer>:scale` and `<layer>:zero_point`.
+    """
+
+    name = "int8"
+
+    def _compress_tensor(
+        self, name: str, tensor: Tensor, neighbour: Optional[JID]
+    ) -> OrderedDict[str, Tensor]:
+        values = tensor.to(torch.float32)
+        minimum = values.min() if values.numel() > 0 else torch.tensor(0.0)
+        maximum = values.max() if values.numel() > 0 else torch.tensor(0.0)
+        scale = (maximum - minimum) / 255
+        scale = torch.where(scale > 0, scale, torch.ones_like(scale))
+        quantized = (
+            torch.round((values - minimum) / scale).clamp_(0, 255).sub_(128)
+        ).to(torch.int8)
+        return OrderedDict(
+            {
+                name: quantized,
+                f"{name}:scale": scale.reshape(1),
+                f"{name}:zero_point": minimum.reshape(1),
+            }
+        )
+
+    @staticmethod
+    def _decompress_tensor(
+        name: str,
+        payload: OrderedDict[str, Tensor],
+        dtype: torch.dtype,
+        shape: tuple[int, ...],
+    ) -> Tensor:
+        values = (payload[name].to(torch.float32) + 128) * payload[f"{name}:scale"]
+        return (values + payload[f"{name}:zero_point"]).to(dtype).reshape(shape)
+
+
+class TopKCompressor(LayerCompressor):
+    """
+    Top-k sparsification of the layer updates with error feedback. Like `DeltaTransport`, the sender keeps
+    for each neighbour and layer the version and the tensor that the neighbour has reconstructed. A layer
+    is sent complete the first time, and then only the `ratio` elements of the difference with respect to
+    that reference with the largest magnitude are sent as `<layer>:indices` and `<layer>:values`. The
+    receiver rebuilds the layer as its reference plus the sparse difference.
+
+    The part of the difference that is not sent is the error-feedback residual: the reference does not
+    include it, so it stays in the difference of the next message to the same neighbour and the
+    reconstruction converges to the real weights.
+
+    The receiver keeps the references of each sender in its own `TopKCompressor` and decodes the layers
+    with `decode`. When it gets a difference against a version it does not have, it drops the layer and
+    asks for a full resend with `pop_resync` in its next message to that neighbour.
+    """
+
+    name = "topk"
+    stateful = True
+
+    def __init__(self, ratio: float = 0.1) -> None:
+        if not 0 < ratio <= 1:
+            raise ValueError(f"The top-k ratio must be in (0, 1] and it is {ratio}.")
+        self.ratio = ratio
+        self._sent: dict[Optional[JID], dict[str, tuple[int, Tensor]]] = {}
+        self._received: dict[JID, dict[str, tuple[int, Tensor]]] = {}
+        self._resync: set[JID] = set()
+        self._lock = threading.Lock()
+
+    def compress(
+        self, layers: OrderedDict[str, Tensor], neighbour: Optional[JID] = None
+    ) -> tuple[OrderedDict[str, Tensor], dict[str, Any]]:
+        key = None if neighbour is None else neighbour.bare()
+        payload: OrderedDict[str, Tensor] = OrderedDict()
+        info: dict[str, Any] = {"codec": self.name, "layers": {}, "delta": {}}
+        with self._lock:
+            references = self._sent.setdefault(key, {})
+            for name, tensor in layers.items():
+                tensor = tensor.detach().cpu()
+                if not tensor.is_floating_point():
+                    payload[name] = tensor
+                    continue
+                info["layers"][name] = [
+                    str(tensor.dtype).replace("torch.", ""),
+                    list(tensor.shape),
+                ]
+                previous = references.get(name)
+                version = 1 if previous is None else previous[0] + 1
+                if (
+                    previous is None
+                    or previous[1].shape != tensor.shape
+                    or previous[1].dtype != tensor.dtype
+                ):
+                    # The sent tensor must be the reference, the layer may change while it is streamed
+                    snapshot = tensor.clone()
+                    payload[name] = snapshot
+                    info["delta"][name] = [None, version, "full"]
+                    references[name] = (version, snapshot)
+                    continue
+                reference = previous[1].clone()
+                # Difference with respect to what the neighbour has, it includes the residual not sent yet
+                difference = (tensor - reference).to(torch.float32).reshape(-1)
+                k = (
+                    max(1, int(self.ratio * difference.numel()))
+                    if difference.numel()
+                    else 0
+                )
+                indices = torch.topk(difference.abs(), k, sorted=False).indices
+                values = difference[indices].to(tensor.dtype)
+                reference.view(-1)[indices] += values
+                payload[f"{name}:indices"] = indices.to(torch.int32)
+                payload[f"{name}:values"] = values
+                info["delta"][name] = [previous[0], version, "sparse"]
+                references[name] = (version, reference)
+        return payload, info
+
+    @staticmethod
+    def _decompress_tensor(
+        name: str,
+        payload: OrderedDict[str, Tensor],
+        dtype: torch.dtype,
+        shape: tuple[int, ...],
+    ) -> Tensor:
+        raise ValueError(
+            f"The top-k layer {name} is a difference, it must be decoded with the references of its sender."
+        )
+
+    def decode(
+        self, sender: JID, payload: OrderedDict[str, Tensor], info: dict[str, Any]
+    ) -> OrderedDict[str, Tensor]:
+        """
+        Rebuilds the layers sent by `sender` as the reference of the sender plus the sparse differences.
+        The layers whose reference version does not match are dropped, and a full resend is requested
+        to `sender`.
+
+        Args:
+            sender (JID): The sender of the layers.
+            payload (OrderedDict[str, Tensor]): The received tensors.
+            info (dict[str, Any]): The compression information sent with the tensors.
+
+        Returns:
+            OrderedDict[str, Tensor]: The reconstructed layers.
+        """
+        sender = sender.bare()
+        delta: dict[str, list[Any]] = info.get("delta", {})
+        layers: OrderedDict[str, Tensor] = OrderedDict()
+        with self._lock:
+            references = self._received.setdefault(sender, {})
+            for name, tensor in payload.items():
+                base_name = name.split(":", 1)[0]
+                if base_name in layers:
+                    continue
+                if base_name not in delta:
+                    layers[name] = tensor
+                    continue
+                base, version, kind = delta[base_name]
+                if kind == "full":
+                    tensor = tensor.clone()
+                else:
+                    reference = references.get(base_name)
+                    if reference is None or reference[0] != base:
+                        references.pop(base_name, None)
+                        self._resync.add(sender)
+                        continue
+                    tensor = reference[1].clone()
+                    tensor.view(-1)[payload[f"{base_name}:indices"].long()] += payload[
+                        f"{base_name}:values"
+                    ].to(tensor.dtype)
+                references[base_name] = (version, tensor.clone())
+                layers[base_name] = tensor
+        return layers
+
+    def pop_resync(self, neighbour: JID) -> bool:
+        """
+        Returns whether `neighbour` must resend its layers complete, and clears the request.
+        """
+        with self._lock:
+            resync = neighbour.bare() in self._resync
+            self._resync.discard(neighbour.bare())
+        return resync
+
+    def reset(self, neighbour: Optional[JID] = None) -> None:
+        """
+        Discards the references sent to `neighbour`, or to all the neighbours if it is None, so the next
+        layers are sent complete.
+        """
+        with self._lock:
+            if neighbour is None:
+                self._sent.clear()
+            else:
+                self._sent.pop(neighbour.bare(), None)
+
+    def forget(self, neighbour: JID) -> None:
+        """
+        Removes all the references exchanged with `neighbour`.
+        """
+        with self._lock:
+            self._sent.pop(neighbour.bare(), None)
+            self._received.pop(neighbour.bare(), None)
+            self._resync.discard(neighbour.bare())
+
+
+COMPRESSORS: dict[str, type[LayerCompressor]] = {
+    NoCompressor.name: NoCompressor,
+    Fp16Compressor.name: Fp16Compressor,
+    Bf16Compressor.name: Bf16Compressor,
+    Int8Compressor.name: Int8Compressor,
+    TopKCompressor.name: TopKCompressor,
+}
@@ -0,0 +1,199 @@
+import threading
+from typing import Any, Optional, OrderedDict
+
+import torch
+from aioxmpp import JID
+from torch import Tensor
+
+
+class DeltaTransport:
+    """
+    Sends the layers as differences with respect to the last version exchanged with each neighbour.
+
+    The sender keeps, for each neighbour and layer, the version id and the tensor that the neighbour
+    has reconstructed, and the receiver keeps the last reconstructed tensor of each neighbour and layer.
+    A layer is sent complete the first time, and then as a difference with respect to that reference:
+
+        - "sparse": the indices and new values of the elements that changed more than `threshold`.
+          With `threshold` = 0 the transport is lossless. If the changes are not sparse enough, the
+          full tensor is sent instead.
+        - "fp16": the dense difference casted to float16.
+
+    Both ends update their reference with the same operations, so the lossy differences do not drift:
+    the error of one iteration is part of the difference of the next one. When the receiver gets a
+    difference against a version it does not have, it drops the layer and asks for a full resend with
+    the `resync` flag of its next message to that neighbour.
+
+    The transport information travels as a JSON-serializable dict, and the differences as extra
+    tensors named `<layer>:indices`, `<layer>:values` or `<layer>:diff`.
+    """
+
+    MODES = ("sparse", "fp16")
+
+    def __init__(self, mode: str = "sparse", threshold: float = 0.0) -> None:
+        if mode not in DeltaTransport.MODES:
+            raise ValueError(
+                f"Delta transport mode must be one of {DeltaTransport.MODES} and it is {mode}."
+            )
+        if threshold < 0:
+            raise ValueError(
+                f"The threshold must be zero or positive, but the current value is: {threshold}"
+            )
+        self.mode = mode
+        self.threshold = threshold
+        self._sent: dict[JID, dict[str, tuple[int, Tensor]]] = {}
+        self._received: dict[JID, dict[str, tuple[int, Tensor]]] = {}
+        self._resync: set[JID] = set()
+        self._lock = threading.Lock()
+
+    def encode(
+        self, neighbour: JID, layers: OrderedDict[str, Tensor]
+    ) -> tuple[OrderedDict[str, Tensor], dict[str, Any]]:
+        """
+        Builds the payload to send `layers` to `neighbour` and updates the references of the neighbour.
+
+        Args:
+            neighbour (JID): The receiver of the layers.
+            layers (OrderedDict[str, Tensor]): The layers to send.
+
+        Returns:
+            tuple[OrderedDict[str, Tensor], dict[str, Any]]: The tensors to send and the transport information.
+        """
+        neighbour = neighbour.bare()
+        payload: OrderedDict[str, Tensor] = OrderedDict()
+        delta: dict[str, list[Any]] = {}
+        with self._lock:
+            references = self._sent.setdefault(neighbour, {})
+            for name, tensor in layers.items():
+                tensor = tensor.detach().cpu()
+                previous = references.get(name)
+                version = 1 if previous is None else previous[0] + 1
+                encoded = (
+                    self._encode_difference(name, tensor, previous[1])
+                    if previous is not None
+                    and tensor.is_floating_point()
+                    and previous[1].shape == tensor.shape
+                    and previous[1].dtype == tensor.dtype
+                    else None
+                )
+                if encoded is None:
+                    # The sent tensor must be the reference, the layer may change while it is streamed
+                    snapshot = tensor.clone()
+                    payload[name] = snapshot
+                    delta[name] = [None, version, "full"]
+                    references[name] = (version, snapshot)
+                else:
+                    kind, tensors, reconstructed = encoded
+                    payload.update(tensors)
+                    delta[name] = [previous[0], version, kind]  # type: ignore
+                    references[name] = (version, reconstructed)
+            resync = neighbour in self._resync
+            self._resync.discard(neighbour)
+        return payload, {"delta": delta, "resync": resync}
+
+    def decode(
+        self,
+        sender: JID,
+        payload: OrderedDict[str, Tensor],
+        transport: Optional[dict[str, Any]],
+    ) -> OrderedDict[str, Tensor]:
+        """
+        Reconstructs the full layers sent by `sender`. The layers whose reference version does not match
+        are dropped, and a full resend is requested to `sender`.
+
+        Args:
+            sender (JID): The sender of the layers.
+            payload (OrderedDict[str, Tensor]): The received tensors.
+            transport (Optional[dict[str, Any]]): The received transport information. If it has no
+            delta information the payload is returned as is.
+
+        Returns:
+            OrderedDict[str, Tensor]: The reconstructed layers.
+        """
+        if not transport or "delta" not in transport:
+            return payload
+        sender = sender.bare()
+        layers: OrderedDict[str, Tensor] = OrderedDict()
+        with self._lock:
+            if transport.get("resync", False):
+                # The neighbour lost our references, the next layers will be sent complete
+                self._sent.pop(sender, None)
+            references = self._received.setdefault(sender, {})
+            for name, (base, version, kind) in transport["delta"].items():
+                if kind == "full":
+                    tensor = payload[name]
+                else:
+                    reference = references.get(name)
+                    if reference is None or reference[0] != base:
+                        references.pop(name, None)
+                        self._resync.add(sender)
+                        continue
+                    tensor = DeltaTransport._apply_difference(
+                        name, kind, reference[1], payload
+                    )
+                references[name] = (version, tensor.clone())
+                layers[name] = tensor
+        return layers
+
+    def needs_resync(self, neighbour: JID) -> bool:
+        return neighbour.bare() in self._resync
+
+    def forget(self, neighbour: JID) -> None:
+        """
+        Removes all the references exchanged with `neighbour`.
+        """
+        with self._lock:
+            self._sent.pop(neighbour.bare(), None)
+            self._received.pop(neighbour.bare(), None)
+            self._resync.discard(neighbour.bare())
+
+    def _encode_difference(
+        self, name: str, tensor: Tensor, reference: Tensor
+    ) -> Optional[tuple[str, OrderedDict[str, Tensor], Tensor]]:
+        tensors: OrderedDict[str, Tensor] = OrderedDict()
+        difference = tensor - reference
+        if self.mode == "fp16":
+            tensors[f"{name}:diff"] = difference.to(torch.float16)
+            return (
+                "fp16",
+                tensors,
+                DeltaTransport._apply_difference(name, "fp16", reference, tensors),
+            )
+
+        flat_difference = difference.reshape(-1)
+        mask = (
+            flat_difference != 0
+            if self.threshold == 0
+            else flat_difference.abs() > self.threshold
+        )
+        indices = mask.nonzero().reshape(-1)
+        values = tensor.reshape(-1)[indices]
+        index_size = 4 if tensor.numel() < 2**31 else 8
+        if (
+            indices.numel() * (index_size + values.element_size())
+            >= tensor.numel() * tensor.element_size()
+        ):
+            return None
+        if tensor.numel() < 2**31:
+            indices = indices.to(torch.int32)
+        tensors[f"{name}:indices"] = indices
+        tensors[f"{name}:values"] = values
+        return (
+            "sparse",
+            tensors,
+            DeltaTransport._apply_difference(name, "sparse", reference, tensors),
+        )
+
+    @staticmethod
+    def _apply_difference(
+        name: str, kind: str, reference: Tensor, tensors: OrderedDict[str, Tensor]
+    ) -> Tensor:
+        if kind == "fp16":
+            return reference + tensors[f"{name}:diff"].to(reference.dtype)
+        if kind == "sparse":
+            reconstructed = reference.clone()
+            flat = reconstructed.view(-1)
+            indices = tensors[f"{name}:indices"].long()
+            flat[indices] = tensors[f"{name}:values"]
+            return reconstructed
+        raise ValueError(f"Unknown delta kind {kind} for layer {name}.")
@@ -0,0 +1,159 @@
+import base64
+import struct
+from typing import Iterable, Iterator, Optional, OrderedDict
+
+import numpy as np
+import torch
+from torch import Tensor
+
+from .binary import BinaryLayerCodec
+
+
+def iter_base64(chunks: Iterable[bytes | memoryview]) -> Iterator[str]:
+    """
+    Encodes a stream of bytes chunks into base64 pieces. The concatenation of the pieces is the base64
+    encoding of the concatenation of the chunks, because every piece encodes a multiple of 3 bytes except
+    the last one. At most 2 bytes are carried from one chunk to the next one.
+
+    Args:
+        chunks (Iterable[bytes | memoryview]): The bytes to encode.
+
+    Returns:
+        Iterator[str]: The base64 pieces.
+    """
+    carry = b""
+    for chunk in chunks:
+        if carry:
+            chunk = carry + bytes(chunk)
+        end = len(chunk) - len(chunk) % 3
+        carry = bytes(chunk[end:])
+        if end > 0:
+            yield base64.b64encode(chunk[:end]).decode("ascii")
+    if carry:
+        yield base64.b64encode(carry).decode("ascii")
+
+
+def base64_length(num_bytes: int) -> int:
+    """
+    Returns the length of the base64 encoding (with padding) of `num_bytes` bytes.
+    """
+    return 4 * -(-num_bytes // 3)
+
+
+class Base64StreamDecoder:
+    """
+    Decodes a base64 string received in pieces of any length. At most 3 characters are carried from one
+    piece to the next one.
+    """
+
+    def __init__(self) -> None:
+        self._carry = ""
+
+    def feed(self, content: str) -> bytes:
+        if self._carry:
+            content = self._carry + content
+        end = len(content) - len(content) % 4
+        self._carry = content[end:]
+        return base64.b64decode(content[:end]) if end > 0 else b""
+
+    def finish(self) -> None:
+        if self._carry:
+            raise ValueError(
+                f"The base64 content is truncated: {len(self._carry)} characters left."
+            )
+
+
+class LayerStreamDecoder:
+    """
+    Incremental version of `BinaryLayerCodec.decode`. The payload is received in chunks of any size:
+    the header is buffered until it is complete, then the tensors are allocated and every chunk is
+    copied straight into their memory, so the payload is never held in memory.
+    """
+
+    def __init__(self) -> None:
+        self._header = bytearray()
+        self._layers: Optional[OrderedDict[str, Tensor]] = None
+        # (start, end, flat uint8 view of the tensor memory) of each layer, in payload order
+        self._targets: list[tuple[int, int, np.ndarray]] = []
+        self._target_index = 0
+        self._position = 0
+        self._total_size = 0
+
+    @property
+    def received_bytes(self) -> int:
+        return self._position
+
+    def feed(self, data: bytes | bytearray | memoryview) -> None:
+        """
+        Decodes the next chunk of the payload.
+
+        Args:
+            data (bytes | bytearray | memoryview): The chunk.
+
+        Raises:
+            ValueError: If the payload is malformed or it is longer than its header says.
+        """
+        view = memoryview(data).cast("B")
+        if self._layers is None:
+            self._header += view
+            if not self._parse_header():
+                return
+            view = memoryview(bytes(self._header))
+            self._header = bytearray()
+            self._position = 0
+
+        end = self._position + len(view)
+        if end > self._total_size:
+            raise ValueError(
+                f"The payload is longer than expected: {end} bytes of {self._total_size}."
+            )
+        while self._target_index < len(self._targets):
+            start, stop, target = self._targets[self._target_index]
+            if start >= end:
+                break
+            first = max(start, self._position)
+            last = min(stop, end)
+            if last > first:
+                source = np.frombuffer(
+                    view,
+                    dtype=np.uint8,
+                    count=last - first,
+                    offset=first - self._position,
+                )
+                target[first - start : last - start] = source
+            if last < stop:
+                break
+            self._target_index += 1
+        self._position = end
+
+    def finish(self) -> OrderedDict[str, Tensor]:
+        """
+        Returns the decoded layers.
+
+        Raises:
+            ValueError: If the payload is not complete.
+        """
+        if self._layers is None or self._position < self._total_size:
+            raise ValueError(
+                f"The payload is truncated: {self._position} bytes of {self._total_size}."
+            )
+        return self._layers
+
+    def _parse_header(self) -> bool:
+        if len(self._header) < BinaryLayerCodec._PREAMBLE.size:
+            return False
+        try:
+            infos, total_size = BinaryLayerCodec._read_header(self._header)
+        except (struct.error, UnicodeDecodeError):
+            # The header is not complete yet
+            return False
+        layers: OrderedDict[str, Tensor] = OrderedDict()
+        for name, dtype, shape, offset in infos:
+            tensor = torch.empty(shape, dtype=dtype)
+            layers[name] = tensor
+            target = tensor.view(torch.int16) if dtype == torch.bfloat16 else tensor
+            flat = target.numpy().reshape(-1).view(np.uint8)
+            self._targets.append((offset, offset + flat.size, flat))
+        self._layers = layers
+        self._total_size = total_size
+        return True
@@ -1,3 +1,11 @@
 from . import cifar, mnist
+from .partition import DirichletPartitionPlanner
+from .store import DatasetStore, SharedVisionDataset
 
-__all__ = ["cifar", "mnist"]
+__all__ = [
+    "cifar",
+    "mnist",
+    "DatasetStore",
+    "DirichletPartitionPlanner",
+    "SharedVisionDataset",
+]
@@ -16,6 +16,8 @@ from ..datatypes.data import (
     NonIidNonOverlappingClassesDatasetSettings,
 )
 from ..utils.random import RandomUtils
+from .partition import DirichletPartitionPlanner
+from .store import DatasetStore
 
 
 class DataloaderGeneratorInterface(object, metaclass=ABCMeta):
@@ -87,24 +89,27 @@ class BaseDataLoaderGenerator(DataloaderGeneratorInterface):
         self.data_dir = self.data_dir.resolve()
 
     def _get_datasets(self) -> Tuple[VisionDataset, VisionDataset]:
-        """Loads the train and test datasets.
+        """Loads the train and test datasets. The images are shared through `DatasetStore`,
+        so they are only loaded once by all the generators of the same dataset.
 
         Returns:
             Tuple[VisionDataset, VisionDataset]: Train and test datasets.
         """
-        train_dataset = self.dataset_cls(
+        train_dataset = DatasetStore.get_dataset(
+            dataset_cls=self.dataset_cls,
             root=self.data_dir,
             train=True,
             transform=self.transform,
             download=True,
         )
-        test_dataset = self.dataset_cls(
+        test_dataset = DatasetStore.get_dataset(
+            dataset_cls=self.dataset_cls,
             root=self.data_dir,
             train=False,
             transform=self.transform,
             download=True,
         )
-        return train_dataset, test_dataset
+        return train_dataset, test_dataset  # type: ignore
 
     def _build_dataloaders_iid(self, settings: IidDatasetSettings) -> DataLoaders:
         """Builds IID data loaders.
@@ -209,37 +214,24 @@ class BaseDataLoaderGenerator(DataloaderGeneratorInterface):
         Returns:
             DataLoaders: Data loaders for Non-IID data.
         """
-        num_clients = settings.num_clients
-        client_index = settings.client_index
-
         train_dataset, test_dataset = self._get_datasets()
         num_classes = len(train_dataset.classes)
         targets = np.array(train_dataset.targets)
-        # data_indices = np.arange(len(train_dataset))
-
-        # Generate Dirichlet distribution
-        class_indices = [np.where(targets == i)[0] for i in range(num_classes)]
-        client_data_indices: list[list] = [[] for _ in range(num_clients)]
-
-        for _, indices in enumerate(class_indices):
-            proportions = np.random.dirichlet(
-                np.repeat(settings.dirichlet_alpha, num_clients)
-            )
-            proportions = (proportions * len(indices)).astype(int)
-            proportions[-1] = len(indices) - sum(proportions[:-1])  # Adjust last client
-            split_indices = np.split(indices, np.cumsum(proportions)[:-1])
-
-            # for i, client_indices_i in enumerate(split_indices):
-            #     client_data_indices[i].extend(client_indices_i)
-            client_data_indices[client_index].extend(split_indices[client_index])
-
-        # Flatten and shuffle indices
-        # all_train_indices = np.hstack(client_data_indices)
-        np.random.shuffle(client_data_indices[client_index])
-        train_size = int(self.train_size * len(client_data_indices[client_index]))
 
-        train_indices = client_data_indices[client_index][:train_size]
-        validation_indices = client_data_indices[client_index][train_size:]
+        # The partition of all the clients is planned once and then looked up
+        client_indices: list[int] = DirichletPartitionPlanner.get_client_indices(
+            targets=targets,
+            num_classes=num_classes,
+            num_clients=settings.num_clients,
+            client_index=settings.client_index,
+            alpha=settings.dirichlet_alpha,
+            seed=settings.seed,
+            data_dir=self.data_dir,
+        ).tolist()
+        train_size = int(self.train_size * len(client_indices))
+
+        train_indices = client_indices[:train_size]
+        validation_indices = client_indices[train_size:]
 
         train_set = Subset(train_dataset, train_indices)
         validation_set = Subset(train_dataset, validation_indices)
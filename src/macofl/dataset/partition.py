@@ -0,0 +1,199 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+class DirichletPartitionPlanner:
+    """
+    Computes the Dirichlet non-IID partition of a dataset for all the clients at once. The plan is
+    cached in memory and saved as a `.npz` file with the concatenated indices of every client and
+    their offsets, so each client gets its indices in O(1) instead of sampling the partition again.
+
+    The plan draws from a local `np.random.RandomState(seed)` in the same order as sampling the partition
+    client by client after `np.random.seed(seed)`, so the indices of each client are the same for the
+    same seed. The global numpy random generator is never used, so its state does not depend on
+    whether the plan was sampled or loaded from the cache.
+    """
+
+    _lock = threading.Lock()
+    _plans: dict[Path, tuple[np.ndarray, np.ndarray]] = {}
+
+    @staticmethod
+    def plan(
+        targets: np.ndarray,
+        num_classes: int,
+        num_clients: int,
+        alpha: float,
+        seed: Optional[int] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Samples the partition of all the clients with a local numpy random generator.
+
+        Args:
+            targets (np.ndarray): The class of each sample of the dataset.
+            num_classes (int): Number of classes of the dataset.
+            num_clients (int): Number of clients.
+            alpha (float): Parameter controlling the level of non-IID-ness.
+            seed (Optional[int], optional): The seed of the generator. Defaults to None (not reproducible).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The shuffled indices of all the clients one after the other,
+            and the `num_clients + 1` offsets where the indices of each client start.
+        """
+        rng = np.random.RandomState(seed)
+        class_indices = [np.where(targets == i)[0] for i in range(num_classes)]
+        client_data_indices: list[list[np.ndarray]] = [[] for _ in range(num_clients)]
+
+        for indices in class_indices:
+            proportions = rng.dirichlet(np.repeat(alpha, num_clients))
+            proportions = (proportions * len(indices)).astype(int)
+            proportions[-1] = len(indices) - sum(proportions[:-1])  # Adjust last client
+            split_indices = np.split(indices, np.cumsum(proportions)[:-1])
+            for i, client_indices_i in enumerate(split_indices):
+                client_data_indices[i].append(client_indices_i)
+
+        # Every client shuffles its indices from the same generator state
+        state = rng.get_state()
+        partition: list[np.ndarray] = []
+        for client_indices in client_data_indices:
+            rng.set_state(state)
+            indices = (
+                np.concatenate(client_indices)
+                if client_indices
+                else np.empty((0,), dtype=np.int64)
+            )
+            rng.shuffle(indices)
+            partition.append(indices)
+
+        offsets = np.zeros((num_clients + 1,), dtype=np.int64)
+        offsets[1:] = np.cumsum([len(indices) for indices in partition])
+        return np.concatenate(partition).astype(np.int64), offsets
+
+    @staticmethod
+    def get_plan_path(
+        data_dir: Path,
+        seed: int,
+        alpha: float,
+        num_clients: int,
+        targets_digest: str,
+        split: str = "train",
+    ) -> Path:
+        return (
+            data_dir
+            / f"dirichlet-{split}-seed{seed}-alpha{alpha}-clients{num_clients}-targets{targets_digest}.npz"
+        )
+
+    @staticmethod
+    def get_targets_digest(targets: np.ndarray) -> str:
+        """
+        Returns the digest that identifies the dataset of a plan, so two datasets with the same number of
+        samples do not share their plans.
+        """
+        data = np.ascontiguousarray(targets, dtype=np.int64).tobytes()
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+    @staticmethod
+    def get_client_indices(
+        targets: np.ndarray,
+        num_classes: int,
+        num_clients: int,
+        client_index: int,
+        alpha: float,
+        seed: Optional[int],
+        data_dir: Optional[Path] = None,
+    ) -> np.ndarray:
+        """
+        Gets the shuffled indices of `client_index`. The partition is planned only the first time
+        that it is requested for a (targets, seed, alpha, num_clients) in `data_dir`.
+
+        Args:
+            targets (np.ndarray): The class of each sample of the dataset.
+            num_classes (int): Number of classes of the dataset.
+            num_clients (int): Number of clients.
+            client_index (int): The client whose indices are returned.
+            alpha (float): Parameter controlling the level of non-IID-ness.
+            seed (Optional[int]): The seed of the plan. Without seed the plan is not cached.
+            data_dir (Optional[Path], optional): Directory to save the plan. Defaults to None (only memory).
+
+        Raises:
+            ValueError: If `client_index` is not a valid client.
+
+        Returns:
+            np.ndarray: The indices of the samples of the client.
+        """
+        if not 0 <= client_index < num_clients:
+            raise ValueError(
+                f"The client index must be in [0, {num_clients}) and it is {client_index}."
+            )
+        if seed is None:
+            indices, offsets = DirichletPartitionPlanner.plan(
+                targets=targets,
+                num_classes=num_classes,
+                num_clients=num_clients,
+                alpha=alpha,
+            )
+        else:
+            indices, offsets = DirichletPartitionPlanner._load_or_plan(
+                targets=targets,
+                num_classes=num_classes,
+                num_clients=num_clients,
+                alpha=alpha,
+                seed=seed,
+                path=DirichletPartitionPlanner.get_plan_path(
+                    data_dir=Path(".") if data_dir is None else data_dir,
+                    seed=seed,
+                    alpha=alpha,
+                    num_clients=num_clients,
+                    targets_digest=DirichletPartitionPlanner.get_targets_digest(
+                        targets
+                    ),
+                ),
+                save=data_dir is not None,
+            )
+        return indices[offsets[client_index] : offsets[client_index + 1]]
+
+    @staticmethod
+    def _load_or_plan(
+        targets: np.ndarray,
+        num_classes: int,
+        num_clients: int,
+        alpha: float,
+        seed: int,
+        path: Path,
+        save: bool,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        with DirichletPartitionPlanner._lock:
+            if path not in DirichletPartitionPlanner._plans:
+                if save and path.exists():
+                    with np.load(path) as plan:
+                        DirichletPartitionPlanner._plans[path] = (
+                            plan["indices"],
+                            plan["offsets"],
+                        )
+                else:
+                    indices, offsets = DirichletPartitionPlanner.plan(
+                        targets=targets,
+                        num_classes=num_classes,
+                        num_clients=num_clients,
+                        alpha=alpha,
+                        seed=seed,
+                    )
+                    if save:
+                        # Write to a temporary file first so other processes never read a partial file
+                        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+                        np.savez(tmp_path, indices=indices, offsets=offsets)
+                        os.replace(tmp_path, path)
+                    DirichletPartitionPlanner._plans[path] = (indices, offsets)
+            return DirichletPartitionPlanner._plans[path]
+
+    @staticmethod
+    def clear() -> None:
+        """
+        Forgets the partitions planned by this process. The `.npz` files are kept on disk.
+        """
+        with DirichletPartitionPlanner._lock:
+            DirichletPartitionPlanner._plans.clear()
@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset
+
+
+class SharedVisionDataset(Dataset):
+    """
+    Read-only vision dataset backed by a memory-mapped uint8 array. All the instances created by the
+    same `DatasetStore` share the array pages, so the images are loaded once per machine no matter
+    how many agents use them. Each instance has its own transforms.
+
+    When it is pickled (e.g. to train in another process) only the path of the array is sent, and the
+    array is memory-mapped again in the destination process.
+    """
+
+    def __init__(
+        self,
+        data_path: Path,
+        data: np.ndarray,
+        targets: list[int],
+        classes: list[str],
+        transform: Optional[Callable] = None,
+        target_transform: Optional[Callable] = None,
+    ) -> None:
+        self.data_path = data_path
+        self.data = data
+        self.targets = targets
+        self.classes = classes
+        self.transform = transform
+        self.target_transform = target_transform
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def __getitem__(self, index: int) -> tuple[Any, Any]:
+        # PIL image as torchvision datasets do, so the same transforms are valid
+        img: Any = Image.fromarray(np.asarray(self.data[index]))
+        target: Any = self.targets[index]
+        if self.transform is not None:
+            img = self.transform(img)
+        if self.target_transform is not None:
+            target = self.target_transform(target)
+        return img, target
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["data"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.data = DatasetStore.open_array(self.data_path)
+
+
+class DatasetStore:
+    """
+    Process-wide cache of the datasets used by the data loader generators. The first time that a
+    dataset is requested it is loaded with its torchvision class and its images are saved as a `.npy`
+    file next to the downloaded data. Then, every request memory-maps that file and only builds a
+    lightweight `SharedVisionDataset` with the requested transforms.
+    """
+
+    _lock = threading.Lock()
+    _arrays: dict[Path, np.ndarray] = {}
+    _metadata: dict[Path, tuple[list[int], list[str]]] = {}
+
+    @staticmethod
+    def open_array(data_path: Path) -> np.ndarray:
+        """
+        Returns the read-only memory map of `data_path`, opening it only once per process.
+        """
+        with DatasetStore._lock:
+            if data_path not in DatasetStore._arrays:
+                DatasetStore._arrays[data_path] = np.load(data_path, mmap_mode="r")
+            return DatasetStore._arrays[data_path]
+
+    @staticmethod
+    def get_dataset(
+        dataset_cls: type,
+        root: Path,
+        train: bool,
+        transform: Optional[Callable] = None,
+        download: bool = True,
+    ) -> Dataset:
+        """
+        Gets a dataset that shares its images with all the other requests of the same dataset.
+
+        Args:
+            dataset_cls (type): The torchvision dataset class (e.g., datasets.CIFAR10).
+            root (Path): Directory where the data is stored.
+            train (bool): True for the train split and False for the test split.
+            transform (Optional[Callable], optional): Transformations to apply to the images. Defaults to None.
+            download (bool, optional): Download the dataset if it is not in `root`. Defaults to True.
+
+        Returns:
+            Dataset: A `SharedVisionDataset`, or the `dataset_cls` instance itself if it does not
+            expose its images as a `data` array.
+        """
+        split = "train" if train else "test"
+        base_path = root / f"{dataset_cls.__name__.lower()}-{split}"
+        data_path = base_path.with_suffix(".npy")
+        metadata_path = base_path.with_suffix(".json")
+
+        with DatasetStore._lock:
+            if data_path not in DatasetStore._metadata:
+                if not data_path.exists() or not metadata_path.exists():
+                    dataset = dataset_cls(
+                        root=root, train=train, transform=transform, download=download
+                    )
+                    if not hasattr(dataset, "data"):
+                        return dataset
+                    DatasetStore._save(dataset, data_path, metadata_path)
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+                DatasetStore._metadata[data_path] = (
+                    metadata["targets"],
+                    metadata["classes"],
+                )
+            targets, classes = DatasetStore._metadata[data_path]
+
+        return SharedVisionDataset(
+            data_path=data_path,
+            data=DatasetStore.open_array(data_path),
+            targets=targets,
+            classes=classes,
+            transform=transform,
+        )
+
+    @staticmethod
+    def _save(dataset: Any, data_path: Path, metadata_path: Path) -> None:
+        data = dataset.data
+        data = data.numpy() if hasattr(data, "numpy") else np.asarray(data)
+        targets = dataset.targets
+        targets = targets.tolist() if hasattr(targets, "tolist") else list(targets)
+        # Write to temporary files first so other processes never read a partial file
+        tmp_data_path = data_path.with_suffix(f".{os.getpid()}.tmp.npy")
+        tmp_metadata_path = metadata_path.with_suffix(f".{os.getpid()}.tmp.json")
+        np.save(tmp_data_path, np.ascontiguousarray(data, dtype=np.uint8))
+        with open(tmp_metadata_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "targets": [int(t) for t in targets],
+                    "classes": list(dataset.classes),
+                },
+                f,
+            )
+        os.replace(tmp_data_path, data_path)
+        os.replace(tmp_metadata_path, metadata_path)
+
+    @staticmethod
+    def clear() -> None:
+        """
+        Forgets the opened datasets of this process. The `.npy` files are kept on disk.
+        """
+        with DatasetStore._lock:
+            DatasetStore._arrays.clear()
+            DatasetStore._metadata.clear()
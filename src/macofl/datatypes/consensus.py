@@ -1,12 +1,20 @@
 import copy
 import json
 from datetime import datetime, timezone
-from typing import Any, Optional, OrderedDict
+from typing import Any, Iterator, Optional, OrderedDict
 
 from aioxmpp import JID
 from spade.message import Message
 from torch import Tensor
 
+from ..codec.binary import BinaryLayerCodec
+from ..codec.compression import LayerCompressor
+from ..codec.stream import (
+    Base64StreamDecoder,
+    LayerStreamDecoder,
+    base64_length,
+    iter_base64,
+)
 from .models import ModelManager
 
 
@@ -15,6 +23,8 @@ class Consensus:
     Stores consensus information during layer transmission and processing.
     """
 
+    BODY_PREFIX: str = '{"layers": "'
+
     def __init__(
         self,
         layers: OrderedDict[str, Tensor],
@@ -24,6 +34,8 @@ class Consensus:
         received_time_z: Optional[datetime] = None,
         processed_start_time_z: Optional[datetime] = None,
         processed_end_time_z: Optional[datetime] = None,
+        transport: Optional[dict[str, Any]] = None,
+        similarity: Optional[str] = None,
     ):
         self.layers = layers
         self.sender = sender
@@ -32,17 +44,127 @@ class Consensus:
         self.received_time_z = received_time_z
         self.processed_start_time_z = processed_start_time_z
         self.processed_end_time_z = processed_end_time_z
+        # How the layers are encoded (e.g. DeltaTransport information), it must be JSON-serializable
+        self.transport = {} if transport is None else transport
+        # The encoded similarity vector of the sender, when it is piggybacked on the layers
+        self.similarity = similarity
 
         self.__check_utc(self.sent_time_z)
         self.__check_utc(self.received_time_z)
         self.__check_utc(self.processed_start_time_z)
         self.__check_utc(self.processed_end_time_z)
 
-    def to_message(self, message: Optional[Message] = None) -> Message:
+    def to_message(
+        self,
+        message: Optional[Message] = None,
+        compressor: Optional[LayerCompressor] = None,
+        neighbour: Optional[JID] = None,
+    ) -> Message:
+        """
+        Builds the message with the layers of the consensus.
+
+        Args:
+            message (Optional[Message], optional): Message to copy. Defaults to None.
+            compressor (Optional[LayerCompressor], optional): Lossy compression of the layers. Defaults to None.
+            neighbour (Optional[JID], optional): The receiver, used by the stateful compressors. Defaults to None.
+
+        Returns:
+            Message: The message with the consensus serialized as JSON in the body.
+        """
         msg = Message() if message is None else copy.deepcopy(message)
-        content: dict[str, Any] = {}
-        base64_layers = ModelManager.export_layers(self.layers)
+        base64_layers, transport = self.encode_layers(
+            compressor=compressor, neighbour=neighbour
+        )
+        content = self._build_content(transport=transport)
         content["layers"] = base64_layers
+        msg.body = json.dumps(content)
+        return msg
+
+    def encode_layers(
+        self,
+        compressor: Optional[LayerCompressor] = None,
+        neighbour: Optional[JID] = None,
+    ) -> tuple[str, dict[str, Any]]:
+        """
+        Serializes the layers of the consensus, so the result can be reused by several messages.
+
+        Args:
+            compressor (Optional[LayerCompressor], optional): Lossy compression of the layers. Defaults to None.
+            neighbour (Optional[JID], optional): The receiver, used by the stateful compressors. Defaults to None.
+
+        Returns:
+            tuple[str, dict[str, Any]]: The base64 layers and the transport information they need, that
+            is merged with the transport of the consensus.
+        """
+        layers, transport = self._compress(compressor=compressor, neighbour=neighbour)
+        return ModelManager.export_layers(layers), transport
+
+    def iter_body(
+        self,
+        compressor: Optional[LayerCompressor] = None,
+        neighbour: Optional[JID] = None,
+        chunk_size: int = BinaryLayerCodec.CHUNK_SIZE,
+        encoded_layers: Optional[tuple[str, dict[str, Any]]] = None,
+    ) -> tuple[int, Iterator[str]]:
+        """
+        Streaming version of `to_message`: the body is built tensor by tensor while it is consumed, so it
+        is never held in memory. The concatenation of the pieces is the body built by `to_message`.
+
+        Args:
+            compressor (Optional[LayerCompressor], optional): Lossy compression of the layers. Defaults to None.
+            neighbour (Optional[JID], optional): The receiver, used by the stateful compressors. Defaults to None.
+            chunk_size (int, optional): Maximum size in bytes of the serialized tensor chunks. Defaults to
+            `BinaryLayerCodec.CHUNK_SIZE`.
+            encoded_layers (Optional[tuple[str, dict[str, Any]]], optional): The layers already serialized by
+            `encode_layers`. If given, the compressor is not used. Defaults to None.
+
+        Returns:
+            tuple[int, Iterator[str]]: The length of the body and the pieces of the body.
+        """
+        if encoded_layers is None:
+            layers, transport = self._compress(
+                compressor=compressor, neighbour=neighbour
+            )
+        else:
+            layers, transport = OrderedDict(), encoded_layers[1]
+        content = self._build_content(transport=transport)
+        content["layers"] = ""
+        prefix = Consensus.BODY_PREFIX
+        suffix = json.dumps(content)[len(prefix) :]
+
+        if encoded_layers is not None:
+            return len(prefix) + len(encoded_layers[0]) + len(suffix), iter(
+                (prefix, encoded_layers[0], suffix)
+            )
+
+        length = (
+            len(prefix)
+            + base64_length(BinaryLayerCodec.encoded_size(layers))
+            + len(suffix)
+        )
+
+        def pieces() -> Iterator[str]:
+            yield prefix
+            yield from iter_base64(
+                BinaryLayerCodec.iter_encode(layers, chunk_size=chunk_size)
+            )
+            yield suffix
+
+        return length, pieces()
+
+    def _compress(
+        self,
+        compressor: Optional[LayerCompressor] = None,
+        neighbour: Optional[JID] = None,
+    ) -> tuple[OrderedDict[str, Tensor], dict[str, Any]]:
+        if compressor is None:
+            return self.layers, {}
+        layers, compression = compressor.compress(self.layers, neighbour=neighbour)
+        return layers, {"compression": compression}
+
+    def _build_content(self, transport: dict[str, Any]) -> dict[str, Any]:
+        # The layers go first in the body, so they can be streamed before the rest of the content
+        content: dict[str, Any] = {"layers": None}
         content["sender"] = str(self.sender.bare()) if self.sender is not None else None
         content["request_reply"] = self.request_reply
         sent_time_z = (
@@ -51,15 +173,48 @@ class Consensus:
             else self.sent_time_z
         )
         content["sent_time_z"] = sent_time_z.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-        msg.body = json.dumps(content)
-        return msg
+        transport = {**self.transport, **transport}
+        if transport:
+            content["transport"] = transport
+        if self.similarity is not None:
+            content["similarity"] = self.similarity
+        return content
 
     @staticmethod
     def from_message(message: Message) -> "Consensus":
         content: dict[str, Any] = json.loads(message.body)
-        base64_layers: str = content["layers"]
+        layers = ModelManager.import_layers(content["layers"])
+        return Consensus.from_content(
+            content=content, layers=layers, sender=message.sender
+        )
+
+    @staticmethod
+    def from_content(
+        content: dict[str, Any],
+        layers: OrderedDict[str, Tensor],
+        sender: Optional[JID] = None,
+    ) -> "Consensus":
+        """
+        Builds the consensus of a decoded message body whose layers are already deserialized.
+
+        Args:
+            content (dict[str, Any]): The JSON content of the body.
+            layers (OrderedDict[str, Tensor]): The deserialized layers, still compressed.
+            sender (Optional[JID], optional): The sender of the message. Defaults to None.
+
+        Returns:
+            Consensus: The consensus with the decompressed layers. The layers of stateful codecs are left
+            compressed.
+        """
         request_reply: bool = bool(content["request_reply"])
-        layers = ModelManager.import_layers(base64_layers)
+        transport: Optional[dict[str, Any]] = content.get("transport")
+        # The stateful codecs are decoded by the receiver with the references of the sender
+        if (
+            transport
+            and "compression" in transport
+            and not LayerCompressor.is_stateful_codec(transport["compression"]["codec"])
+        ):
+            layers = LayerCompressor.decompress(layers, transport["compression"])
         sent_time_z: datetime = datetime.strptime(
             content["sent_time_z"], "%Y-%m-%dT%H:%M:%S.%fZ"
         ).replace(tzinfo=timezone.utc)
@@ -80,14 +235,23 @@ class Consensus:
             ).replace(tzinfo=timezone.utc)
         return Consensus(
             layers=layers,
-            sender=message.sender,
+            sender=sender,
             request_reply=request_reply,
             sent_time_z=sent_time_z,
             received_time_z=received_time_z,
             processed_start_time_z=processed_start_time_z,
             processed_end_time_z=processed_end_time_z,
+            transport=transport,
+            similarity=content.get("similarity"),
         )
 
+    @property
+    def codec(self) -> str:
+        """
+        Name of the compression codec used to send the layers.
+        """
+        return self.transport.get("compression", {}).get("codec", "none")
+
     def __str__(self) -> str:
         content: dict[str, Any] = {}
         base64_layers = ModelManager.export_layers(self.layers)
@@ -116,3 +280,62 @@ class Consensus:
                 raise ValueError(
                     "All Consensus datetimes must be timezone-aware (UTC) (Z)."
                 )
+
+
+class ConsensusStreamDecoder:
+    """
+    Decodes the body of a consensus message while its multipart parts arrive in order. The base64 layers
+    are decoded straight into the tensors with a `LayerStreamDecoder`, and only the small JSON content
+    that follows them is buffered.
+    """
+
+    def __init__(self, sender: Optional[JID] = None) -> None:
+        self.sender = sender
+        self._prefix = ""
+        self._in_layers = False
+        self._suffix: list[str] = []
+        self._base64 = Base64StreamDecoder()
+        self._layers = LayerStreamDecoder()
+
+    def feed(self, content: str) -> None:
+        """
+        Decodes the next piece of the body.
+
+        Raises:
+            ValueError: If the body is not a consensus body with the layers first.
+        """
+        if self._suffix:
+            self._suffix.append(content)
+            return
+        if not self._in_layers:
+            missing = len(Consensus.BODY_PREFIX) - len(self._prefix)
+            self._prefix += content[:missing]
+            content = content[missing:]
+            if len(self._prefix) < len(Consensus.BODY_PREFIX):
+                return
+            if self._prefix != Consensus.BODY_PREFIX:
+                raise ValueError(
+                    "The body is not a consensus body that starts with its layers."
+                )
+            self._in_layers = True
+        # The base64 alphabet has no quotes, so the first quote closes the layers string
+        end = content.find('"')
+        self._layers.feed(self._base64.feed(content if end < 0 else content[:end]))
+        if end >= 0:
+            self._suffix.append(content[end + 1 :])
+
+    def finish(self) -> Consensus:
+        """
+        Returns the decoded consensus.
+
+        Raises:
+            ValueError: If the body is not complete.
+        """
+        if not self._suffix:
+            raise ValueError("The consensus body is truncated.")
+        self._base64.finish()
+        layers = self._layers.finish()
+        content: dict[str, Any] = json.loads('{"layers": null' + "".join(self._suffix))
+        return Consensus.from_content(
+            content=content, layers=layers, sender=self.sender
+        )
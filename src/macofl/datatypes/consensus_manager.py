@@ -1,8 +1,9 @@
 import asyncio
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from queue import Queue
 from typing import Optional, OrderedDict
 
+import torch
 from aioxmpp import JID
 from torch import Tensor
 
@@ -36,6 +37,7 @@ class ConsensusManager:
             Queue()
         )  # Neighbours waiting to my response. [str] is the thread and [Consensus] because stores layers.
         self.max_iterations = consensus_iterations
+        self.__response_received = asyncio.Event()
         self.__completed_iterations: int = 0
         self.__last_algorithm_iteration: int = -1
 
@@ -60,44 +62,231 @@ class ConsensusManager:
             == self.waiting_responses[consensus.sender.bare()]
         ):
             del self.waiting_responses[consensus.sender.bare()]
+            self.__response_received.set()
         elif consensus.request_reply:
             self.to_response.put((consensus, thread))
         self.received_consensus.put(consensus)
 
     async def wait_receive_consensus(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until all the neighbours in `waiting_responses` have sent their layers or the timeout
+        expires. It wakes up as soon as a response arrives instead of polling.
+
+        Args:
+            timeout (Optional[float], optional): Maximum seconds to wait. Defaults to `wait_for_responses_timeout`.
+
+        Returns:
+            bool: True if all the responses have been received, False if the timeout expired.
+        """
         to = timeout if timeout is not None else self.wait_for_responses_timeout
-        start_time_z = datetime.now(tz=timezone.utc)
-        stop_time_reached = False
-        while self.waiting_responses and not stop_time_reached:
-            await asyncio.sleep(delay=2)
-            stop_time_z = datetime.now(tz=timezone.utc) + timedelta(seconds=to)
-            stop_time_reached = stop_time_z >= start_time_z
+        loop = asyncio.get_running_loop()
+        stop_time = loop.time() + to
+        while self.waiting_responses:
+            remaining_seconds = stop_time - loop.time()
+            if remaining_seconds <= 0:
+                break
+            self.__response_received.clear()
+            try:
+                await asyncio.wait_for(
+                    self.__response_received.wait(), timeout=remaining_seconds
+                )
+            except asyncio.TimeoutError:
+                break
         return len(list(self.waiting_responses.keys())) == 0
 
     def apply_consensus(self, consensus: Consensus) -> None:
+        self.apply_consensus_batch(consensuses=[consensus])
+
+    def apply_consensus_batch(
+        self, consensuses: list[Consensus], weights: Optional[list[float]] = None
+    ) -> None:
+        """
+        Applies the consensus of several neighbours in-place on the model parameters. The incoming tensors
+        are grouped by layer name and applied in arrival order, so the result is the same as applying
+        each `Consensus` sequentially, but without copying the full model for each one.
+
+        Args:
+            consensuses (list[Consensus]): The consensus transmissions to apply, in arrival order.
+            weights (Optional[list[float]], optional): The weight in [0, 1] of each consensus, that scales
+            its step towards the neighbour tensors. Defaults to None (all of them 1).
+
+        Raises:
+            RuntimeError: If the model is training.
+        """
         if self.model_manager.is_training():
             raise RuntimeError("Trying to apply consensus while training the model.")
-        consensuated_model = ConsensusManager.apply_consensus_to_layers(
-            full_model=self.model_manager.model.state_dict(),
-            layers=consensus.layers,
-            max_order=self.max_order,
-            epsilon_margin=self.epsilon_margin,
-        )
-        self.model_manager.replace_all_layers(new_layers=consensuated_model)
+        if weights is not None and len(weights) != len(consensuses):
+            raise ValueError(
+                f"There are {len(weights)} weights for {len(consensuses)} consensus."
+            )
+        neighbour_layers: dict[str, list[Tensor]] = {}
+        layer_weights: dict[str, list[float]] = {}
+        for i, consensus in enumerate(consensuses):
+            for name, tensor in consensus.layers.items():
+                neighbour_layers.setdefault(name, []).append(tensor)
+                layer_weights.setdefault(name, []).append(
+                    1.0 if weights is None else weights[i]
+                )
+        model_layers = self.model_manager.get_all_layers()
+        with torch.no_grad():
+            for name, tensors in neighbour_layers.items():
+                if name in model_layers:
+                    ConsensusManager.apply_consensus_to_tensor_in_place(
+                        tensor=model_layers[name],
+                        neighbour_tensors=tensors,
+                        max_order=self.max_order,
+                        epsilon_margin=self.epsilon_margin,
+                        weights=None if weights is None else layer_weights[name],
+                    )
+        self.model_manager.invalidate_layers()
 
     def apply_all_consensus(
         self,
     ) -> list[Consensus]:
+        """
+        Drains the received consensus queue and applies all of them in one batch. The processed start and
+        end times of every `Consensus` are the ones of the whole batch.
+
+        Returns:
+            list[Consensus]: The consensus transmissions applied.
+        """
         consumed_consensus_transmissions: list[Consensus] = []
         while self.received_consensus.qsize() > 0:
-            ct = self.received_consensus.get()
-            ct.processed_start_time_z = datetime.now(tz=timezone.utc)
-            self.apply_consensus(ct)
-            ct.processed_end_time_z = datetime.now(tz=timezone.utc)
-            consumed_consensus_transmissions.append(ct)
+            consumed_consensus_transmissions.append(self.received_consensus.get())
             self.received_consensus.task_done()
+        if consumed_consensus_transmissions:
+            start_time_z = datetime.now(tz=timezone.utc)
+            self.apply_consensus_batch(consensuses=consumed_consensus_transmissions)
+            end_time_z = datetime.now(tz=timezone.utc)
+            for ct in consumed_consensus_transmissions:
+                ct.processed_start_time_z = start_time_z
+                ct.processed_end_time_z = end_time_z
         return consumed_consensus_transmissions
 
+    @staticmethod
+    def get_staleness_weight(
+        staleness_seconds: float, half_life_seconds: float
+    ) -> float:
+        """
+        Returns the weight of a consensus sent `staleness_seconds` ago: 1 when it is fresh and 0.5 when it
+        is `half_life_seconds` old.
+        """
+        return 1 / (1 + max(0.0, staleness_seconds) / half_life_seconds)
+
+    def apply_all_consensus_by_staleness(
+        self, max_staleness_seconds: float, half_life_seconds: float
+    ) -> tuple[list[Consensus], list[Consensus]]:
+        """
+        Drains the received consensus queue and applies them in one batch, each one weighted by its
+        staleness (the seconds since its `sent_time_z`). The consensus older than `max_staleness_seconds`
+        are discarded, so the staleness is bounded.
+
+        Args:
+            max_staleness_seconds (float): Maximum age of the applied consensus.
+            half_life_seconds (float): Age at which a consensus is applied with weight 0.5.
+
+        Returns:
+            tuple[list[Consensus], list[Consensus]]: The applied and the discarded consensus transmissions.
+        """
+        if half_life_seconds <= 0:
+            raise ValueError(
+                f"The half_life_seconds must be positive, but the current value is: {half_life_seconds}"
+            )
+        applied: list[Consensus] = []
+        discarded: list[Consensus] = []
+        weights: list[float] = []
+        now = datetime.now(tz=timezone.utc)
+        while self.received_consensus.qsize() > 0:
+            ct = self.received_consensus.get()
+            self.received_consensus.task_done()
+            staleness = (
+                0.0
+                if ct.sent_time_z is None
+                else (now - ct.sent_time_z).total_seconds()
+            )
+            if staleness > max_staleness_seconds:
+                discarded.append(ct)
+            else:
+                applied.append(ct)
+                weights.append(
+                    ConsensusManager.get_staleness_weight(staleness, half_life_seconds)
+                )
+        if applied:
+            start_time_z = datetime.now(tz=timezone.utc)
+            self.apply_consensus_batch(consensuses=applied, weights=weights)
+            end_time_z = datetime.now(tz=timezone.utc)
+            for ct in applied:
+                ct.processed_start_time_z = start_time_z
+                ct.processed_end_time_z = end_time_z
+        return applied, discarded
+
+    @staticmethod
+    def apply_consensus_to_tensor_in_place(
+        tensor: Tensor,
+        neighbour_tensors: list[Tensor],
+        max_order: int,
+        epsilon_margin: float = 0.05,
+        weights: Optional[list[float]] = None,
+    ) -> Tensor:
+        """
+        Applies `apply_consensus_to_tensors` with each neighbour tensor in order, writing the result into
+        `tensor`. Floating point tensors are updated with in-place operations and a single scratch buffer,
+        giving the same values as the out-of-place version.
+
+        Args:
+            tensor (Tensor): The local `torch.Tensor` that will be multiplied by epsilon and modified.
+            neighbour_tensors (list[Tensor]): The neighbour tensors that will be multiplied by (1 - epsilon).
+            max_order (int): Maximum order of the graph network.
+            epsilon_margin (float, optional): A margin to be sure that epsilon < 1 / max_graph_degree. Defaults to 0.05.
+            weights (Optional[list[float]], optional): The weight of each neighbour tensor. With weight w the
+            tensor moves w * (1 - epsilon) of the way to the neighbour tensor, and integer tensors are then
+            truncated. Defaults to None (all of them 1).
+
+        Raises:
+            ValueError: If `max_order` is lower than 2.
+
+        Returns:
+            Tensor: The same `tensor`, after consensus.
+        """
+        if max_order <= 1:
+            raise ValueError(
+                f"Max order of consensus must be greater than 1 and it is {max_order}."
+            )
+        # epsilon_margin because must be LESS than 1 / max_order
+        epsilon = 1 / max_order - epsilon_margin
+        if not tensor.is_floating_point():
+            # Integer buffers are truncated on each step, as load_state_dict does
+            for i, neighbour_tensor in enumerate(neighbour_tensors):
+                neighbour_tensor = neighbour_tensor.to(tensor.device)
+                weight = 1.0 if weights is None else weights[i]
+                if weight == 1.0:
+                    tensor.copy_(
+                        ConsensusManager.apply_consensus_to_tensors(
+                            tensor_a=tensor,
+                            tensor_b=neighbour_tensor,
+                            max_order=max_order,
+                            epsilon_margin=epsilon_margin,
+                        )
+                    )
+                else:
+                    tensor.copy_(
+                        tensor + weight * (1 - epsilon) * (neighbour_tensor - tensor)
+                    )
+            return tensor
+        scratch = torch.empty_like(tensor)
+        for i, neighbour_tensor in enumerate(neighbour_tensors):
+            neighbour_tensor = neighbour_tensor.to(
+                device=tensor.device, dtype=tensor.dtype
+            )
+            weight = 1.0 if weights is None else weights[i]
+            if weight == 1.0:
+                torch.mul(neighbour_tensor, 1 - epsilon, out=scratch)
+                tensor.mul_(epsilon).add_(scratch)
+            else:
+                torch.sub(neighbour_tensor, tensor, out=scratch)
+                tensor.add_(scratch, alpha=weight * (1 - epsilon))
+        return tensor
+
     @staticmethod
     def apply_consensus_to_layers(
         full_model: OrderedDict[str, Tensor],
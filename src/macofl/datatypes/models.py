@@ -1,8 +1,7 @@
-import codecs
 import copy
-import pickle
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Callable, Optional, OrderedDict
+from typing import Callable, Iterator, Optional, OrderedDict
 
 import torch
 from aioxmpp import JID
@@ -11,6 +10,7 @@ from torch.nn.modules.loss import _Loss
 from torch.optim import Optimizer
 from torch.utils.data import DataLoader
 
+from ..codec.binary import BinaryLayerCodec
 from ..datatypes.metrics import ModelMetrics
 
 # from ..utils.random import RandomUtils
@@ -54,12 +54,96 @@ class ModelManager:
         #     self.model.state_dict()
         # )
         self.__training: bool = False
+        self.model_version: int = 0
+        self.__layers_view: Optional[OrderedDict[str, Tensor]] = None
+        # (model_version, layers) frozen by `freeze_stable_layers` while the model trains in the background
+        self.__stable: Optional[tuple[int, OrderedDict[str, Tensor]]] = None
 
     def is_training(self) -> bool:
         return self.__training
 
+    @contextmanager
+    def training_session(self) -> Iterator[None]:
+        """
+        Marks the model as training while the context is active. Used when the weights are
+        updated outside `train`, e.g. when the training runs in another process.
+        """
+        previous = self.__training
+        self.__training = True
+        self.invalidate_layers()
+        try:
+            yield
+        finally:
+            self.__training = previous
+            self.invalidate_layers()
+
+    def invalidate_layers(self) -> None:
+        """
+        Marks the cached layers as outdated. It must be called every time the model weights are
+        modified, so `model_version` increases and the `state_dict` view is rebuilt.
+        """
+        self.model_version += 1
+        self.__layers_view = None
+
+    def get_all_layers(self) -> OrderedDict[str, Tensor]:
+        """
+        Returns the cached `state_dict` of the model. The tensors share memory with the model
+        parameters, so they always reflect the current weights, and the dict is only rebuilt after
+        `invalidate_layers`. The returned dict must not be modified.
+
+        Returns:
+            OrderedDict[str, Tensor]: The layer names with their tensors.
+        """
+        if self.__layers_view is None:
+            self.__layers_view = self.model.state_dict()
+        return self.__layers_view
+
+    def freeze_stable_layers(self) -> None:
+        """
+        Copies the current weights as the stable layers, that are served by `get_stable_layers` instead of
+        the model weights until `release_stable_layers`. It must be called before a training or a consensus
+        that runs while the layers are being served.
+
+        Raises:
+            RuntimeError: If the model is training, because its weights are not stable.
+        """
+        if self.__training:
+            raise RuntimeError("Trying to freeze the stable layers while training.")
+        layers = OrderedDict(
+            (name, tensor.detach().clone())
+            for name, tensor in self.get_all_layers().items()
+        )
+        self.__stable = (self.model_version, layers)
+
+    def release_stable_layers(self) -> None:
+        """
+        Serves the model weights again from `get_stable_layers`.
+        """
+        self.__stable = None
+
+    def has_stable_layers(self) -> bool:
+        return self.__stable is not None
+
+    @property
+    def stable_version(self) -> int:
+        """
+        The `model_version` of the layers returned by `get_stable_layers`.
+        """
+        return self.model_version if self.__stable is None else self.__stable[0]
+
+    def get_stable_layers(self) -> OrderedDict[str, Tensor]:
+        """
+        Returns the frozen layers of `freeze_stable_layers` or, if they are not frozen, `get_all_layers`.
+        The returned dict and tensors must not be modified.
+
+        Returns:
+            OrderedDict[str, Tensor]: The layer names with their tensors.
+        """
+        return self.get_all_layers() if self.__stable is None else self.__stable[1]
+
     def replace_all_layers(self, new_layers: OrderedDict[str, Tensor]) -> None:
         self.model.load_state_dict(state_dict=new_layers)
+        self.invalidate_layers()
 
     def train(
         self,
@@ -73,6 +157,7 @@ class ModelManager:
         """
         # self.pretrain_state = copy.deepcopy(self.model.state_dict())
         self.__training = True
+        self.invalidate_layers()
         if epochs is None:
             epochs = self.training_epochs
 
@@ -122,6 +207,7 @@ class ModelManager:
 
         finally:
             self.__training = False
+            self.invalidate_layers()
 
     def _inference(self, dataloader: DataLoader) -> ModelMetrics:
         """
@@ -182,29 +268,44 @@ class ModelManager:
     def get_layers(
         self, layers: list[str], deepcopy_layers: bool = False
     ) -> OrderedDict[str, Tensor]:
+        all_layers = self.get_all_layers()
         selected_layers: OrderedDict[str, Tensor] = OrderedDict()
         for layer in layers:
             if deepcopy_layers:
-                selected_layers[layer] = copy.deepcopy(self.model.state_dict()[layer])
+                selected_layers[layer] = all_layers[layer].detach().clone()
             else:
-                selected_layers[layer] = self.model.state_dict()[layer]
+                selected_layers[layer] = all_layers[layer]
         return selected_layers
 
     @staticmethod
     def export_layers(layers: OrderedDict[str, Tensor]) -> str:
-        return codecs.encode(pickle.dumps(layers), encoding="base64").decode(
-            encoding="utf-8"
-        )
+        """
+        Serializes the layers with `BinaryLayerCodec` into a base64 string.
+
+        Args:
+            layers (OrderedDict[str, Tensor]): The layer names with their tensors.
+
+        Returns:
+            str: The base64 representation of the binary payload.
+        """
+        return BinaryLayerCodec.encode_base64(layers)
 
     @staticmethod
     def import_layers(
         base64_codified_layers: str,
+        out: Optional[OrderedDict[str, Tensor]] = None,
     ) -> OrderedDict[str, Tensor]:
-        return pickle.loads(
-            codecs.decode(
-                base64_codified_layers.encode(encoding="utf-8"), encoding="base64"
-            )
-        )
+        """
+        Deserializes the layers exported by `export_layers`.
+
+        Args:
+            base64_codified_layers (str): The base64 representation of the binary payload.
+            out (Optional[OrderedDict[str, Tensor]], optional): Preallocated tensors to fill in-place. Defaults to None.
+
+        Returns:
+            OrderedDict[str, Tensor]: The layer names with their tensors.
+        """
+        return BinaryLayerCodec.decode_base64(base64_codified_layers, out=out)
 
     def save_model_to_file(self, filepath: str) -> None:
         """
@@ -213,7 +314,7 @@ class ModelManager:
         Args:
             filepath (str): The path to the file where the model will be saved.
         """
-        torch.save(self.model.state_dict(), filepath)
+        torch.save(self.get_all_layers(), filepath)
 
     def load_model_from_file(self, filepath: str) -> None:
         """
@@ -223,3 +324,4 @@ class ModelManager:
             filepath (str): The path to the file from which to load the model.
         """
         self.model.load_state_dict(torch.load(filepath))
+        self.invalidate_layers()
@@ -3,6 +3,7 @@ from .general import GeneralLogManager
 from .log import setup_loggers
 from .message import MessageLogManager
 from .nn import NnInferenceLogManager, NnTrainLogManager
+from .preview import PayloadPreview
 
 __all__ = [
     "setup_loggers",
@@ -11,4 +12,5 @@ __all__ = [
     "MessageLogManager",
     "NnInferenceLogManager",
     "NnTrainLogManager",
+    "PayloadPreview",
 ]
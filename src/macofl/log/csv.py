@@ -1,4 +1,9 @@
 import logging
+import queue
+import threading
+import time
+import traceback
+import weakref
 from abc import ABCMeta, abstractmethod
 from pathlib import Path
 from typing import Optional
@@ -46,25 +51,64 @@ class CsvLogManager(object, metaclass=ABCMeta):
         self._extra_logger_name = value
         self.__get_logger()
 
-    def setup(self, folder_name: str | Path, file_name: str | Path) -> None:
+    def setup(
+        self,
+        folder_name: str | Path,
+        file_name: str | Path,
+        asynchronous: bool = True,
+        flush_rows: int = 512,
+        flush_seconds: float = 1.0,
+    ) -> None:
+        """
+        Attaches the CSV file handler to the base logger if it has no handlers yet.
+
+        Args:
+            folder_name (str | Path): Folder of the CSV file.
+            file_name (str | Path): Name of the CSV file.
+            asynchronous (bool, optional): Write the rows in a background thread with `AsyncCsvFileHandler`
+            instead of writing each row when it is logged. Defaults to True.
+            flush_rows (int, optional): Rows buffered before writing them in the asynchronous mode. Defaults to 512.
+            flush_seconds (float, optional): Maximum seconds that a row stays buffered in the asynchronous
+            mode. Defaults to 1.0.
+        """
         log_path = Path(folder_name)
         if not log_path.exists():
             log_path.mkdir(parents=True, exist_ok=True)
         log_path = log_path / file_name
         base_logger = logging.getLogger(self.base_logger_name)
         if len(base_logger.handlers) == 0:
-            csv_handler = CsvFileHandler(
-                path=log_path,
-                header=self.get_header(),
-                mode=self.mode,
-                encoding=self.encoding,
-                delay=self.delay,
-            )
+            csv_handler: logging.Handler
+            if asynchronous:
+                csv_handler = AsyncCsvFileHandler(
+                    path=log_path,
+                    header=self.get_header(),
+                    mode=self.mode,
+                    encoding=self.encoding,
+                    delay=self.delay,
+                    flush_rows=flush_rows,
+                    flush_seconds=flush_seconds,
+                )
+            else:
+                csv_handler = CsvFileHandler(
+                    path=log_path,
+                    header=self.get_header(),
+                    mode=self.mode,
+                    encoding=self.encoding,
+                    delay=self.delay,
+                )
             csv_handler.setLevel(self.level)
             csv_handler.setFormatter(self.formatter)
             base_logger.setLevel(self.level)
             base_logger.addHandler(csv_handler)
 
+    @staticmethod
+    def flush_all() -> None:
+        """
+        Writes to disk the rows buffered by all the `AsyncCsvFileHandler` of the process.
+        """
+        for handler in list(AsyncCsvFileHandler.instances):
+            handler.flush()
+
     @staticmethod
     @abstractmethod
     def get_header() -> str:
@@ -94,3 +138,104 @@ class CsvFileHandler(logging.FileHandler):
                 self.stream = self._open()
             self.stream.write(self.header + "\n")
             self.stream.flush()
+
+
+class AsyncCsvFileHandler(logging.Handler):
+    """
+    Non-blocking CSV handler. Logging a row only puts the record in a queue, and a writer thread
+    formats the records and writes them to a `CsvFileHandler` in blocks of `flush_rows` rows, or
+    after `flush_seconds` seconds since the first buffered row. `flush` blocks until every row logged
+    before the call is written, and `close` flushes and stops the writer thread.
+    """
+
+    instances: "weakref.WeakSet[AsyncCsvFileHandler]" = weakref.WeakSet()
+
+    def __init__(
+        self,
+        path: Path,
+        header: str,
+        mode: str = "a",
+        encoding: Optional[str] = None,
+        delay: bool = False,
+        flush_rows: int = 512,
+        flush_seconds: float = 1.0,
+    ) -> None:
+        if flush_rows <= 0:
+            raise ValueError(
+                f"The flush_rows must be a positive integer, but the current value is: {flush_rows}"
+            )
+        super().__init__()
+        self.file_handler = CsvFileHandler(
+            path=path, header=header, mode=mode, encoding=encoding, delay=delay
+        )
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._queue: queue.SimpleQueue[logging.LogRecord | threading.Event | None] = (
+            queue.SimpleQueue()
+        )
+        self._thread = threading.Thread(
+            target=self._write_loop, name=f"rf-csv-{path.name}", daemon=True
+        )
+        self._thread.start()
+        AsyncCsvFileHandler.instances.add(self)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        if self._thread.is_alive():
+            flushed = threading.Event()
+            self._queue.put(flushed)
+            flushed.wait()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self.file_handler.close()
+        AsyncCsvFileHandler.instances.discard(self)
+        super().close()
+
+    def _write_loop(self) -> None:
+        rows: list[str] = []
+        deadline: float | None = None
+        running = True
+        while running:
+            timeout = (
+                None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = threading.Event()  # Time threshold reached, flush without waiter
+            if isinstance(item, logging.LogRecord):
+                try:
+                    rows.append(self.format(item) + self.file_handler.terminator)
+                except Exception:
+                    self.handleError(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_seconds
+                if len(rows) < self.flush_rows:
+                    continue
+            elif item is None:
+                running = False
+            self._write(rows)
+            rows = []
+            deadline = None
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _write(self, rows: list[str]) -> None:
+        if not rows:
+            return
+        self.file_handler.acquire()
+        try:
+            if self.file_handler.stream is None:
+                self.file_handler.stream = self.file_handler._open()
+            self.file_handler.stream.write("".join(rows))
+            self.file_handler.stream.flush()
+        except Exception:
+            if logging.raiseExceptions:
+                traceback.print_exc()
+        finally:
+            self.file_handler.release()
@@ -17,7 +17,10 @@ class RemoveUuid4Filter(logging.Filter):
             "",
             record.name.replace("rf.log.", "").replace("agent.", "").replace("_", ""),
         )
-        record.msg = self.uuid_regex.sub("", record.msg.replace("_", ""))
+        # Format the lazy %-style arguments before removing the UUIDs
+        message = record.getMessage()
+        record.msg = self.uuid_regex.sub("", message.replace("_", ""))
+        record.args = None
         return True
 
 
@@ -81,17 +84,20 @@ class GeneralLogManager:
             logger.addHandler(file_handler)
             logger.addHandler(console_handler)
 
-    def debug(self, msg: object) -> None:
-        self.logger.debug(msg)
+    def is_enabled_for(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
 
-    def info(self, msg: object) -> None:
-        self.logger.info(msg)
+    def debug(self, msg: object, *args: object) -> None:
+        self.logger.debug(msg, *args)
 
-    def warning(self, msg: object) -> None:
-        self.logger.warning(msg)
+    def info(self, msg: object, *args: object) -> None:
+        self.logger.info(msg, *args)
 
-    def error(self, msg: object) -> None:
-        self.logger.error(msg)
+    def warning(self, msg: object, *args: object) -> None:
+        self.logger.warning(msg, *args)
 
-    def exception(self, msg: object) -> None:
-        self.logger.exception(msg)
+    def error(self, msg: object, *args: object) -> None:
+        self.logger.error(msg, *args)
+
+    def exception(self, msg: object, *args: object) -> None:
+        self.logger.exception(msg, *args)
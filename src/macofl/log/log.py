@@ -7,6 +7,7 @@ from .algorithm import AlgorithmLogManager
 from .general import GeneralLogManager
 from .message import MessageLogManager
 from .nn import NnInferenceLogManager, NnTrainLogManager
+from .preview import PayloadPreview
 
 
 def setup_loggers(
@@ -14,7 +15,12 @@ def setup_loggers(
     datetime_mark: bool = True,
     general_level: int = logging.DEBUG,
     csv_level: int = logging.DEBUG,
+    csv_asynchronous: bool = True,
+    csv_flush_rows: int = 512,
+    csv_flush_seconds: float = 1.0,
+    payload_preview_chars: int = 64,
 ) -> None:
+    PayloadPreview.max_chars = payload_preview_chars
     log_folder = Path(log_folder_path)
     if datetime_mark:
         log_folder = (
@@ -29,14 +35,30 @@ def setup_loggers(
         folder_name=log_folder, file_name="general.log"
     )
     AlgorithmLogManager(level=csv_level).setup(
-        folder_name=log_folder, file_name="algorithm.csv"
+        folder_name=log_folder,
+        file_name="algorithm.csv",
+        asynchronous=csv_asynchronous,
+        flush_rows=csv_flush_rows,
+        flush_seconds=csv_flush_seconds,
     )
     NnInferenceLogManager(level=csv_level).setup(
-        folder_name=log_folder, file_name="nn_inference.csv"
+        folder_name=log_folder,
+        file_name="nn_inference.csv",
+        asynchronous=csv_asynchronous,
+        flush_rows=csv_flush_rows,
+        flush_seconds=csv_flush_seconds,
     )
     NnTrainLogManager(level=csv_level).setup(
-        folder_name=log_folder, file_name="nn_train.csv"
+        folder_name=log_folder,
+        file_name="nn_train.csv",
+        asynchronous=csv_asynchronous,
+        flush_rows=csv_flush_rows,
+        flush_seconds=csv_flush_seconds,
     )
     MessageLogManager(level=csv_level).setup(
-        folder_name=log_folder, file_name="message.csv"
+        folder_name=log_folder,
+        file_name="message.csv",
+        asynchronous=csv_asynchronous,
+        flush_rows=csv_flush_rows,
+        flush_seconds=csv_flush_seconds,
     )
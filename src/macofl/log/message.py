@@ -32,7 +32,7 @@ class MessageLogManager(CsvLogManager):
 
     @staticmethod
     def get_header() -> str:
-        return "log_timestamp,log_name,algorithm_round,timestamp,sender,to,type,size,thread"
+        return "log_timestamp,log_name,algorithm_round,timestamp,sender,to,type,size,thread,codec"
 
     @staticmethod
     def get_template() -> Template:
@@ -46,6 +46,7 @@ class MessageLogManager(CsvLogManager):
         msg_type: str,
         size: int,
         thread: Optional[str] = None,
+        codec: Optional[str] = None,
         timestamp: Optional[datetime] = None,
         level: Optional[int] = None,
     ) -> None:
@@ -55,7 +56,8 @@ class MessageLogManager(CsvLogManager):
         sender = str(sender.bare()) if isinstance(sender, JID) else sender
         to = str(to.bare()) if isinstance(to, JID) else to
         thread = "" if thread is None else thread
+        codec = "" if codec is None else codec
         msg = ",".join(
-            [str(current_round), dt_str, sender, to, msg_type, str(size), thread]
+            [str(current_round), dt_str, sender, to, msg_type, str(size), thread, codec]
         )
         self.logger.log(level=lvl, msg=msg)
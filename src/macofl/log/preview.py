@@ -0,0 +1,32 @@
+import zlib
+from typing import Optional
+
+
+class PayloadPreview:
+    """
+    Lazy representation of a message payload for the logs. The size, the CRC32 and the first
+    `max_chars` characters are only computed when the log record is formatted, so passing it as a
+    `%`-style argument costs nothing if the log level is disabled.
+    """
+
+    max_chars: int = 64
+
+    def __init__(self, payload: Optional[str | bytes], max_chars: Optional[int] = None):
+        self.payload = payload
+        self._max_chars = max_chars
+
+    def __str__(self) -> str:
+        if self.payload is None:
+            return "<empty>"
+        data = (
+            self.payload.encode("utf-8")
+            if isinstance(self.payload, str)
+            else self.payload
+        )
+        limit = PayloadPreview.max_chars if self._max_chars is None else self._max_chars
+        preview = self.payload[:limit] if limit > 0 else ""
+        ellipsis = "..." if len(self.payload) > limit else ""
+        return f"<{len(self.payload)} chars, crc32={zlib.crc32(data):08x}> {preview!r}{ellipsis}"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -1,4 +1,4 @@
 from .message import RfMessage
-from .multipart import MultipartHandler
+from .multipart import MultipartEviction, MultipartHandler
 
-__all__ = ["MultipartHandler", "RfMessage"]
+__all__ = ["MultipartEviction", "MultipartHandler", "RfMessage"]
@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Any, Dict
 
 from spade.message import Message
 
@@ -18,6 +18,22 @@ class RfMessage(Message):
         super().__init__(to, sender, body, thread, metadata)
         self.is_multipart = is_multipart
         self.is_multipart_completed = is_multipart_completed
+        # Set when the multipart content is decoded while it arrives instead of being joined in the body
+        self.decoded: Any = None
+        self._size: int | None = None
+
+    @property
+    def size(self) -> int:
+        """
+        Length of the received content, even if it was decoded without being stored in the body.
+        """
+        if self._size is not None:
+            return self._size
+        return 0 if self.body is None else len(self.body)
+
+    @size.setter
+    def size(self, value: int) -> None:
+        self._size = value
 
     def to_message(self) -> Message:
         to = None if not self.to else str(self.to.bare())
@@ -36,7 +52,7 @@ class RfMessage(Message):
     ) -> "RfMessage":
         to = None if not message.to else str(message.to.bare())
         sender = None if not message.sender else str(message.sender.bare())
-        return RfMessage(
+        rf_message = RfMessage(
             to=to,
             sender=sender,
             body=message.body,
@@ -45,6 +61,10 @@ class RfMessage(Message):
             is_multipart=is_multipart,
             is_multipart_completed=is_multipart_completed,
         )
+        if isinstance(message, RfMessage):
+            rf_message.decoded = message.decoded
+            rf_message._size = message._size
+        return rf_message
 
     @staticmethod
     def is_completed(message: Message | None) -> bool:
@@ -1,9 +1,96 @@
 import copy
+import time
 import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, Optional, Protocol
 
 from aioxmpp import JID
 from spade.message import Message
 
+from .message import RfMessage
+
+
+class StreamDecoder(Protocol):
+    """
+    Consumes the content of a multipart message part by part, in order, instead of joining it.
+    """
+
+    def feed(self, content: str) -> None: ...
+
+    def finish(self) -> Any: ...
+
+
+@dataclass
+class MultipartTransfer:
+    """
+    Reassembly state of one multipart message: the parts received so far, indexed by part number - 1,
+    and counters to know when the transfer is completed without scanning the parts.
+    """
+
+    total_parts: int
+    parts: list[Optional[str]] = field(init=False)
+    received_parts: int = 0
+    received_bytes: int = 0
+    # Length of the parts held in memory, the parts consumed by the decoder are not counted
+    stored_bytes: int = 0
+    # With a decoder, the contiguous parts are fed to it and released as soon as they arrive
+    decoder: Optional[StreamDecoder] = None
+    decoded_parts: int = 0
+    last_update: float = 0.0
+
+    def __post_init__(self) -> None:
+        self.parts = [None] * self.total_parts
+
+    def add_part(self, part_number: int, content: str) -> None:
+        if not 1 <= part_number <= self.total_parts:
+            raise ValueError(
+                f"Part number {part_number} out of range for a multipart of {self.total_parts} parts."
+            )
+        if part_number <= self.decoded_parts:
+            # Duplicated part already consumed by the decoder
+            return
+        previous = self.parts[part_number - 1]
+        if previous is None:
+            self.received_parts += 1
+        else:
+            self.received_bytes -= len(previous)
+            self.stored_bytes -= len(previous)
+        self.received_bytes += len(content)
+        self.stored_bytes += len(content)
+        self.parts[part_number - 1] = content
+        if self.decoder is not None:
+            while (
+                self.decoded_parts < self.total_parts
+                and self.parts[self.decoded_parts] is not None
+            ):
+                part: str = self.parts[self.decoded_parts]  # type: ignore
+                self.decoder.feed(part)
+                self.parts[self.decoded_parts] = None
+                self.stored_bytes -= len(part)
+                self.decoded_parts += 1
+
+    def is_completed(self) -> bool:
+        return self.received_parts == self.total_parts
+
+    def join(self) -> str:
+        return "".join(part for part in self.parts if part is not None)
+
+
+@dataclass
+class MultipartEviction:
+    """
+    A multipart transfer discarded before it was completed. The reason is "ttl" (no part arrived during
+    the time to live), "memory" (the storage exceeded its memory cap) or "unavailable" (the sender left).
+    """
+
+    sender: Optional[JID]
+    uuid4: str
+    reason: str
+    received_parts: int
+    total_parts: int
+    stored_bytes: int
+
 
 class MultipartHandler:
     """
@@ -13,11 +100,41 @@ class MultipartHandler:
     rebuild the messages in the correct order. The header is "multipart#[index]/[total]#[uuid4]|" where "index"
     is the id of the current message (starting by 1), "total" is the number of messages needed to rebuild the
     original content and "uuid4" is the unique universal identifier (v4) of the original splitted message.
+
+    The transfers that are not completed are bounded: a transfer is evicted if no part arrives during
+    `ttl_seconds`, and the least recently updated transfers are evicted while the parts in memory exceed
+    `max_bytes`. The evictions are kept until `pop_evictions` is called, so the agent can log them.
     """
 
-    def __init__(self) -> None:
-        # the storage is: { "ag1@localhost": { "uuid4": [ None, "msg2" ] } }
-        self.__multipart_message_storage: dict[JID, dict[str, list[str | None]]] = {}
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError(
+                f"The max_bytes must be a positive integer, but the current value is: {max_bytes}"
+            )
+        if ttl_seconds is not None and ttl_seconds <= 0:
+            raise ValueError(
+                f"The ttl_seconds must be positive, but the current value is: {ttl_seconds}"
+            )
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.__clock = clock
+        # the storage is: { ("ag1@localhost", "uuid4"): MultipartTransfer(parts=[ None, "msg2" ]) }
+        # sorted from the least to the most recently updated transfer
+        self.__multipart_message_storage: OrderedDict[
+            tuple[Optional[JID], str], MultipartTransfer
+        ] = OrderedDict()
+        self.__stored_bytes: int = 0
+        self.__evictions: deque[MultipartEviction] = deque(maxlen=1024)
+        self.completed_transfers: int = 0
+        self.evicted_transfers: int = 0
+        self.evicted_bytes: int = 0
+        # { "rf.conversation": factory of the decoder of the multipart messages of that conversation }
+        self.__stream_decoders: dict[str, Callable[[Message], StreamDecoder]] = {}
         self.__metadata_start: str = "multipart"
         self.__metadata_split_token: str = "#"
         self.__metadata_uuid: str = "xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx"
@@ -43,26 +160,127 @@ class MultipartHandler:
         )
 
     def get_header(self, content: str) -> str:
-        return content.split(self.__metadata_end_token)[0]
+        end = content.find(self.__metadata_end_token, 0, self.__metadata_header_size)
+        return content if end < 0 else content[:end]
+
+    def _parse_header(self, content: str) -> tuple[int, int, str, int]:
+        """
+        Parses the multipart header of a message content in a single pass.
+
+        Args:
+            content (str): The body of a multipart message.
+
+        Raises:
+            ValueError: If the content does not start with a valid multipart header.
+
+        Returns:
+            tuple[int, int, str, int]: The part number, the total parts, the uuid4 and the index where
+            the part content starts.
+        """
+        end = content.find(self.__metadata_end_token, 0, self.__metadata_header_size)
+        if end < 0:
+            raise ValueError("The content does not have a multipart header.")
+        _, parts, uuid4 = content[:end].split(self.__metadata_split_token)
+        part_number, total_parts = parts.split("/")
+        return int(part_number), int(total_parts), uuid4, end + 1
 
     def _get_part_number(self, content: str) -> int:
-        header = self.get_header(content=content)
-        part_number = header.split(self.__metadata_split_token)[1].split("/")[0]
-        return int(part_number)
+        return self._parse_header(content=content)[0]
 
     def _get_total_parts(self, content: str) -> int:
-        header = self.get_header(content=content)
-        total_parts = header.split(self.__metadata_split_token)[1].split("/")[1]
-        return int(total_parts)
+        return self._parse_header(content=content)[1]
 
     def _get_uuid4(self, content: str) -> str:
-        header = self.get_header(content=content)
-        uuid4 = header.split(self.__metadata_split_token)[2]
-        return uuid4
+        return self._parse_header(content=content)[2]
+
+    def register_stream_decoder(
+        self, conversation: str, factory: Callable[[Message], StreamDecoder]
+    ) -> None:
+        """
+        Decodes the multipart messages whose "rf.conversation" metadata is `conversation` while their
+        parts arrive, instead of joining all the parts when the last one arrives. The completed message
+        is a `RfMessage` with an empty body and the result of the decoder in its `decoded` attribute.
+
+        Args:
+            conversation (str): The value of the "rf.conversation" metadata.
+            factory (Callable[[Message], StreamDecoder]): Builds the decoder from the first received part.
+        """
+        self.__stream_decoders[conversation] = factory
 
     def any_multipart_waiting(self) -> bool:
         return len(self.__multipart_message_storage.keys()) > 0
 
+    @property
+    def stored_bytes(self) -> int:
+        """
+        Length of the parts of the transfers that are not completed held in memory.
+        """
+        return self.__stored_bytes
+
+    @staticmethod
+    def __get_key(sender: Optional[JID], uuid4: str) -> tuple[Optional[JID], str]:
+        return (None if sender is None else sender.bare(), uuid4)
+
+    def pop_evictions(self) -> list[MultipartEviction]:
+        """
+        Returns and forgets the evictions that happened since the last call.
+        """
+        evictions = list(self.__evictions)
+        self.__evictions.clear()
+        return evictions
+
+    def evict_expired(self) -> list[MultipartEviction]:
+        """
+        Evicts the transfers without new parts during `ttl_seconds`.
+
+        Returns:
+            list[MultipartEviction]: The evicted transfers.
+        """
+        evicted: list[MultipartEviction] = []
+        if self.ttl_seconds is None:
+            return evicted
+        deadline = self.__clock() - self.ttl_seconds
+        while self.__multipart_message_storage:
+            key, transfer = next(iter(self.__multipart_message_storage.items()))
+            if transfer.last_update > deadline:
+                break
+            evicted.append(self.__evict(key, reason="ttl"))
+        return evicted
+
+    def forget_sender(self, sender: JID) -> list[MultipartEviction]:
+        """
+        Evicts all the transfers of `sender`, e.g. when it is no longer available.
+
+        Returns:
+            list[MultipartEviction]: The evicted transfers.
+        """
+        keys = [
+            key for key in self.__multipart_message_storage if key[0] == sender.bare()
+        ]
+        return [self.__evict(key, reason="unavailable") for key in keys]
+
+    def __evict_to_memory_cap(self) -> None:
+        if self.max_bytes is None:
+            return
+        while self.__stored_bytes > self.max_bytes and self.__multipart_message_storage:
+            self.__evict(next(iter(self.__multipart_message_storage)), reason="memory")
+
+    def __evict(self, key: tuple[Optional[JID], str], reason: str) -> MultipartEviction:
+        transfer = self.__multipart_message_storage.pop(key)
+        self.__stored_bytes -= transfer.stored_bytes
+        self.evicted_transfers += 1
+        self.evicted_bytes += transfer.stored_bytes
+        eviction = MultipartEviction(
+            sender=key[0],
+            uuid4=key[1],
+            reason=reason,
+            received_parts=transfer.received_parts,
+            total_parts=transfer.total_parts,
+            stored_bytes=transfer.stored_bytes,
+        )
+        self.__evictions.append(eviction)
+        return eviction
+
     def is_multipart_complete(self, message: Message) -> bool | None:
         """
         Returns a bool to denote whether the message is complete and ready to be rebuilded.
@@ -74,30 +292,20 @@ class MultipartHandler:
         Returns:
             bool | None: True if multipart is complete, False otherwise and None if the sender has not multipart messages stored.
         """
-        sender = message.sender
-        uuid4 = self._get_uuid4(message.body)
-        if (
-            not sender in self.__multipart_message_storage
-            or not uuid4 in self.__multipart_message_storage[sender].keys()
-        ):
+        key = MultipartHandler.__get_key(message.sender, self._get_uuid4(message.body))
+        if not key in self.__multipart_message_storage:
             return None
-        for part in self.__multipart_message_storage[sender][uuid4]:
-            if part is None:
-                return False
-        return True
+        return self.__multipart_message_storage[key].is_completed()
 
     def _rebuild_multipart_content(self, sender: JID, uuid4: str) -> str:
-        content = ""
-        for part in self.__multipart_message_storage[sender][uuid4]:
-            content += part if part is not None else ""
-        return content
-
-    def __remove_data(self, sender: JID, uuid4: str) -> None:
-        if sender in self.__multipart_message_storage:
-            if uuid4 in self.__multipart_message_storage[sender].keys():
-                del self.__multipart_message_storage[sender][uuid4]
-                if len(self.__multipart_message_storage[sender].keys()) == 0:
-                    del self.__multipart_message_storage[sender]
+        return self.__multipart_message_storage[
+            MultipartHandler.__get_key(sender, uuid4)
+        ].join()
+
+    def __remove_data(self, key: tuple[Optional[JID], str]) -> None:
+        transfer = self.__multipart_message_storage.pop(key, None)
+        if transfer is not None:
+            self.__stored_bytes -= transfer.stored_bytes
 
     def rebuild_multipart(self, message: Message) -> Message | None:
         """
@@ -113,32 +321,84 @@ class MultipartHandler:
         """
         # NOTE multipart header: multipart#1/2#xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx|
         if self.is_multipart(message):
-            sender = message.sender
-            multipart_meta = message.body.split(self.__metadata_end_token)[0]
-            part_number = self._get_part_number(message.body)
-            total_parts = self._get_total_parts(message.body)
-            uuid4 = self._get_uuid4(message.body)
-            if not sender in self.__multipart_message_storage:
-                self.__multipart_message_storage[sender] = {}
-            if not uuid4 in self.__multipart_message_storage[sender].keys():
-                self.__multipart_message_storage[sender][uuid4] = [None] * total_parts
-            self.__multipart_message_storage[sender][uuid4][part_number - 1] = (
-                message.body[len(multipart_meta + self.__metadata_end_token) :]
+            part_number, total_parts, uuid4, content_start = self._parse_header(
+                message.body
             )
-            if self.is_multipart_complete(message):
-                message.body = self._rebuild_multipart_content(
-                    sender=sender, uuid4=uuid4
+            self.evict_expired()
+            key = MultipartHandler.__get_key(message.sender, uuid4)
+            if not key in self.__multipart_message_storage:
+                factory = self.__stream_decoders.get(
+                    (message.metadata or {}).get("rf.conversation", "")
+                )
+                self.__multipart_message_storage[key] = MultipartTransfer(
+                    total_parts=total_parts,
+                    decoder=None if factory is None else factory(message),
                 )
-                self.__remove_data(sender=sender, uuid4=uuid4)
+            transfer = self.__multipart_message_storage[key]
+            self.__multipart_message_storage.move_to_end(key)
+            transfer.last_update = self.__clock()
+            stored_bytes = transfer.stored_bytes
+            try:
+                transfer.add_part(part_number, message.body[content_start:])
+            except ValueError:
+                self.__remove_data(key)
+                raise
+            finally:
+                self.__stored_bytes += transfer.stored_bytes - stored_bytes
+
+            if not transfer.is_completed():
+                self.__evict_to_memory_cap()
+                return None
+            self.__remove_data(key)
+            self.completed_transfers += 1
+            if transfer.decoder is None:
+                message.body = transfer.join()
                 return message
+            completed = RfMessage.from_message(
+                message=message, is_multipart=True, is_multipart_completed=True
+            )
+            completed.body = ""
+            completed.size = transfer.received_bytes
+            completed.decoded = transfer.decoder.finish()
+            return completed
         return None
 
-    def __divide_content(self, content: str, size: int) -> list[str]:
+    def __divide_content(self, content: str, size: int) -> Iterator[str]:
         if size <= 0:
             raise RuntimeError(
                 f"The size must be a positive integer, but the current value is: {size}"
             )
-        return [content[i : i + size] for i in range(0, len(content), size)]
+        return (content[i : i + size] for i in range(0, len(content), size))
+
+    def _iter_multipart_content(
+        self, content: str, max_size: int
+    ) -> Iterator[str] | None:
+        """
+        Lazy version of `_generate_multipart_content`: each multipart content is sliced from the original
+        content only when the iterator reaches it.
+
+        Args:
+            content (str): The content to be splitted if its length exceeds the max_size.
+            max_size (int): Threshold to split the content into a list of content.
+
+        Returns:
+            Iterator[str] | None: Iterator of multipart message content to put in the body of the SPADE messages
+            or None if the content length does not exceed the max_size tanking into account the multipart header metadata.
+        """
+        if max_size - self.__metadata_header_size <= 0:
+            raise RuntimeError(
+                f"The max_size message must be increased at least to {self.__metadata_header_size + 1}"
+            )
+
+        if len(content) > max_size:
+            part_size = max_size - self.__metadata_header_size
+            total_parts = -(-len(content) // part_size)
+            uuid4 = str(uuid.uuid4())
+            return (
+                f"{self.__metadata_start}{self.__metadata_split_token}{i + 1}/{total_parts}{self.__metadata_split_token}{uuid4}{self.__metadata_end_token}{part}"
+                for i, part in enumerate(self.__divide_content(content, part_size))
+            )
+        return None
 
     def _generate_multipart_content(
         self, content: str, max_size: int
@@ -155,21 +415,129 @@ class MultipartHandler:
             list[str] | None: List of multipart message content to put in the body of the SPADE messages
             or None if the content length does not exceed the max_size tanking into account the multipart header metadata.
         """
+        multiparts = self._iter_multipart_content(content=content, max_size=max_size)
+        return None if multiparts is None else list(multiparts)
+
+    @staticmethod
+    def build_part_message(message_base: Message, body: str) -> Message:
+        """
+        Creates a multipart message with the receiver, sender, thread and metadata of the base message.
+        The body of the base message is never copied.
+
+        Args:
+            message_base (Message): The message whose headers are reused.
+            body (str): The body of the new message.
+
+        Returns:
+            Message: The new message.
+        """
+        message = Message(
+            to=None if message_base.to is None else str(message_base.to),
+            sender=None if message_base.sender is None else str(message_base.sender),
+            body=body,
+            thread=message_base.thread,
+        )
+        message.metadata = copy.copy(message_base.metadata)
+        return message
+
+    def iter_multipart_messages(
+        self, content: str, max_size: int, message_base: Message
+    ) -> Iterator[Message]:
+        """
+        Lazily yields the messages needed to send the content. If the content does not exceed the maximum
+        size, the base message is yielded as is. Otherwise each multipart message is built only when
+        it is requested, so the caller can send them one by one without holding all of them in memory.
+
+        Args:
+            content (str): The information that multipart messages will have in its bodies.
+            max_size (int): Maximum size body length of each multipart message.
+            message_base (Message): The message whose headers are reused by all the multipart messages.
+
+        Returns:
+            Iterator[Message]: The messages to send.
+        """
+        content_splits = self._iter_multipart_content(
+            content=content, max_size=max_size
+        )
+        if content_splits is None:
+            yield message_base
+            return
+        for multipart in content_splits:
+            yield MultipartHandler.build_part_message(message_base, multipart)
+
+    def iter_multipart_messages_from_stream(
+        self,
+        length: int,
+        pieces: Iterable[str],
+        max_size: int,
+        message_base: Message,
+    ) -> Iterator[Message]:
+        """
+        Streaming version of `iter_multipart_messages`: the content is consumed from `pieces` only when
+        the next message is requested, so at most one multipart message content is held in memory.
+
+        Args:
+            length (int): The length of the concatenation of the pieces, needed to build the headers.
+            pieces (Iterable[str]): The pieces of the content, of any length.
+            max_size (int): Maximum size body length of each multipart message.
+            message_base (Message): The message whose headers are reused by all the multipart messages.
+
+        Raises:
+            RuntimeError: If the length of the pieces is not `length`.
+
+        Returns:
+            Iterator[Message]: The messages to send.
+        """
         if max_size - self.__metadata_header_size <= 0:
             raise RuntimeError(
                 f"The max_size message must be increased at least to {self.__metadata_header_size + 1}"
             )
+        if length <= max_size:
+            message = MultipartHandler.build_part_message(message_base, "")
+            message.body = "".join(pieces)
+            if len(message.body) != length:
+                raise RuntimeError(
+                    f"The content length is {len(message.body)} but {length} was expected."
+                )
+            yield message
+            return
 
-        if len(content) > max_size:
-            multiparts = self.__divide_content(
-                content, max_size - self.__metadata_header_size
+        part_size = max_size - self.__metadata_header_size
+        total_parts = -(-length // part_size)
+        uuid4 = str(uuid.uuid4())
+        sent = 0
+        for i, part in enumerate(MultipartHandler.__rechunk(pieces, part_size)):
+            sent += len(part)
+            if i >= total_parts or sent > length:
+                raise RuntimeError(
+                    f"The content is longer than the expected length {length}."
+                )
+            yield MultipartHandler.build_part_message(
+                message_base,
+                f"{self.__metadata_start}{self.__metadata_split_token}{i + 1}/{total_parts}{self.__metadata_split_token}{uuid4}{self.__metadata_end_token}{part}",
+            )
+        if sent != length:
+            raise RuntimeError(
+                f"The content length is {sent} but {length} was expected."
             )
-            uuid4 = str(uuid.uuid4())
-            return [
-                f"{self.__metadata_start}{self.__metadata_split_token}{i + 1}/{len(multiparts)}{self.__metadata_split_token}{uuid4}{self.__metadata_end_token}{part}"
-                for i, part in enumerate(multiparts)
-            ]
-        return None
+
+    @staticmethod
+    def __rechunk(pieces: Iterable[str], size: int) -> Iterator[str]:
+        buffer: list[str] = []
+        buffered = 0
+        for piece in pieces:
+            start = 0
+            while start < len(piece):
+                taken = piece[start : start + size - buffered]
+                start += len(taken)
+                buffer.append(taken)
+                buffered += len(taken)
+                if buffered == size:
+                    yield "".join(buffer)
+                    buffer = []
+                    buffered = 0
+        if buffered > 0:
+            yield "".join(buffer)
 
     def generate_multipart_messages(
         self, content: str, max_size: int, message_base: Message
@@ -181,19 +549,18 @@ class MultipartHandler:
         Args:
             content (str): The information that multipart messages will have in its bodies.
             max_size (int): Maximum size body length of each multipart message.
-            message_base (Message): The message that will be copied by all the multipart messages, replacing just the body.
+            message_base (Message): The message whose receiver, sender, thread and metadata are reused by all
+            the multipart messages. Its body is never copied.
 
         Returns:
             list[Message] | None: A list of multipart messages to send or None if the content does not exceed the maximum size.
         """
-        content_splits = self._generate_multipart_content(
+        content_splits = self._iter_multipart_content(
             content=content, max_size=max_size
         )
         if content_splits is not None:
-            multiparts_messages: list[Message] = []
-            for multipart in content_splits:
-                message = copy.deepcopy(message_base)
-                message.body = multipart
-                multiparts_messages.append(message)
-            return multiparts_messages
+            return [
+                MultipartHandler.build_part_message(message_base, multipart)
+                for multipart in content_splits
+            ]
         return None
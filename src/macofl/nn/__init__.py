@@ -1,2 +1,3 @@
 from . import model
+from .executor import TrainingExecutor
 from .model_factory import ModelManagerFactory
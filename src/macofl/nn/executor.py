@@ -0,0 +1,152 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, OrderedDict
+
+from aioxmpp import JID
+from torch import Tensor
+
+from ..datatypes.metrics import ModelMetrics
+from ..datatypes.models import ModelManager
+
+
+def _train_in_process(
+    model_manager: ModelManager, epochs: Optional[int]
+) -> tuple[OrderedDict[str, Tensor], dict[str, Any], list[ModelMetrics]]:
+    # The model manager arrives pickled with its dataloaders, only the trained state goes back
+    metrics = model_manager.train(epochs=epochs)
+    return (
+        model_manager.model.state_dict(),
+        model_manager.optimizer.state_dict(),
+        metrics,
+    )
+
+
+def _inference_in_process(model_manager: ModelManager, test: bool) -> ModelMetrics:
+    return model_manager.test_inference() if test else model_manager.inference()
+
+
+class TrainingExecutor:
+    """
+    Runs the training and inference of a `ModelManager` out of the asyncio event loop, so the
+    messaging behaviours of all the agents of the process keep running while a model trains.
+
+    Modes:
+        - "inline": runs in the event loop, blocking it (the behaviour without executor).
+        - "thread": runs in a thread pool. PyTorch releases the GIL inside its operators, so several
+          agents of the same process train concurrently.
+        - "process": runs in a process pool. The whole `ModelManager` is pickled on each call, including
+          its dataloaders and their datasets, and the resulting weights and optimizer state are loaded
+          back into the local model. The cost of each call grows with the size of the local dataset, so
+          this mode only pays off when the training time dominates the serialization.
+
+    The same executor can be shared by all the agents of a launcher to bound the number of
+    concurrent trainings with `max_workers`.
+    """
+
+    MODES = ("inline", "thread", "process")
+
+    def __init__(self, mode: str = "thread", max_workers: Optional[int] = None):
+        if mode not in TrainingExecutor.MODES:
+            raise ValueError(
+                f"Training execution mode must be one of {TrainingExecutor.MODES} and it is {mode}."
+            )
+        if max_workers is not None and max_workers <= 0:
+            raise ValueError(
+                f"The max_workers must be a positive integer, but the current value is: {max_workers}"
+            )
+        self.mode = mode
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Optional[Executor]:
+        if self._executor is None and self.mode == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="rf-train"
+            )
+        elif self._executor is None and self.mode == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def train(
+        self,
+        model_manager: ModelManager,
+        epochs: Optional[int] = None,
+        train_logger: Optional[Callable[[int, ModelMetrics, JID, int], None]] = None,
+        agent_jid: Optional[JID] = None,
+        current_round: Optional[int] = None,
+    ) -> list[ModelMetrics]:
+        """
+        Trains the model with `ModelManager.train` using the execution mode of the executor.
+
+        Args:
+            model_manager (ModelManager): The model to train.
+            epochs (Optional[int], optional): Number of epochs. Defaults to the `ModelManager` epochs.
+            train_logger (Optional[Callable[[int, ModelMetrics, JID, int], None]], optional): Called after each epoch.
+            In "process" mode it is called in this process once the training finishes. Defaults to None.
+            agent_jid (Optional[JID], optional): The agent that trains the model. Defaults to None.
+            current_round (Optional[int], optional): The current algorithm round. Defaults to None.
+
+        Returns:
+            list[ModelMetrics]: The metrics of each training epoch.
+        """
+        train = functools.partial(
+            model_manager.train,
+            epochs=epochs,
+            train_logger=train_logger,
+            agent_jid=agent_jid,
+            current_round=current_round,
+        )
+        if self.mode == "inline":
+            return train()
+        if self.mode == "thread":
+            return await self._run(train)
+
+        with model_manager.training_session():
+            model_state, optimizer_state, metrics = await self._run(
+                _train_in_process, model_manager, epochs
+            )
+            model_manager.replace_all_layers(new_layers=model_state)
+            model_manager.optimizer.load_state_dict(optimizer_state)
+        if (
+            train_logger is not None
+            and agent_jid is not None
+            and current_round is not None
+        ):
+            for epoch, epoch_metric in enumerate(metrics):
+                train_logger(epoch + 1, epoch_metric, agent_jid, current_round)
+        return metrics
+
+    async def inference(self, model_manager: ModelManager) -> ModelMetrics:
+        """
+        Returns the validation metrics of `ModelManager.inference` using the execution mode of the executor.
+        """
+        if self.mode == "inline":
+            return model_manager.inference()
+        if self.mode == "thread":
+            return await self._run(model_manager.inference)
+        return await self._run(_inference_in_process, model_manager, False)
+
+    async def test_inference(self, model_manager: ModelManager) -> ModelMetrics:
+        """
+        Returns the test metrics of `ModelManager.test_inference` using the execution mode of the executor.
+        """
+        if self.mode == "inline":
+            return model_manager.test_inference()
+        if self.mode == "thread":
+            return await self._run(model_manager.test_inference)
+        return await self._run(_inference_in_process, model_manager, True)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
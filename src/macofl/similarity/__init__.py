@@ -1,5 +1,12 @@
+from .assignment import LayerAssigner
 from .function import SimilarityFunction
 from .similarity_manager import SimilarityManager
-from .similarity_vector import SimilarityVector
+from .similarity_vector import LayerTable, SimilarityVector
 
-__all__ = ["SimilarityFunction", "SimilarityManager", "SimilarityVector"]
+__all__ = [
+    "LayerAssigner",
+    "LayerTable",
+    "SimilarityFunction",
+    "SimilarityManager",
+    "SimilarityVector",
+]
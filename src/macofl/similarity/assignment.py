@@ -0,0 +1,130 @@
+from typing import Optional
+
+import numpy as np
+from aioxmpp import JID
+
+from .similarity_vector import SimilarityVector
+
+
+class LayerAssigner:
+    """
+    Vectorised assignment of layers to neighbours based on the similarity vectors. The own vector and
+    the vectors of the selected neighbours are stacked in a (neighbours x layers) matrix with a fixed
+    layer order, and the layers of all the neighbours are chosen at once over the absolute differences
+    `|own - neighbour|`:
+
+        - "min": the `k` layers with the smallest difference of each neighbour.
+        - "max": the `k` layers with the largest difference of each neighbour.
+
+    The ties are broken by the layer order. The layers missing in a vector are never assigned, and the
+    neighbours without a vector do not receive layers.
+    """
+
+    CRITERIA = ("min", "max")
+
+    def __init__(self, criterion: str = "min", k: int = 1) -> None:
+        if criterion not in LayerAssigner.CRITERIA:
+            raise ValueError(
+                f"Layer assignment criterion must be one of {LayerAssigner.CRITERIA} and it is {criterion}."
+            )
+        if k <= 0:
+            raise ValueError(
+                f"The k must be a positive integer, but the current value is: {k}"
+            )
+        self.criterion = criterion
+        self.k = k
+
+    @staticmethod
+    def to_array(vector: SimilarityVector, layer_names: list[str]) -> np.ndarray:
+        """
+        Returns the values of `vector` in the order of `layer_names`, with NaN for the missing layers.
+        """
+        if (
+            vector.values is not None
+            and vector.layer_table is not None
+            and list(vector.layer_table.names) == layer_names
+        ):
+            return vector.values.astype(np.float64)
+        values = vector.vector
+        if len(values) == len(layer_names) and list(values.keys()) == layer_names:
+            return np.fromiter(values.values(), dtype=np.float64, count=len(values))
+        return np.fromiter(
+            (values.get(name, np.nan) for name in layer_names),
+            dtype=np.float64,
+            count=len(layer_names),
+        )
+
+    @staticmethod
+    def stack(
+        my_vector: SimilarityVector,
+        neighbours_vectors: dict[JID, SimilarityVector],
+        neighbours: list[JID],
+        layer_names: list[str],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Stacks the similarity vectors.
+
+        Args:
+            my_vector (SimilarityVector): The own vector.
+            neighbours_vectors (dict[JID, SimilarityVector]): The vectors of the neighbours, by bare JID.
+            neighbours (list[JID]): The rows of the matrix.
+            layer_names (list[str]): The columns of the matrix.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The own values with shape (layers,) and the neighbour values with
+            shape (neighbours, layers). The missing values are NaN.
+        """
+        own = LayerAssigner.to_array(my_vector, layer_names)
+        matrix = np.full((len(neighbours), len(layer_names)), np.nan)
+        for row, neighbour in enumerate(neighbours):
+            vector = neighbours_vectors.get(neighbour.bare())
+            if vector is not None:
+                matrix[row] = LayerAssigner.to_array(vector, layer_names)
+        return own, matrix
+
+    def assign(
+        self,
+        my_vector: SimilarityVector,
+        neighbours_vectors: dict[JID, SimilarityVector],
+        neighbours: list[JID],
+        layer_names: Optional[list[str]] = None,
+    ) -> dict[JID, list[str]]:
+        """
+        Chooses the layers of each neighbour.
+
+        Args:
+            my_vector (SimilarityVector): The own vector.
+            neighbours_vectors (dict[JID, SimilarityVector]): The vectors of the neighbours, by bare JID.
+            neighbours (list[JID]): The neighbours that will receive layers.
+            layer_names (Optional[list[str]], optional): The candidate layers. Defaults to the layers of `my_vector`.
+
+        Returns:
+            dict[JID, list[str]]: The assigned layers of each neighbour in the order of `layer_names`. The
+            neighbours without any comparable layer are not included.
+        """
+        names = list(my_vector.vector.keys()) if layer_names is None else layer_names
+        if not names or not neighbours:
+            return {}
+        own, matrix = LayerAssigner.stack(
+            my_vector, neighbours_vectors, neighbours, names
+        )
+        with np.errstate(invalid="ignore"):
+            scores = np.abs(matrix - own)
+        if self.criterion == "max":
+            scores = -scores
+        scores[np.isnan(scores)] = np.inf
+
+        k = min(self.k, len(names))
+        if k == 1:
+            chosen = np.argmin(scores, axis=1)[:, None]
+        else:
+            chosen = np.argsort(scores, axis=1, kind="stable")[:, :k]
+            chosen.sort(axis=1)
+        valid = np.isfinite(np.take_along_axis(scores, chosen, axis=1))
+
+        result: dict[JID, list[str]] = {}
+        for neighbour, columns, mask in zip(neighbours, chosen.tolist(), valid):
+            layers = [names[c] for c, ok in zip(columns, mask) if ok]
+            if layers:
+                result[neighbour] = layers
+        return result
@@ -43,17 +43,59 @@ class EuclideanDistanceFunction(SimilarityFunction):
         layers1: OrderedDict[str, Tensor],
         layers2: OrderedDict[str, Tensor],
     ) -> SimilarityVector:
-        vector: OrderedDict[str, float] = OrderedDict()
-
         for layer in layers1:
             if not layer in layers2:
                 raise ValueError(
                     f"Layer {layer} not present in {list(layers2.keys())}."
                 )
 
-            diff = layers1[layer] - layers2[layer]
-            euclidean_distance = torch.norm(diff).item()
+        names = list(layers1.keys())
+        with torch.no_grad():
+            norms = EuclideanDistanceFunction.layer_distances(
+                [layers1[layer] for layer in names],
+                [layers2[layer] for layer in names],
+            )
+        # A single host synchronization for all the layers instead of one .item() per layer
+        distances: list[float] = (
+            torch.stack(
+                [n.to(device="cpu", dtype=torch.float64) for n in norms]
+            ).tolist()
+            if norms
+            else []
+        )
+        return SimilarityVector(vector=OrderedDict(zip(names, distances)))
 
-            vector[layer] = euclidean_distance
+    @staticmethod
+    def layer_distances(tensors1: list[Tensor], tensors2: list[Tensor]) -> list[Tensor]:
+        """
+        Computes the euclidean distance between each pair of tensors. The floating point tensors
+        are processed in one batched pass with the `torch._foreach_*` kernels when they are available.
 
-        return SimilarityVector(vector=vector)
+        Args:
+            tensors1 (list[Tensor]): The first tensor of each pair.
+            tensors2 (list[Tensor]): The second tensor of each pair.
+
+        Returns:
+            list[Tensor]: The 0-dim tensors with the distance of each pair.
+        """
+        norms: list[Tensor | None] = [None] * len(tensors1)
+        batched: list[int] = []
+        for i, (t1, t2) in enumerate(zip(tensors1, tensors2)):
+            if (
+                t1.is_floating_point()
+                and t1.dtype == t2.dtype
+                and t1.device == t2.device
+            ):
+                batched.append(i)
+            else:
+                norms[i] = torch.norm((t1 - t2).float())
+        if batched and hasattr(torch, "_foreach_norm"):
+            diffs = torch._foreach_sub(
+                [tensors1[i] for i in batched], [tensors2[i] for i in batched]
+            )
+            for i, norm in zip(batched, torch._foreach_norm(diffs)):
+                norms[i] = norm
+        else:
+            for i in batched:
+                norms[i] = torch.norm(tensors1[i] - tensors2[i])
+        return [n for n in norms if n is not None]
@@ -1,22 +1,29 @@
 import asyncio
-from datetime import datetime, timedelta, timezone
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Optional, OrderedDict
 
 from aioxmpp import JID
+from spade.message import Message
 
 from ..datatypes.models import ModelManager
 from .function import SimilarityFunction
-from .similarity_vector import SimilarityVector
+from .similarity_vector import LayerTable, SimilarityVector
 
 
 class SimilarityManager:
+    VECTOR_CODECS = ("json", "binary")
 
     def __init__(
         self,
         model_manager: ModelManager,
         wait_for_responses_timeout: float = 2 * 60,
         function: Optional[SimilarityFunction] = None,
+        vector_codec: str = "binary",
     ) -> None:
+        if vector_codec not in SimilarityManager.VECTOR_CODECS:
+            raise ValueError(
+                f"Similarity vector codec must be one of {SimilarityManager.VECTOR_CODECS} and it is {vector_codec}."
+            )
         # NOTE Operations such as adding, removing, and reading a value on a dict are atomic.
         # Specifically:
         #     Adding a key and value mapping.
@@ -33,31 +40,82 @@ class SimilarityManager:
             []
         )  # Neighbours waiting to my response. [tuple[JID, str]] are tuples of neighbours and threads.
         self.similarity_vectors: dict[JID, SimilarityVector] = {}
+        self.__response_received = asyncio.Event()
+        self.__cached_vector: Optional[tuple[int, SimilarityVector]] = None
+        self.vector_codec = vector_codec
+        # Known layer tables by digest and by layer names
+        self.layer_tables: dict[bytes, LayerTable] = {}
+        self.__layer_tables_by_names: dict[tuple[str, ...], LayerTable] = {}
+        # Neighbours that have received our layer table and neighbours whose table we need
+        self.__layer_table_sent: set[JID] = set()
+        self.__layer_table_requests: set[JID] = set()
 
     def clear_waiting_responses(self, neighbours: list[JID], thread: str) -> None:
         self.waiting_responses = {n.bare(): thread for n in neighbours}
 
     def get_own_similarity_vector(self) -> SimilarityVector | None:
+        """
+        Computes the similarity vector of the current model against its initial state. The result is
+        cached by `ModelManager.stable_version`, so it is only recomputed when the model changes. While
+        the model is training the cache is not used, unless the stable layers are frozen: then the vector
+        of the frozen layers is returned.
+
+        Returns:
+            SimilarityVector | None: A new vector (callers may modify it) or None without similarity function.
+        """
         if self.function is None:
             # raise ValueError(
             #     "The agent must have a function to compute the similarity vector."
             # )
             return None
-        layer2 = self.model_manager.model.state_dict()
-        vector = self.function.get_similarity_vector(
-            layers1=self.model_manager.initial_state,
-            layers2=layer2,
+        version = self.model_manager.stable_version
+        cacheable = (
+            not self.model_manager.is_training()
+            or self.model_manager.has_stable_layers()
         )
+        if (
+            self.__cached_vector is not None
+            and self.__cached_vector[0] == version
+            and cacheable
+        ):
+            cached = self.__cached_vector[1]
+        else:
+            layer2 = self.model_manager.get_stable_layers()
+            cached = self.function.get_similarity_vector(
+                layers1=self.model_manager.initial_state,
+                layers2=layer2,
+            )
+            if cacheable:
+                self.__cached_vector = (version, cached)
+        vector = SimilarityVector(vector=OrderedDict(cached.vector))
         vector.sent_time_z = datetime.now(tz=timezone.utc)
         return vector
 
     async def wait_similarity_vectors(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until all the neighbours in `waiting_responses` have sent their similarity vectors or the
+        timeout expires. It wakes up as soon as a vector arrives instead of polling.
+
+        Args:
+            timeout (Optional[float], optional): Maximum seconds to wait. Defaults to `wait_for_responses_timeout`.
+
+        Returns:
+            bool: True if all the responses have been received, False if the timeout expired.
+        """
         to = timeout if timeout is not None else self.wait_for_responses_timeout
-        stop_time_z = datetime.now(tz=timezone.utc) + timedelta(seconds=to)
-        stop_time_reached = False
-        while list(self.waiting_responses.keys()) and not stop_time_reached:
-            await asyncio.sleep(delay=2)
-            stop_time_reached = datetime.now(tz=timezone.utc) >= stop_time_z
+        loop = asyncio.get_running_loop()
+        stop_time = loop.time() + to
+        while self.waiting_responses:
+            remaining_seconds = stop_time - loop.time()
+            if remaining_seconds <= 0:
+                break
+            self.__response_received.clear()
+            try:
+                await asyncio.wait_for(
+                    self.__response_received.wait(), timeout=remaining_seconds
+                )
+            except asyncio.TimeoutError:
+                break
         return len(list(self.waiting_responses.keys())) == 0
 
     def add_similarity_vector(
@@ -69,9 +127,87 @@ class SimilarityManager:
             and thread == self.waiting_responses[neighbour.bare()]
         ):
             del self.waiting_responses[neighbour.bare()]
+            self.__response_received.set()
         self.similarity_vectors[neighbour.bare()] = vector
 
     def get_vector(self, neighbour: JID) -> SimilarityVector | None:
         if neighbour.bare() in self.similarity_vectors:
             return self.similarity_vectors[neighbour.bare()]
         return None
+
+    def get_layer_table(self, names: tuple[str, ...]) -> LayerTable:
+        """
+        Returns the layer table with the layer `names` in that order, registering it if it is new.
+        """
+        table = self.__layer_tables_by_names.get(names)
+        if table is None:
+            table = self.layer_tables.setdefault(
+                LayerTable.get_digest(names), LayerTable(names)
+            )
+            self.__layer_tables_by_names[names] = table
+        return table
+
+    def encode_vector(self, vector: SimilarityVector, neighbour: JID) -> Message:
+        """
+        Builds the message to send `vector` to `neighbour` with the `vector_codec`. With the binary
+        codec the layer table is only sent with the first vector to each neighbour, or when the
+        neighbour requests it.
+
+        Args:
+            vector (SimilarityVector): The vector to send.
+            neighbour (JID): The receiver.
+
+        Returns:
+            Message: The message with the body of the vector.
+        """
+        if self.vector_codec == "json":
+            return vector.to_message()
+        neighbour = neighbour.bare()
+        table = (
+            vector.layer_table
+            if vector.layer_table is not None
+            else self.get_layer_table(tuple(vector.vector.keys()))
+        )
+        msg = vector.to_binary_message(
+            layer_table=table,
+            include_layer_table=neighbour not in self.__layer_table_sent,
+            request_layer_table=neighbour in self.__layer_table_requests,
+        )
+        self.__layer_table_sent.add(neighbour)
+        self.__layer_table_requests.discard(neighbour)
+        return msg
+
+    def decode_vector(self, message: Message) -> SimilarityVector:
+        """
+        Decodes a vector sent with any codec.
+
+        Args:
+            message (Message): The received message.
+
+        Raises:
+            ValueError: If the body is malformed or the layer table of the sender is not known. In the
+            latter case the table is requested with the next vector sent to the sender.
+
+        Returns:
+            SimilarityVector: The received vector.
+        """
+        if not SimilarityVector.is_binary_message(message):
+            return SimilarityVector.from_message(message)
+        sender = JID.fromstr(str(message.sender)).bare()
+        try:
+            vector = SimilarityVector.from_binary_message(message, self.layer_tables)
+        except KeyError as e:
+            self.__layer_table_requests.add(sender)
+            raise ValueError(
+                f"Unknown layer table in the similarity vector from {sender}."
+            ) from e
+        if vector.request_layer_table:
+            self.__layer_table_sent.discard(sender)
+        return vector
+
+    def forget_neighbour(self, neighbour: JID) -> None:
+        """
+        Sends the layer table again with the next vector to `neighbour`, e.g. after it restarts.
+        """
+        self.__layer_table_sent.discard(neighbour.bare())
+        self.__layer_table_requests.discard(neighbour.bare())
@@ -1,30 +1,122 @@
+import base64
 import copy
+import hashlib
 import json
-from datetime import datetime, timezone
-from typing import Any, Optional, OrderedDict
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, OrderedDict, Sequence
 
+import numpy as np
 from aioxmpp import JID
 from spade.message import Message
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class LayerTable:
+    """
+    Fixed order of the layer names of a model. The binary similarity vectors only send the digest of
+    the table and one float32 value per layer, so the table is sent once to each neighbour and the
+    agents with the same model architecture already share it.
+    """
+
+    def __init__(self, names: Sequence[str]) -> None:
+        self.names: tuple[str, ...] = tuple(names)
+        self.digest: bytes = LayerTable.get_digest(self.names)
+
+    @staticmethod
+    def get_digest(names: Sequence[str]) -> bytes:
+        return hashlib.blake2b(
+            json.dumps(list(names)).encode("utf-8"), digest_size=8
+        ).digest()
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(list(self.names)).encode("utf-8")
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview) -> "LayerTable":
+        return LayerTable(json.loads(bytes(data).decode("utf-8")))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
 
 class SimilarityVector:
+    # table digest, sent time (microseconds since the epoch), algorithm iteration (-1 is None),
+    # request reply, flags and number of float32 values
+    BINARY_HEADER = struct.Struct("<8sqq?BI")
+    # The layer names follow the values
+    FLAG_LAYER_TABLE = 1
+    # The sender does not know the layer table of the receiver
+    FLAG_REQUEST_LAYER_TABLE = 2
+
     def __init__(
         self,
-        vector: OrderedDict[
-            str, float
-        ],  # str is the name of the layer and float is the similarity coefficient
+        vector: Optional[
+            OrderedDict[str, float]
+        ] = None,  # str is the name of the layer and float is the similarity coefficient
         owner: Optional[JID] = None,
         request_reply: Optional[bool] = False,
         algorithm_iteration: Optional[int] = None,
         sent_time_z: Optional[datetime] = None,
         received_time_z: Optional[datetime] = None,
+        values: Optional[np.ndarray] = None,
+        layer_table: Optional[LayerTable] = None,
     ):
-        self.vector = vector
+        if vector is None and (values is None or layer_table is None):
+            raise ValueError(
+                "The similarity vector needs the vector or the values with their layer table."
+            )
+        self._vector = vector
+        # Values in the order of the layer table, set when the vector is received in binary
+        self.values = values
+        self.layer_table = layer_table
         self.owner = owner
         self.request_reply: bool = request_reply if request_reply is not None else False
         self.algorithm_iteration = algorithm_iteration
         self.sent_time_z = sent_time_z
         self.received_time_z = received_time_z
+        self.request_layer_table = False
+
+    @property
+    def vector(self) -> OrderedDict[str, float]:
+        if self._vector is None:
+            assert self.values is not None and self.layer_table is not None
+            self._vector = OrderedDict(
+                zip(self.layer_table.names, self.values.tolist())
+            )
+        return self._vector
+
+    @vector.setter
+    def vector(self, vector: OrderedDict[str, float]) -> None:
+        self._vector = vector
+        self.values = None
+        self.layer_table = None
+
+    def get_values(self, layer_table: LayerTable) -> np.ndarray:
+        """
+        Returns the coefficients in the order of `layer_table`.
+
+        Raises:
+            ValueError: If the vector has not the layers of the table.
+        """
+        if (
+            self.layer_table is not None
+            and self.layer_table.digest == layer_table.digest
+        ):
+            assert self.values is not None
+            return self.values
+        vector = self.vector
+        try:
+            return np.fromiter(
+                (vector[name] for name in layer_table.names),
+                dtype=np.float64,
+                count=len(layer_table),
+            )
+        except KeyError as e:
+            raise ValueError(
+                f"The similarity vector has not the layer {e} of the layer table."
+            ) from e
 
     def to_message(self, message: Optional[Message] = None) -> Message:
         msg = Message() if message is None else copy.deepcopy(message)
@@ -42,6 +134,110 @@ class SimilarityVector:
         msg.body = json.dumps(content)
         return msg
 
+    def to_binary_message(
+        self,
+        layer_table: LayerTable,
+        include_layer_table: bool = False,
+        request_layer_table: bool = False,
+        message: Optional[Message] = None,
+    ) -> Message:
+        """
+        Builds a message with the coefficients packed as float32 in the order of `layer_table`.
+
+        Args:
+            layer_table (LayerTable): The order of the coefficients.
+            include_layer_table (bool, optional): Sends the layer names, the first time. Defaults to False.
+            request_layer_table (bool, optional): Asks the receiver to send its layer table. Defaults to False.
+            message (Optional[Message], optional): The base message. Defaults to None.
+
+        Returns:
+            Message: The message with the base64 body.
+        """
+        msg = Message() if message is None else copy.deepcopy(message)
+        values = self.get_values(layer_table).astype("<f4", copy=False)
+        sent_time_z = (
+            datetime.now(tz=timezone.utc)
+            if self.sent_time_z is None
+            else self.sent_time_z
+        )
+        flags = (SimilarityVector.FLAG_LAYER_TABLE if include_layer_table else 0) | (
+            SimilarityVector.FLAG_REQUEST_LAYER_TABLE if request_layer_table else 0
+        )
+        header = SimilarityVector.BINARY_HEADER.pack(
+            layer_table.digest,
+            (sent_time_z - _EPOCH) // timedelta(microseconds=1),
+            -1 if self.algorithm_iteration is None else self.algorithm_iteration,
+            self.request_reply,
+            flags,
+            len(values),
+        )
+        table = layer_table.to_bytes() if include_layer_table else b""
+        msg.body = base64.b64encode(header + values.tobytes() + table).decode("ascii")
+        return msg
+
+    @staticmethod
+    def is_binary_message(message: Message) -> bool:
+        # The JSON bodies start with "{", that is not a base64 character
+        return not message.body.startswith("{")
+
+    @staticmethod
+    def from_binary_message(
+        message: Message, layer_tables: dict[bytes, LayerTable]
+    ) -> "SimilarityVector":
+        """
+        Decodes a message built by `to_binary_message`. The values are a read-only NumPy view of the
+        decoded body, and the layer table sent with the message is added to `layer_tables`.
+
+        Args:
+            message (Message): The received message.
+            layer_tables (dict[bytes, LayerTable]): The known layer tables by digest.
+
+        Raises:
+            KeyError: If the layer table of the vector is not known.
+            ValueError: If the body is malformed.
+
+        Returns:
+            SimilarityVector: The received vector.
+        """
+        data = base64.b64decode(message.body)
+        header = SimilarityVector.BINARY_HEADER
+        if len(data) < header.size:
+            raise ValueError(
+                f"The similarity vector is truncated: {len(data)} bytes received."
+            )
+        digest, sent_us, iteration, request_reply, flags, count = header.unpack_from(
+            data
+        )
+        end = header.size + 4 * count
+        if len(data) < end:
+            raise ValueError(
+                f"The similarity vector is truncated: {len(data)} bytes of {end}."
+            )
+        if flags & SimilarityVector.FLAG_LAYER_TABLE:
+            table = LayerTable.from_bytes(memoryview(data)[end:])
+            if table.digest != digest:
+                raise ValueError("The layer table does not match its digest.")
+            layer_table = layer_tables.setdefault(digest, table)
+        else:
+            layer_table = layer_tables[digest]
+        if len(layer_table) != count:
+            raise ValueError(
+                f"The similarity vector has {count} values and its layer table {len(layer_table)} layers."
+            )
+        vector = SimilarityVector(
+            values=np.frombuffer(data, dtype="<f4", count=count, offset=header.size),
+            layer_table=layer_table,
+            owner=message.sender,
+            request_reply=request_reply,
+            algorithm_iteration=None if iteration < 0 else iteration,
+            sent_time_z=_EPOCH + timedelta(microseconds=sent_us),
+            received_time_z=datetime.now(tz=timezone.utc),
+        )
+        vector.request_layer_table = bool(
+            flags & SimilarityVector.FLAG_REQUEST_LAYER_TABLE
+        )
+        return vector
+
     @staticmethod
     def from_message(message: Message) -> "SimilarityVector":
         content: dict[str, Any] = json.loads(message.body)
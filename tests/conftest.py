@@ -0,0 +1,61 @@
+import asyncio
+from typing import Callable, Iterable
+
+import pytest
+from spade.message import Message
+
+from macofl.agent.premiofl.acol import AcolAgent
+from macofl.datatypes.consensus_manager import ConsensusManager
+from macofl.similarity.similarity_manager import SimilarityManager
+
+from .test_nn_model import build_linear_model_manager
+
+
+class RecordingAcolAgent(AcolAgent):
+    """AcolAgent that records the messages instead of sending them."""
+
+    def __init__(self, **kwargs) -> None:
+        model_manager = build_linear_model_manager()
+        super().__init__(
+            jid="a0@localhost",
+            password="123",
+            max_message_size=250_000,
+            consensus_manager=ConsensusManager(
+                model_manager=model_manager,
+                max_order=2,
+                max_seconds_to_accept_consensus=60,
+            ),
+            model_manager=model_manager,
+            similarity_manager=SimilarityManager(model_manager=model_manager),
+            **kwargs,
+        )
+        self.bodies: dict[str, str] = {}
+        self.pieces: dict[str, list[str]] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_stream(
+        self,
+        message: Message,
+        length: int,
+        pieces: Iterable[str],
+        behaviour=None,
+    ) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        if str(message.to) == "a3@localhost":
+            self.in_flight -= 1
+            raise RuntimeError("Neighbour unreachable")
+        self.pieces[str(message.to)] = list(pieces)
+        self.bodies[str(message.to)] = "".join(self.pieces[str(message.to)])
+        self.in_flight -= 1
+
+
+@pytest.fixture
+def recording_agent() -> Callable[..., RecordingAcolAgent]:
+    """
+    Builds `RecordingAcolAgent`s, the keyword arguments are passed to `AcolAgent`. The agent is a0 and the
+    sends to a3 fail.
+    """
+    return RecordingAcolAgent
@@ -1,9 +1,17 @@
+import asyncio
 import copy
+import time
+from datetime import datetime, timedelta, timezone
+from typing import OrderedDict
 
 import torch
+from aioxmpp import JID
 
+from macofl.datatypes.consensus import Consensus
 from macofl.datatypes.consensus_manager import ConsensusManager
 
+from .test_nn_model import build_linear_model_manager
+
 
 def test_consensus_update_tensors():
     max_order = 2
@@ -111,3 +119,141 @@ def test_consensus_update_layers():
     assert torch.allclose(
         freeze_model["weight"], full_model["weight"]
     ), "The initial model has been modified during consensus process"
+
+
+def test_wait_receive_consensus_wakes_up_on_response():
+    model_manager = build_linear_model_manager()
+    manager = ConsensusManager(
+        model_manager=model_manager, max_order=2, max_seconds_to_accept_consensus=60
+    )
+    neighbour = JID.fromstr("neighbour@localhost")
+    layers = model_manager.get_layers(["weight"])
+    manager.waiting_responses[neighbour] = ["weight"]
+
+    async def run() -> tuple[bool, float]:
+        loop = asyncio.get_running_loop()
+        loop.call_later(
+            0.05,
+            manager.add_consensus,
+            Consensus(layers=layers, sender=neighbour),
+            None,
+        )
+        start = time.perf_counter()
+        received = await manager.wait_receive_consensus(timeout=10)
+        return received, time.perf_counter() - start
+
+    received, seconds = asyncio.run(run())
+    assert received
+    assert seconds < 1
+    assert manager.received_consensus.qsize() == 1
+
+
+def test_wait_receive_consensus_timeout():
+    manager = ConsensusManager(
+        model_manager=build_linear_model_manager(),
+        max_order=2,
+        max_seconds_to_accept_consensus=60,
+    )
+    manager.waiting_responses[JID.fromstr("neighbour@localhost")] = ["weight"]
+
+    start = time.perf_counter()
+    received = asyncio.run(manager.wait_receive_consensus(timeout=0.2))
+    seconds = time.perf_counter() - start
+
+    assert not received
+    assert 0.2 <= seconds < 1
+
+
+def test_apply_all_consensus_batch_matches_sequential():
+    model_manager = build_linear_model_manager()
+    manager = ConsensusManager(
+        model_manager=model_manager, max_order=4, max_seconds_to_accept_consensus=60
+    )
+    expected = copy.deepcopy(model_manager.model.state_dict())
+    neighbours = [build_linear_model_manager(seed=seed) for seed in (1, 2, 3)]
+    for i, neighbour in enumerate(neighbours):
+        layers = neighbour.get_layers(["weight", "bias"] if i != 1 else ["weight"])
+        manager.received_consensus.put(
+            Consensus(
+                layers=copy.deepcopy(layers), sender=JID.fromstr(f"n{i}@localhost")
+            )
+        )
+        expected = ConsensusManager.apply_consensus_to_layers(
+            full_model=expected, layers=layers, max_order=4
+        )
+    weight_ptr = model_manager.model.weight.data_ptr()
+
+    consensuated = manager.apply_all_consensus()
+
+    assert len(consensuated) == 3
+    assert manager.received_consensus.qsize() == 0
+    assert all(ct.processed_end_time_z is not None for ct in consensuated)
+    assert model_manager.model.weight.data_ptr() == weight_ptr
+    for key, tensor in model_manager.model.state_dict().items():
+        assert torch.equal(tensor, expected[key]), f"Layer '{key}' does not match"
+
+
+def test_apply_all_consensus_by_staleness():
+    model_manager = build_linear_model_manager()
+    manager = ConsensusManager(
+        model_manager=model_manager, max_order=2, max_seconds_to_accept_consensus=60
+    )
+    assert ConsensusManager.get_staleness_weight(0, half_life_seconds=10) == 1
+    assert ConsensusManager.get_staleness_weight(10, half_life_seconds=10) == 0.5
+    assert ConsensusManager.get_staleness_weight(-1, half_life_seconds=10) == 1
+
+    now = datetime.now(tz=timezone.utc)
+    bias = model_manager.model.bias.detach().clone()
+    neighbour_bias = torch.zeros_like(bias)
+    for i, seconds in enumerate((10, 100)):
+        manager.received_consensus.put(
+            Consensus(
+                layers=OrderedDict([("bias", neighbour_bias.clone())]),
+                sender=JID.fromstr(f"n{i}@localhost"),
+                sent_time_z=now - timedelta(seconds=seconds),
+            )
+        )
+
+    applied, discarded = manager.apply_all_consensus_by_staleness(
+        max_staleness_seconds=60, half_life_seconds=10
+    )
+
+    assert [ct.sender.localpart for ct in applied] == ["n0"]
+    assert [ct.sender.localpart for ct in discarded] == ["n1"]
+    assert manager.received_consensus.qsize() == 0
+    # About 10 seconds old: half of the step of a fresh consensus
+    epsilon = 1 / 2 - manager.epsilon_margin
+    step = 0.5 * (1 - epsilon)
+    assert torch.allclose(
+        model_manager.model.bias, bias + step * (neighbour_bias - bias), atol=1e-4
+    )
+
+
+def test_apply_consensus_batch_with_unit_weights_matches_unweighted():
+    model_managers = [build_linear_model_manager() for _ in range(2)]
+    neighbour = build_linear_model_manager(seed=1)
+    for weights in (None, [1.0]):
+        manager = ConsensusManager(
+            model_manager=model_managers[0 if weights is None else 1],
+            max_order=3,
+            max_seconds_to_accept_consensus=60,
+        )
+        manager.apply_consensus_batch(
+            [Consensus(layers=copy.deepcopy(neighbour.get_layers(["weight"])))],
+            weights=weights,
+        )
+    assert torch.equal(model_managers[0].model.weight, model_managers[1].model.weight)
+
+
+def test_apply_consensus_weights_integer_buffers():
+    local = torch.tensor([100, 0])
+    ConsensusManager.apply_consensus_to_tensor_in_place(
+        tensor=local,
+        neighbour_tensors=[torch.tensor([0, 100])],
+        max_order=2,
+        epsilon_margin=0.0,
+        weights=[0.5],
+    )
+    # Half of the unweighted step of 50
+    assert local.tolist() == [75, 25]
+    assert local.dtype == torch.int64
@@ -0,0 +1,78 @@
+import pickle
+from pathlib import Path
+
+import numpy as np
+import torch
+from torchvision import transforms
+
+from macofl.dataset.dataloader_generator import BaseDataLoaderGenerator
+from macofl.dataset.store import DatasetStore, SharedVisionDataset
+from macofl.datatypes.data import IidDatasetSettings
+
+
+class FakeVisionDataset:
+    instances = 0
+
+    def __init__(self, root, train=True, transform=None, download=False) -> None:
+        FakeVisionDataset.instances += 1
+        samples = 100 if train else 20
+        rng = np.random.default_rng(0 if train else 1)
+        self.data = rng.integers(0, 256, (samples, 8, 8, 3), dtype=np.uint8)
+        self.targets = [i % 4 for i in range(samples)]
+        self.classes = ["a", "b", "c", "d"]
+
+
+def test_dataset_loaded_once_and_shared(tmp_path: Path) -> None:
+    DatasetStore.clear()
+    FakeVisionDataset.instances = 0
+    datasets = [
+        DatasetStore.get_dataset(
+            dataset_cls=FakeVisionDataset,
+            root=tmp_path,
+            train=True,
+            transform=transforms.ToTensor(),
+        )
+        for _ in range(5)
+    ]
+    assert FakeVisionDataset.instances == 1
+    assert all(isinstance(d, SharedVisionDataset) for d in datasets)
+    assert all(d.data is datasets[0].data for d in datasets)  # type: ignore
+    assert isinstance(datasets[0].data, np.memmap)  # type: ignore
+    assert not datasets[0].data.flags.writeable  # type: ignore
+
+    image, target = datasets[0][3]
+    expected = FakeVisionDataset(tmp_path).data[3]
+    assert target == 3
+    assert torch.equal(image, transforms.ToTensor()(expected))
+
+    # A new process only memory-maps the file saved by the first load
+    DatasetStore.clear()
+    DatasetStore.get_dataset(dataset_cls=FakeVisionDataset, root=tmp_path, train=True)
+    assert FakeVisionDataset.instances == 2  # the one built for `expected`
+
+
+def test_shared_dataset_pickles_by_path(tmp_path: Path) -> None:
+    DatasetStore.clear()
+    dataset = DatasetStore.get_dataset(
+        dataset_cls=FakeVisionDataset, root=tmp_path, train=True
+    )
+    serialized = pickle.dumps(dataset)
+    assert len(serialized) < 100 * 8 * 8 * 3
+    restored = pickle.loads(serialized)
+    assert np.array_equal(restored.data, dataset.data)  # type: ignore
+    assert restored.targets == dataset.targets  # type: ignore
+
+
+def test_generator_uses_shared_dataset(tmp_path: Path) -> None:
+    DatasetStore.clear()
+    FakeVisionDataset.instances = 0
+    generator = BaseDataLoaderGenerator(
+        dataset_cls=FakeVisionDataset, data_dir=tmp_path, batch_size=10, train_size=0.8
+    )
+    for _ in range(3):
+        dataloaders = generator.get_dataloaders(IidDatasetSettings(seed=42))
+        assert len(dataloaders.train.dataset) == 80
+        assert len(dataloaders.test.dataset) == 20
+    assert FakeVisionDataset.instances == 2
+    images, _ = next(iter(dataloaders.train))
+    assert images.shape == (10, 3, 8, 8)
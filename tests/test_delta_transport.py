@@ -0,0 +1,121 @@
+from collections import OrderedDict
+
+import pytest
+import torch
+from aioxmpp import JID
+
+from macofl.codec.delta import DeltaTransport
+from macofl.datatypes.consensus import Consensus
+
+A = JID.fromstr("a0@localhost")
+B = JID.fromstr("a1@localhost")
+
+
+def send(
+    sender: DeltaTransport,
+    receiver: DeltaTransport,
+    layers: OrderedDict[str, torch.Tensor],
+) -> tuple[OrderedDict[str, torch.Tensor], int]:
+    payload, transport = sender.encode(neighbour=B, layers=layers)
+    message = Consensus(layers=payload, sender=A, transport=transport).to_message()
+    received = Consensus.from_message(message)
+    reconstructed = receiver.decode(
+        sender=A, payload=received.layers, transport=received.transport
+    )
+    return reconstructed, len(message.body)
+
+
+def build_layers() -> OrderedDict[str, torch.Tensor]:
+    torch.manual_seed(0)
+    return OrderedDict(
+        {
+            "fc.weight": torch.randn((64, 128)),
+            "fc.bias": torch.randn((64,)),
+            "num_batches_tracked": torch.tensor(3),
+        }
+    )
+
+
+def test_sparse_delta_is_lossless_and_smaller() -> None:
+    sender, receiver = DeltaTransport(), DeltaTransport()
+    layers = build_layers()
+    reconstructed, full_size = send(sender, receiver, layers)
+    for name, tensor in layers.items():
+        assert torch.equal(reconstructed[name], tensor)
+
+    layers["fc.weight"][0, :10] += 0.5
+    reconstructed, delta_size = send(sender, receiver, layers)
+    assert delta_size * 10 < full_size
+    for name, tensor in layers.items():
+        assert torch.equal(reconstructed[name], tensor)
+
+
+def test_dense_changes_are_sent_full() -> None:
+    sender, receiver = DeltaTransport(), DeltaTransport()
+    layers = build_layers()
+    send(sender, receiver, layers)
+    layers["fc.weight"] += 1
+    payload, transport = sender.encode(neighbour=B, layers=layers)
+    assert transport["delta"]["fc.weight"][2] == "full"
+    assert "fc.weight" in payload
+
+
+def test_fp16_delta_does_not_drift() -> None:
+    sender, receiver = DeltaTransport(mode="fp16"), DeltaTransport(mode="fp16")
+    layers = build_layers()
+    send(sender, receiver, layers)
+    for _ in range(10):
+        layers["fc.weight"] += 1e-3 * torch.randn_like(layers["fc.weight"])
+        reconstructed, _ = send(sender, receiver, layers)
+        assert torch.allclose(
+            reconstructed["fc.weight"], layers["fc.weight"], atol=1e-5
+        )
+    assert torch.equal(
+        sender._sent[B]["fc.weight"][1], receiver._received[A]["fc.weight"][1]
+    )
+
+
+def test_layers_changed_while_streaming_do_not_drift() -> None:
+    sender, receiver = DeltaTransport(), DeltaTransport()
+    layers = build_layers()
+    payload, transport = sender.encode(neighbour=B, layers=layers)
+    # A consensus is applied in place before the payload is serialized
+    layers["fc.weight"] += 1
+    reconstructed = receiver.decode(sender=A, payload=payload, transport=transport)
+    assert not torch.equal(reconstructed["fc.weight"], layers["fc.weight"])
+
+    layers["fc.weight"][0, :10] += 0.5
+    reconstructed, _ = send(sender, receiver, layers)
+    assert torch.equal(reconstructed["fc.weight"], layers["fc.weight"])
+    assert torch.equal(
+        sender._sent[B]["fc.weight"][1], receiver._received[A]["fc.weight"][1]
+    )
+
+
+def test_version_mismatch_requests_full_resend() -> None:
+    sender, receiver = DeltaTransport(), DeltaTransport()
+    layers = build_layers()
+    send(sender, receiver, layers)
+
+    # A delta message is lost
+    layers["fc.bias"][0] += 1
+    sender.encode(neighbour=B, layers=layers)
+    layers["fc.bias"][1] += 1
+    reconstructed, _ = send(sender, receiver, layers)
+    assert "fc.bias" not in reconstructed
+    assert receiver.needs_resync(A)
+
+    # The reply of the receiver carries the resync flag
+    payload, transport = receiver.encode(neighbour=A, layers=build_layers())
+    assert transport["resync"]
+    sender.decode(sender=B, payload=payload, transport=transport)
+
+    payload, transport = sender.encode(neighbour=B, layers=layers)
+    assert all(kind == "full" for _, _, kind in transport["delta"].values())
+    reconstructed = receiver.decode(sender=A, payload=payload, transport=transport)
+    assert torch.equal(reconstructed["fc.bias"], layers["fc.bias"])
+
+
+def test_invalid_mode() -> None:
+    with pytest.raises(ValueError):
+        DeltaTransport(mode="int4")
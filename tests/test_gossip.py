@@ -0,0 +1,38 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import OrderedDict
+
+import torch
+from aioxmpp import JID
+from spade.message import Message
+
+from macofl.behaviour.premiofl.gossip import GossipFsmBehaviour
+from macofl.datatypes.consensus import Consensus
+
+
+def test_gossip_state_pushes_layers_without_waiting(recording_agent) -> None:
+    agent = recording_agent(gossip_max_staleness_seconds=60)
+    assert isinstance(agent.fsm_behaviour, GossipFsmBehaviour)
+    state = agent.fsm_behaviour.gossip_state
+    state.agent = agent
+    neighbour = JID.fromstr("a1@localhost")
+    agent.select_neighbours = lambda: [neighbour]  # type: ignore[method-assign]
+    weight = agent.model_manager.model.weight.detach().clone()
+    agent.consensus_manager.add_consensus(
+        Consensus(
+            layers=OrderedDict([("weight", torch.zeros_like(weight))]),
+            sender=neighbour,
+            sent_time_z=datetime.now(tz=timezone.utc),
+        ),
+        thread=None,
+    )
+
+    asyncio.run(asyncio.wait_for(state.run(), timeout=5))
+
+    sent = Consensus.from_message(Message(body=agent.bodies["a1@localhost"]))
+    assert not sent.request_reply
+    assert torch.equal(sent.layers["weight"], weight)
+    # The layers that had arrived are merged before training again
+    assert agent.consensus_manager.received_consensus.qsize() == 0
+    assert not torch.equal(agent.model_manager.model.weight, weight)
+    assert state.next_state == "train"
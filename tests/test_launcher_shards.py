@@ -0,0 +1,91 @@
+import logging
+import multiprocessing
+import pickle
+
+import pytest
+from aioxmpp import JID
+
+from macofl.agent.launcher import (
+    LauncherAgent,
+    LaunchSettings,
+    LogRecordForwarder,
+    setup_process_logging,
+)
+
+
+def log_from_process(log_queue) -> None:
+    setup_process_logging(
+        log_queue=log_queue, log_levels={"rf.test.shards": logging.INFO}
+    )
+    logger = logging.getLogger("rf.test.shards")
+    logger.debug("filtered")
+    logger.info("hello from the agent process")
+
+
+def test_shard_agents_balanced_and_ordered():
+    agents = [JID.fromstr(f"a{i}@localhost") for i in range(10)]
+    shards = LauncherAgent.shard_agents(agents, 3)
+    assert [len(s) for s in shards] == [4, 3, 3]
+    assert [j for s in shards for j in s] == agents
+
+
+def test_shard_agents_more_processes_than_agents():
+    agents = [JID.fromstr(f"a{i}@localhost") for i in range(2)]
+    assert LauncherAgent.shard_agents(agents, 4) == [[agents[0]], [agents[1]]]
+
+
+def test_launcher_rejects_invalid_num_processes():
+    with pytest.raises(ValueError):
+        LauncherAgent(
+            jid="launcher@localhost",
+            password="123",
+            max_message_size=250_000,
+            agents_coordinator=JID.fromstr("coordinator@localhost"),
+            agents_observers=[],
+            agents_to_launch=[],
+            num_processes=0,
+        )
+
+
+def test_launch_settings_are_picklable():
+    launcher = LauncherAgent(
+        jid="launcher@localhost",
+        password="123",
+        max_message_size=250_000,
+        agents_coordinator=JID.fromstr("coordinator@localhost"),
+        agents_observers=[JID.fromstr("o0@localhost")],
+        agents_to_launch=[JID.fromstr(f"a{i}@localhost") for i in range(12)],
+        compression="fp16",
+        num_processes=2,
+    )
+    settings = launcher.get_launch_settings()
+    launcher.training_executor.shutdown(wait=False)
+    assert pickle.loads(pickle.dumps(settings)) == settings
+    assert isinstance(settings, LaunchSettings)
+    assert settings.agents_to_launch[11] == "a11@localhost"
+
+
+def test_agent_process_logs_are_forwarded():
+    records: list[logging.LogRecord] = []
+
+    class ListHandler(logging.Handler):
+        def emit(self, record: logging.LogRecord) -> None:
+            records.append(record)
+
+    logger = logging.getLogger("rf.test.shards")
+    logger.setLevel(logging.INFO)
+    handler = ListHandler()
+    logger.addHandler(handler)
+    context = multiprocessing.get_context("spawn")
+    log_queue = context.Queue()
+    listener = logging.handlers.QueueListener(log_queue, LogRecordForwarder())
+    listener.start()
+    try:
+        process = context.Process(target=log_from_process, args=(log_queue,))
+        process.start()
+        process.join(60)
+    finally:
+        listener.stop()
+        logger.removeHandler(handler)
+    assert process.exitcode == 0
+    assert [r.getMessage() for r in records] == ["hello from the agent process"]
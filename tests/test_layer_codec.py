@@ -0,0 +1,143 @@
+import pickle
+from typing import OrderedDict
+
+import pytest
+import torch
+from torch import nn
+
+from macofl.codec import BinaryLayerCodec, LayerPayloadCache
+from macofl.codec.stream import Base64StreamDecoder, LayerStreamDecoder, iter_base64
+from macofl.datatypes import ModelManager
+
+
+def build_layers() -> OrderedDict[str, torch.Tensor]:
+    layers: OrderedDict[str, torch.Tensor] = OrderedDict()
+    layers["conv.weight"] = torch.randn((8, 3, 5, 5))
+    layers["conv.bias"] = torch.randn((8,))
+    layers["half"] = torch.randn((4, 4)).half()
+    layers["brain"] = torch.randn((3, 2)).bfloat16()
+    layers["double"] = torch.randn((5,), dtype=torch.float64)
+    layers["num_batches_tracked"] = torch.tensor(7)
+    layers["mask"] = torch.tensor([True, False, True])
+    layers["empty"] = torch.empty((0, 4))
+    return layers
+
+
+def test_binary_round_trip() -> None:
+    layers = build_layers()
+    decoded = BinaryLayerCodec.decode(BinaryLayerCodec.encode(layers))
+    assert list(decoded.keys()) == list(layers.keys())
+    for key, tensor in layers.items():
+        assert decoded[key].dtype == tensor.dtype
+        assert decoded[key].shape == tensor.shape
+        assert torch.equal(decoded[key], tensor), f"Layer '{key}' does not match"
+
+
+def test_decode_into_preallocated_tensors() -> None:
+    model = nn.Linear(10, 5)
+    other = nn.Linear(10, 5)
+    out = other.state_dict()
+    weight_ptr = out["weight"].data_ptr()
+
+    decoded = BinaryLayerCodec.decode(
+        BinaryLayerCodec.encode(model.state_dict()), out=out
+    )
+
+    assert decoded["weight"].data_ptr() == weight_ptr
+    assert torch.equal(other.weight, model.weight)
+    assert torch.equal(other.bias, model.bias)
+
+
+def test_decode_into_mismatched_tensor() -> None:
+    payload = BinaryLayerCodec.encode(nn.Linear(10, 5).state_dict())
+    with pytest.raises(ValueError):
+        BinaryLayerCodec.decode(payload, out=nn.Linear(10, 6).state_dict())
+
+
+def test_invalid_payloads() -> None:
+    payload = BinaryLayerCodec.encode(nn.Linear(10, 5).state_dict())
+    with pytest.raises(ValueError):
+        BinaryLayerCodec.decode(b"XXXX" + bytes(payload[4:]))
+    with pytest.raises(ValueError):
+        BinaryLayerCodec.decode(payload[:-4])
+    wrong_version = bytearray(payload)
+    wrong_version[4] = BinaryLayerCodec.VERSION + 1
+    with pytest.raises(ValueError):
+        BinaryLayerCodec.decode(wrong_version)
+
+
+def test_truncated_header() -> None:
+    payload = bytes(BinaryLayerCodec.encode(nn.Linear(10, 5).state_dict()))
+    for length in (20, 12, BinaryLayerCodec._PREAMBLE.size + 1):
+        with pytest.raises(ValueError):
+            BinaryLayerCodec.decode_header(payload[:length])
+        with pytest.raises(ValueError):
+            BinaryLayerCodec.decode(payload[:length])
+
+
+def test_export_smaller_than_pickle() -> None:
+    layers = nn.Linear(512, 256).state_dict()
+    exported = ModelManager.export_layers(layers)
+    assert len(exported) < len(pickle.dumps(layers)) * 4 / 3
+    reconstructed = ModelManager.import_layers(exported)
+    for key, tensor in layers.items():
+        assert torch.equal(reconstructed[key], tensor)
+
+
+def test_iter_encode_matches_encode() -> None:
+    layers = build_layers()
+    chunks = list(BinaryLayerCodec.iter_encode(layers, chunk_size=7))
+    payload = b"".join(bytes(chunk) for chunk in chunks)
+    assert payload == bytes(BinaryLayerCodec.encode(layers))
+    assert len(payload) == BinaryLayerCodec.encoded_size(layers)
+    assert max(len(chunk) for chunk in chunks[1:]) <= 7
+
+
+def test_stream_decoder_with_any_chunk_size() -> None:
+    layers = build_layers()
+    payload = bytes(BinaryLayerCodec.encode(layers))
+    for size in [1, 5, 64, len(payload)]:
+        decoder = LayerStreamDecoder()
+        for start in range(0, len(payload), size):
+            decoder.feed(payload[start : start + size])
+        decoded = decoder.finish()
+        assert list(decoded.keys()) == list(layers.keys())
+        for key, tensor in layers.items():
+            assert decoded[key].dtype == tensor.dtype
+            assert torch.equal(decoded[key], tensor), f"Layer '{key}' does not match"
+
+    decoder = LayerStreamDecoder()
+    decoder.feed(payload[:-1])
+    with pytest.raises(ValueError):
+        decoder.finish()
+    with pytest.raises(ValueError):
+        decoder.feed(payload[-1:] + b"\x00")
+
+
+def test_base64_stream_round_trip() -> None:
+    layers = build_layers()
+    pieces = list(iter_base64(BinaryLayerCodec.iter_encode(layers, chunk_size=10)))
+    content = "".join(pieces)
+    assert content == BinaryLayerCodec.encode_base64(layers)
+
+    decoder = Base64StreamDecoder()
+    payload = b"".join(
+        decoder.feed(content[i : i + 7]) for i in range(0, len(content), 7)
+    )
+    decoder.finish()
+    assert payload == bytes(BinaryLayerCodec.encode(layers))
+
+
+def test_payload_cache_discards_older_versions() -> None:
+    cache = LayerPayloadCache(max_entries=2)
+    cache.put(LayerPayloadCache.get_key(1, ("a",), "none"), ("A1", {}))
+    cache.put(LayerPayloadCache.get_key(1, ("b",), "none"), ("B1", {}))
+    assert cache.get(LayerPayloadCache.get_key(1, ("a",), "none")) == ("A1", {})
+    cache.put(LayerPayloadCache.get_key(1, ("c",), "none"), ("C1", {}))
+    # The least recently used layer set is evicted
+    assert cache.get(LayerPayloadCache.get_key(1, ("b",), "none")) is None
+    assert cache.get(LayerPayloadCache.get_key(1, ("a",), "fp16")) is None
+
+    assert cache.get(LayerPayloadCache.get_key(2, ("a",), "none")) is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 3)
@@ -0,0 +1,119 @@
+from collections import OrderedDict
+
+import pytest
+import torch
+from aioxmpp import JID
+
+from macofl.codec.compression import LayerCompressor, TopKCompressor
+from macofl.datatypes.consensus import Consensus
+
+
+def build_layers() -> OrderedDict[str, torch.Tensor]:
+    torch.manual_seed(0)
+    return OrderedDict(
+        {
+            "fc1.weight": torch.randn((256, 512)),
+            "fc1.bias": torch.randn((256,)),
+            "constant": torch.full((4,), 0.3),
+            "num_batches_tracked": torch.tensor(3),
+        }
+    )
+
+
+def transmit(
+    layers: OrderedDict[str, torch.Tensor], compressor: LayerCompressor
+) -> tuple[Consensus, int]:
+    message = Consensus(layers=layers).to_message(
+        compressor=compressor, neighbour=JID.fromstr("a1@localhost")
+    )
+    return Consensus.from_message(message), len(message.body)
+
+
+@pytest.mark.parametrize(
+    "codec, ratio, atol",
+    [
+        ("none", 1.0, 0.0),
+        ("fp16", 0.55, 5e-3),
+        ("bf16", 0.55, 5e-2),
+        ("int8", 0.3, 5e-2),
+    ],
+)
+def test_compression_round_trip(codec: str, ratio: float, atol: float) -> None:
+    layers = build_layers()
+    _, full_size = transmit(layers, LayerCompressor.from_name("none"))
+    received, size = transmit(layers, LayerCompressor.from_name(codec))
+
+    assert received.codec == codec
+    assert size <= full_size * ratio
+    assert list(received.layers.keys()) == list(layers.keys())
+    for name, tensor in layers.items():
+        assert received.layers[name].dtype == tensor.dtype
+        assert received.layers[name].shape == tensor.shape
+        assert torch.allclose(received.layers[name].float(), tensor.float(), atol=atol)
+    assert torch.equal(received.layers["num_batches_tracked"], torch.tensor(3))
+
+
+def test_topk_error_feedback() -> None:
+    sender = JID.fromstr("a0@localhost")
+    neighbour = JID.fromstr("a1@localhost")
+    compressor = TopKCompressor(ratio=0.5)
+    decoder = TopKCompressor()
+
+    def send(weights: list[float]) -> torch.Tensor:
+        message = Consensus(
+            layers=OrderedDict({"weight": torch.tensor(weights)})
+        ).to_message(compressor=compressor, neighbour=neighbour)
+        received = Consensus.from_message(message)
+        layers = decoder.decode(
+            sender=sender,
+            payload=received.layers,
+            info=received.transport["compression"],
+        )
+        return layers["weight"]
+
+    # The first message is complete
+    assert torch.equal(send([4.0, -3.0, 2.0, 1.0]), torch.tensor([4.0, -3.0, 2.0, 1.0]))
+    # Only the 2 largest changes are sent, the rest stays in the next difference
+    assert torch.equal(send([5.0, -3.0, 0.0, 1.5]), torch.tensor([5.0, -3.0, 0.0, 1.0]))
+    assert torch.equal(send([5.0, -3.0, 0.0, 1.5]), torch.tensor([5.0, -3.0, 0.0, 1.5]))
+
+
+def test_topk_layers_changed_while_streaming_do_not_drift() -> None:
+    sender = JID.fromstr("a0@localhost")
+    neighbour = JID.fromstr("a1@localhost")
+    compressor = TopKCompressor(ratio=0.5)
+    decoder = TopKCompressor()
+    layers = OrderedDict({"weight": torch.tensor([4.0, -3.0, 2.0, 1.0])})
+    payload, info = compressor.compress(layers, neighbour=neighbour)
+    # A consensus is applied in place before the payload is serialized
+    layers["weight"] += 1
+    decoded = decoder.decode(sender=sender, payload=payload, info=info)
+    assert torch.equal(decoded["weight"], torch.tensor([4.0, -3.0, 2.0, 1.0]))
+    for _ in range(2):
+        payload, info = compressor.compress(layers, neighbour=neighbour)
+        decoded = decoder.decode(sender=sender, payload=payload, info=info)
+    assert torch.equal(decoded["weight"], layers["weight"])
+
+
+def test_topk_resync() -> None:
+    sender = JID.fromstr("a0@localhost")
+    compressor = TopKCompressor(ratio=0.5)
+    decoder = TopKCompressor()
+    layers = OrderedDict({"weight": torch.tensor([4.0, -3.0, 2.0, 1.0])})
+    compressor.compress(layers, neighbour=JID.fromstr("a1@localhost"))
+
+    # The first message was lost, the difference can not be decoded
+    payload, info = compressor.compress(layers, neighbour=JID.fromstr("a1@localhost"))
+    assert decoder.decode(sender=sender, payload=payload, info=info) == OrderedDict()
+    assert decoder.pop_resync(sender)
+    assert not decoder.pop_resync(sender)
+
+    compressor.reset(JID.fromstr("a1@localhost"))
+    payload, info = compressor.compress(layers, neighbour=JID.fromstr("a1@localhost"))
+    decoded = decoder.decode(sender=sender, payload=payload, info=info)
+    assert torch.equal(decoded["weight"], layers["weight"])
+
+
+def test_unknown_codec() -> None:
+    with pytest.raises(ValueError):
+        LayerCompressor.from_name("zip")
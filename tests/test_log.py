@@ -1,5 +1,8 @@
+import logging
 import random
 import sys
+import time
+from pathlib import Path
 
 import spade
 from aioxmpp import JID
@@ -12,6 +15,9 @@ from macofl.log import (
     NnTrainLogManager,
     setup_loggers,
 )
+from macofl.log.csv import AsyncCsvFileHandler, CsvLogManager
+from macofl.log.general import RemoveUuid4Filter
+from macofl.log.preview import PayloadPreview
 
 
 def test_fill_logs():
@@ -70,3 +76,93 @@ def test_fill_logs():
         logger.log(current_round=100 + i, agent=sender, seconds=random.random() * 100)
     general_logger.info(f"Handlers: {logger.logger.handlers}")
     general_logger.info(f"Effective Level: {logger.logger.getEffectiveLevel()}")
+
+
+def test_async_csv_handler_flushes_in_blocks(tmp_path: Path) -> None:
+    path = tmp_path / "message.csv"
+    handler = AsyncCsvFileHandler(
+        path=path,
+        header=MessageLogManager.get_header(),
+        flush_rows=10,
+        flush_seconds=60,
+    )
+    handler.setFormatter(logging.Formatter("%(name)s,%(message)s"))
+    logger = logging.getLogger("rf.test_async_csv")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        for i in range(25):
+            logger.debug(f"{i},SEND")
+        deadline = time.monotonic() + 5
+        while len(path.read_text().splitlines()) < 21 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Only the complete blocks of 10 rows are written before the flush
+        assert len(path.read_text().splitlines()) == 21
+
+        CsvLogManager.flush_all()
+        lines = path.read_text().splitlines()
+        assert lines[0] == MessageLogManager.get_header()
+        assert lines[1:] == [f"rf.test_async_csv,{i},SEND" for i in range(25)]
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def test_async_csv_handler_flushes_on_time_and_close(tmp_path: Path) -> None:
+    path = tmp_path / "algorithm.csv"
+    handler = AsyncCsvFileHandler(
+        path=path, header="a,b", flush_rows=1000, flush_seconds=0.05
+    )
+    record = logging.LogRecord("rf.test", logging.DEBUG, "", 0, "1,2", None, None)
+    handler.emit(record)
+    deadline = time.monotonic() + 5
+    while len(path.read_text().splitlines()) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert path.read_text().splitlines() == ["a,b", "1,2"]
+
+    handler.emit(record)
+    handler.close()
+    assert path.read_text().splitlines() == ["a,b", "1,2", "1,2"]
+    assert handler not in AsyncCsvFileHandler.instances
+
+
+def test_payload_preview() -> None:
+    body = "a" * 1000
+    preview = str(PayloadPreview(body, max_chars=8))
+    assert preview.startswith("<1000 chars, crc32=")
+    assert preview.endswith("'aaaaaaaa'...")
+    assert str(PayloadPreview("short", max_chars=8)).endswith("'short'")
+    assert str(PayloadPreview(None)) == "<empty>"
+
+
+def test_lazy_debug_arguments() -> None:
+    class CountingPayload:
+        formatted = 0
+
+        def __str__(self) -> str:
+            CountingPayload.formatted += 1
+            return "payload"
+
+    general_logger = GeneralLogManager(extra_logger_name="lazy")
+    general_logger.logger.setLevel(logging.INFO)
+    try:
+        general_logger.debug("Message: %s", CountingPayload())
+        assert CountingPayload.formatted == 0
+        assert not general_logger.is_enabled_for(logging.DEBUG)
+    finally:
+        general_logger.logger.setLevel(logging.NOTSET)
+
+
+def test_remove_uuid4_filter_formats_arguments() -> None:
+    record = logging.LogRecord(
+        "rf.log.agent.a_1",
+        logging.DEBUG,
+        "",
+        0,
+        "Sent %s with thread %s",
+        ("layers", "1b4e28ba-2fa1-11d2-883f-0016d3cca427"),
+        None,
+    )
+    assert RemoveUuid4Filter().filter(record)
+    assert record.getMessage() == "Sent layers with thread "
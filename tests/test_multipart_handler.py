@@ -2,10 +2,12 @@ import math
 import random
 
 import torch
+from aioxmpp import JID
 from spade.message import Message
 
 from macofl.datatypes import ModelManager
-from macofl.message import MultipartHandler
+from macofl.datatypes.consensus import Consensus, ConsensusStreamDecoder
+from macofl.message import MultipartHandler, RfMessage
 
 from .test_nn_model import build_neural_network
 
@@ -90,3 +92,200 @@ def test_model_message_transmission() -> None:
         assert torch.allclose(
             model.initial_state[key], model_reconstruct[key]
         ), f"Reconstructed '{key}' tensor does not match the initial model"
+
+
+def test_rebuild_with_duplicated_parts(max_content_size: int = 10) -> None:
+    mh_sender = MultipartHandler()
+    mh_dest = MultipartHandler()
+
+    original_content = "".join([f"{i}|part#" for i in range(50)])
+    msg = Message(to="dest", sender="sender", body=original_content)
+    msgs = mh_sender.generate_multipart_messages(
+        content=original_content,
+        max_size=max_content_size + mh_sender.metadata_header_size,
+        message_base=msg,
+    )
+    msgs = [] if msgs is None else msgs
+
+    results = [mh_dest.rebuild_multipart(m) for m in msgs[:-1] + msgs[:-1]]
+    assert all(r is None for r in results)
+    assert mh_dest.any_multipart_waiting()
+
+    result = mh_dest.rebuild_multipart(msgs[-1])
+    assert result is not None and result.body == original_content
+    assert not mh_dest.any_multipart_waiting()
+
+
+def test_iter_multipart_messages(max_content_size: int = 10) -> None:
+    mh_sender = MultipartHandler()
+    max_size_with_header = max_content_size + mh_sender.metadata_header_size
+
+    small = Message(to="dest@localhost", sender="sender@localhost", body="small")
+    assert list(
+        mh_sender.iter_multipart_messages(
+            content=small.body, max_size=max_size_with_header, message_base=small
+        )
+    ) == [small]
+
+    original_content = "0123456789" * 10 + "0"
+    msg = Message(to="dest@localhost", sender="sender@localhost", body=original_content)
+    msg.thread = "th"
+    msg.metadata = {"rf.conversation": "layers"}
+    msgs = mh_sender.iter_multipart_messages(
+        content=original_content, max_size=max_size_with_header, message_base=msg
+    )
+    assert not isinstance(msgs, list)
+
+    parts = list(msgs)
+    assert len(parts) == 11
+    for part in parts:
+        assert part is not msg
+        assert part.to == msg.to and part.sender == msg.sender
+        assert part.thread == msg.thread
+        assert part.metadata == msg.metadata and part.metadata is not msg.metadata
+        assert len(part.body) <= max_size_with_header
+    assert msg.body == original_content
+
+
+def test_stream_send_and_decode(max_content_size: int = 50) -> None:
+    mh_sender = MultipartHandler()
+    mh_dest = MultipartHandler()
+    mh_dest.register_stream_decoder(
+        "layers", lambda message: ConsensusStreamDecoder(sender=message.sender)
+    )
+    max_size_with_header = max_content_size + mh_sender.metadata_header_size
+
+    layers = torch.nn.Conv2d(3, 4, 3).state_dict()
+    consensus = Consensus(
+        layers=layers,
+        sender=JID.fromstr("sender@localhost"),
+        request_reply=True,
+        transport={"delta": {}},
+    )
+    length, pieces = consensus.iter_body(chunk_size=30)
+    msg = Message(to="dest@localhost", sender="sender@localhost", thread="th")
+    msg.metadata = {"rf.conversation": "layers"}
+    msgs = list(
+        mh_sender.iter_multipart_messages_from_stream(
+            length=length,
+            pieces=pieces,
+            max_size=max_size_with_header,
+            message_base=msg,
+        )
+    )
+    assert len(msgs) == math.ceil(length / max_content_size)
+    assert all(len(m.body) <= max_size_with_header for m in msgs)
+
+    # Out of order parts wait until the previous parts arrive
+    msgs = msgs[1:] + msgs[:1]
+    results = [mh_dest.rebuild_multipart(m) for m in msgs]
+    assert all(r is None for r in results[:-1])
+    result = results[-1]
+    assert isinstance(result, RfMessage) and result.is_multipart_completed
+    assert result.body == "" and result.size == length
+    assert not mh_dest.any_multipart_waiting()
+
+    decoded = result.decoded
+    assert isinstance(decoded, Consensus)
+    assert decoded.sender == JID.fromstr("sender@localhost")
+    assert decoded.request_reply and decoded.transport == {"delta": {}}
+    for key, tensor in layers.items():
+        assert torch.equal(decoded.layers[key], tensor), f"Layer '{key}' does not match"
+
+
+def test_stream_send_without_decoder(max_content_size: int = 50) -> None:
+    mh_sender = MultipartHandler()
+    mh_dest = MultipartHandler()
+    max_size_with_header = max_content_size + mh_sender.metadata_header_size
+
+    consensus = Consensus(layers=torch.nn.Linear(10, 5).state_dict())
+    body = consensus.to_message().body
+    consensus.sent_time_z = Consensus.from_message(Message(body=body)).sent_time_z
+    length, pieces = consensus.iter_body()
+    msg = Message(to="dest@localhost", sender="sender@localhost")
+    result = None
+    for m in mh_sender.iter_multipart_messages_from_stream(
+        length=length, pieces=pieces, max_size=max_size_with_header, message_base=msg
+    ):
+        result = mh_dest.rebuild_multipart(m)
+    assert result is not None and result.body == body
+
+    small = Message(to="dest@localhost", sender="sender@localhost")
+    (single,) = mh_sender.iter_multipart_messages_from_stream(
+        length=5,
+        pieces=["sm", "all"],
+        max_size=max_size_with_header,
+        message_base=small,
+    )
+    assert single.body == "small" and not mh_sender.is_multipart(single)
+
+
+def build_parts(
+    mh_sender: MultipartHandler, sender: str, content: str, max_content_size: int = 10
+) -> list[Message]:
+    msg = Message(to="dest@localhost", sender=sender, body=content)
+    return list(
+        mh_sender.iter_multipart_messages(
+            content=content,
+            max_size=max_content_size + mh_sender.metadata_header_size,
+            message_base=msg,
+        )
+    )
+
+
+def test_ttl_eviction() -> None:
+    now = [0.0]
+    mh_sender = MultipartHandler()
+    mh_dest = MultipartHandler(ttl_seconds=10, clock=lambda: now[0])
+
+    old = build_parts(mh_sender, "a@localhost", "a" * 100)
+    new = build_parts(mh_sender, "b@localhost", "b" * 100)
+    assert mh_dest.rebuild_multipart(old[0]) is None
+    now[0] = 6.0
+    assert mh_dest.rebuild_multipart(new[0]) is None
+    assert mh_dest.stored_bytes == 20
+
+    now[0] = 12.0
+    assert mh_dest.evict_expired()[0].sender == JID.fromstr("a@localhost")
+    assert mh_dest.stored_bytes == 10
+    now[0] = 15.0
+    for part in new[1:]:
+        result = mh_dest.rebuild_multipart(part)
+    assert result is not None and result.body == "b" * 100
+
+    evictions = mh_dest.pop_evictions()
+    assert [(e.reason, e.received_parts, e.total_parts) for e in evictions] == [
+        ("ttl", 1, 10)
+    ]
+    assert mh_dest.pop_evictions() == []
+    assert mh_dest.evicted_transfers == 1 and mh_dest.evicted_bytes == 10
+    assert mh_dest.completed_transfers == 1
+    assert mh_dest.stored_bytes == 0 and not mh_dest.any_multipart_waiting()
+
+
+def test_memory_cap_evicts_least_recently_updated() -> None:
+    mh_sender = MultipartHandler()
+    mh_dest = MultipartHandler(max_bytes=35, ttl_seconds=None)
+
+    first = build_parts(mh_sender, "a@localhost", "a" * 100)
+    second = build_parts(mh_sender, "b@localhost", "b" * 100)
+    mh_dest.rebuild_multipart(first[0])
+    mh_dest.rebuild_multipart(second[0])
+    mh_dest.rebuild_multipart(first[1])
+    mh_dest.rebuild_multipart(second[1])
+    assert mh_dest.stored_bytes == 40 - 20
+
+    (eviction,) = mh_dest.pop_evictions()
+    assert eviction.reason == "memory" and eviction.sender == JID.fromstr("a@localhost")
+    assert mh_dest.stored_bytes <= 35
+
+
+def test_forget_unavailable_sender() -> None:
+    mh_sender = MultipartHandler()
+    mh_dest = MultipartHandler()
+    mh_dest.rebuild_multipart(build_parts(mh_sender, "a@localhost/res", "a" * 100)[0])
+    mh_dest.rebuild_multipart(build_parts(mh_sender, "b@localhost", "b" * 100)[0])
+
+    evictions = mh_dest.forget_sender(JID.fromstr("a@localhost"))
+    assert [e.reason for e in evictions] == ["unavailable"]
+    assert mh_dest.any_multipart_waiting() and mh_dest.stored_bytes == 10
@@ -2,9 +2,11 @@ import numpy as np
 import torch
 from torch import nn
 from torch.optim import Adam
+from torch.utils.data import DataLoader, TensorDataset
 
 from macofl.dataset.cifar import Cifar10DataLoaderGenerator
 from macofl.datatypes import ModelManager
+from macofl.datatypes.data import DataLoaders
 from macofl.datatypes.data import IidDatasetSettings, NonIidDirichletDatasetSettings
 from macofl.nn import ModelManagerFactory
 from macofl.nn.model.mlp import CifarMlp
@@ -26,6 +28,33 @@ def build_neural_network(seed: int = 42) -> ModelManager:
     )
 
 
+def build_linear_model_manager(
+    in_features: int = 10, out_classes: int = 3, samples: int = 64, seed: int = 42
+) -> ModelManager:
+    """Builds a small ModelManager with synthetic data that does not need to download datasets."""
+    torch.manual_seed(seed)
+    dataset = TensorDataset(
+        torch.randn((samples, in_features)),
+        torch.randint(0, out_classes, (samples,)),
+    )
+    dataloaders = DataLoaders(
+        train=DataLoader(dataset, batch_size=16, shuffle=True),
+        validation=DataLoader(dataset, batch_size=16),
+        test=DataLoader(dataset, batch_size=16),
+    )
+    model = nn.Linear(in_features, out_classes)
+    return ModelManager(
+        model=model,
+        criterion=nn.CrossEntropyLoss(),
+        optimizer=Adam(model.parameters(), lr=0.01),
+        batch_size=16,
+        training_epochs=2,
+        dataloaders=dataloaders,
+        seed=seed,
+        device="cpu",
+    )
+
+
 def test_neural_network() -> None:
     model = build_neural_network()
     training_metrics = model.train()
@@ -110,3 +139,40 @@ def test_training() -> None:
     metrics = model.train(epochs=epochs)
     for m in metrics:
         print(m.accuracy, m.loss)
+
+
+def test_cached_layers_view() -> None:
+    model_manager = build_linear_model_manager()
+    all_layers = model_manager.get_all_layers()
+    assert model_manager.get_all_layers() is all_layers
+    assert model_manager.get_layers(["weight"])["weight"] is all_layers["weight"]
+
+    version = model_manager.model_version
+    model_manager.train(epochs=1)
+    assert model_manager.model_version > version
+    assert model_manager.get_all_layers() is not all_layers
+
+    version = model_manager.model_version
+    model_manager.replace_all_layers(model_manager.initial_state)
+    assert model_manager.model_version > version
+    assert torch.equal(
+        model_manager.get_all_layers()["weight"],
+        model_manager.initial_state["weight"],
+    )
+
+
+def test_stable_layers_while_training() -> None:
+    model_manager = build_linear_model_manager()
+    assert model_manager.get_stable_layers() is model_manager.get_all_layers()
+    before = model_manager.model.weight.detach().clone()
+    version = model_manager.model_version
+
+    model_manager.freeze_stable_layers()
+    model_manager.train(epochs=1)
+    assert not torch.equal(model_manager.model.weight, before)
+    assert torch.equal(model_manager.get_stable_layers()["weight"], before)
+    assert model_manager.stable_version == version < model_manager.model_version
+
+    model_manager.release_stable_layers()
+    assert model_manager.get_stable_layers() is model_manager.get_all_layers()
+    assert model_manager.stable_version == model_manager.model_version
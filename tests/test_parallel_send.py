@@ -0,0 +1,112 @@
+import asyncio
+from typing import OrderedDict
+
+import pytest
+import torch
+from aioxmpp import JID
+from spade.message import Message
+
+from macofl.codec.compression import LayerCompressor
+from macofl.datatypes.consensus import Consensus
+from macofl.message.message import RfMessage
+
+
+@pytest.mark.parametrize("max_parallel_sends", [None, 2])
+def test_send_to_neighbours_concurrently(recording_agent, max_parallel_sends) -> None:
+    agent = recording_agent(max_parallel_sends=max_parallel_sends)
+    layers = agent.model_manager.get_all_layers()
+    neighbours = [JID.fromstr(f"a{i}@localhost") for i in range(1, 5)]
+    assignments = {n: layers for n in neighbours}
+
+    results = asyncio.run(
+        agent.send_local_layers_to_neighbours(
+            assignments=assignments, request_reply=True
+        )
+    )
+
+    assert [results[n] is None for n in neighbours] == [True, True, False, True]
+    assert isinstance(results[neighbours[2]], RuntimeError)
+    assert agent.max_in_flight == (4 if max_parallel_sends is None else 2)
+    # The same layers are encoded once through the payload cache and shared by all the neighbours
+    assert (agent.payload_cache.misses, agent.payload_cache.hits) == (1, 3)
+    encoded = [pieces[1] for pieces in agent.pieces.values()]
+    assert len(encoded) == 3 and all(e is encoded[0] for e in encoded)
+    bodies = list(agent.bodies.values())
+    decoded = Consensus.from_message(Message(body=bodies[0]))
+    assert decoded.request_reply
+    assert list(decoded.layers.keys()) == list(layers.keys())
+
+
+def test_stateful_encoding_is_not_shared(recording_agent) -> None:
+    agent = recording_agent(layer_compressor=LayerCompressor.from_name("topk"))
+    layers = agent.model_manager.get_all_layers()
+    neighbours = [JID.fromstr(f"a{i}@localhost") for i in (1, 2)]
+
+    asyncio.run(
+        agent.send_local_layers_to_neighbours(
+            assignments={n: layers for n in neighbours}, request_reply=False
+        )
+    )
+
+    bodies = list(agent.bodies.values())
+    assert len(bodies) == 2 and bodies[0] is not bodies[1]
+
+
+def test_payload_cache_reuses_encoded_layers(recording_agent) -> None:
+    agent = recording_agent(layer_compressor=LayerCompressor.from_name("fp16"))
+    layers = agent.model_manager.get_all_layers()
+    neighbours = [JID.fromstr(f"a{i}@localhost") for i in (1, 2)]
+
+    async def send_all() -> None:
+        for neighbour in neighbours:
+            await agent.send_local_layers(
+                neighbour=neighbour,
+                request_reply=False,
+                layers=agent.model_manager.get_all_layers(),
+            )
+
+    asyncio.run(send_all())
+    assert (agent.payload_cache.misses, agent.payload_cache.hits) == (1, 1)
+    first, second = (
+        Consensus.from_message(Message(body=agent.bodies[str(n)])) for n in neighbours
+    )
+    assert first.codec == second.codec == "fp16"
+    for name in layers:
+        assert torch.equal(first.layers[name], second.layers[name])
+
+    # A consensus or a training changes the model version
+    agent.model_manager.invalidate_layers()
+    asyncio.run(send_all())
+    assert (agent.payload_cache.misses, agent.payload_cache.hits) == (2, 2)
+    assert len(agent.payload_cache) == 1
+
+    # Copies of the layers are not the model tensors, so they are not cached
+    copies = agent.model_manager.get_layers(list(layers.keys()), deepcopy_layers=True)
+    assert agent.get_payload_cache_key(copies) is None
+
+
+def test_layer_receiver_keeps_the_batch_after_a_bad_message(recording_agent) -> None:
+    agent = recording_agent()
+    behaviour = agent.layer_receiver_behaviour
+    behaviour.agent = agent
+    layers = OrderedDict(
+        [("bias", torch.zeros_like(agent.model_manager.model.bias.detach()))]
+    )
+    good = Consensus(layers=layers, sender=JID.fromstr("a1@localhost")).to_message()
+    good.sender = "a1@localhost"
+    good.to = "a0@localhost"
+    bad = Consensus(layers=layers).to_message()
+    bad.sender = "a2@localhost"
+    bad.to = "a0@localhost"
+    # Without timestamp the consensus is rejected
+    bad.body = bad.body.replace('"sent_time_z"', '"no_time_z"')
+
+    async def receive_all(behaviour, timeout=0):
+        return [
+            RfMessage.from_message(m, is_multipart=False, is_multipart_completed=False)
+            for m in (bad, good)
+        ]
+
+    agent.receive_all = receive_all  # type: ignore[method-assign]
+    asyncio.run(behaviour.run())
+    assert agent.consensus_manager.received_consensus.qsize() == 1
@@ -0,0 +1,124 @@
+from pathlib import Path
+
+import numpy as np
+
+from macofl.dataset.partition import DirichletPartitionPlanner
+from macofl.utils.random import RandomUtils
+
+
+def sample_client_indices(
+    targets: np.ndarray, num_classes: int, num_clients: int, client_index: int
+) -> list[int]:
+    """Samples the indices of one client as the data loader generator did before the planner."""
+    class_indices = [np.where(targets == i)[0] for i in range(num_classes)]
+    client_data_indices: list[list] = [[] for _ in range(num_clients)]
+    for indices in class_indices:
+        proportions = np.random.dirichlet(np.repeat(0.1, num_clients))
+        proportions = (proportions * len(indices)).astype(int)
+        proportions[-1] = len(indices) - sum(proportions[:-1])
+        split_indices = np.split(indices, np.cumsum(proportions)[:-1])
+        client_data_indices[client_index].extend(split_indices[client_index])
+    np.random.shuffle(client_data_indices[client_index])
+    return [int(i) for i in client_data_indices[client_index]]
+
+
+def test_partition_matches_sampling_per_client(tmp_path: Path) -> None:
+    DirichletPartitionPlanner.clear()
+    targets = np.random.default_rng(0).integers(0, 10, 2000)
+    num_clients = 5
+    seen: list[int] = []
+    for client_index in range(num_clients):
+        RandomUtils.set_randomness(seed=42)
+        expected = sample_client_indices(targets, 10, num_clients, client_index)
+        RandomUtils.set_randomness(seed=42)
+        indices = DirichletPartitionPlanner.get_client_indices(
+            targets=targets,
+            num_classes=10,
+            num_clients=num_clients,
+            client_index=client_index,
+            alpha=0.1,
+            seed=42,
+            data_dir=tmp_path,
+        )
+        assert indices.tolist() == expected
+        seen.extend(expected)
+    assert sorted(seen) == list(range(len(targets)))
+
+
+def test_partition_is_saved_and_reused(tmp_path: Path) -> None:
+    DirichletPartitionPlanner.clear()
+    targets = np.random.default_rng(0).integers(0, 4, 500)
+    RandomUtils.set_randomness(seed=7)
+    first = DirichletPartitionPlanner.get_client_indices(
+        targets=targets,
+        num_classes=4,
+        num_clients=3,
+        client_index=1,
+        alpha=0.5,
+        seed=7,
+        data_dir=tmp_path,
+    )
+    path = DirichletPartitionPlanner.get_plan_path(
+        data_dir=tmp_path,
+        seed=7,
+        alpha=0.5,
+        num_clients=3,
+        targets_digest=DirichletPartitionPlanner.get_targets_digest(targets),
+    )
+    assert path.exists()
+
+    # Another process loads the plan from disk without sampling
+    DirichletPartitionPlanner.clear()
+    RandomUtils.set_randomness(seed=0)
+    second = DirichletPartitionPlanner.get_client_indices(
+        targets=targets,
+        num_classes=4,
+        num_clients=3,
+        client_index=1,
+        alpha=0.5,
+        seed=7,
+        data_dir=tmp_path,
+    )
+    assert np.array_equal(first, second)
+
+
+def test_partition_does_not_touch_the_global_generator(tmp_path: Path) -> None:
+    DirichletPartitionPlanner.clear()
+    targets = np.random.default_rng(0).integers(0, 4, 500)
+    for _ in range(2):
+        # The second call loads the cached plan, the global state is the same in both cases
+        DirichletPartitionPlanner.clear()
+        RandomUtils.set_randomness(seed=3)
+        DirichletPartitionPlanner.get_client_indices(
+            targets=targets,
+            num_classes=4,
+            num_clients=3,
+            client_index=0,
+            alpha=0.5,
+            seed=7,
+            data_dir=tmp_path,
+        )
+        assert np.random.random() == np.random.RandomState(3).random_sample()
+
+
+def test_partition_depends_on_the_targets(tmp_path: Path) -> None:
+    DirichletPartitionPlanner.clear()
+    first_targets = np.random.default_rng(0).integers(0, 4, 500)
+    second_targets = np.random.default_rng(1).integers(0, 4, 500)
+    for data_dir in (tmp_path, None):
+        # Both datasets have the same size, the second one must not reuse the first plan
+        DirichletPartitionPlanner.clear()
+        for targets in (first_targets, second_targets):
+            indices = DirichletPartitionPlanner.get_client_indices(
+                targets=targets,
+                num_classes=4,
+                num_clients=3,
+                client_index=0,
+                alpha=0.5,
+                seed=7,
+                data_dir=data_dir,
+            )
+            expected, offsets = DirichletPartitionPlanner.plan(
+                targets=targets, num_classes=4, num_clients=3, alpha=0.5, seed=7
+            )
+            assert np.array_equal(indices, expected[offsets[0] : offsets[1]])
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from aioxmpp import JID
+from spade.message import Message
+
+from macofl.datatypes.consensus import Consensus
+from macofl.message.message import RfMessage
+from macofl.similarity.function import EuclideanDistanceFunction
+from macofl.similarity.similarity_manager import SimilarityManager
+
+from .test_nn_model import build_linear_model_manager
+
+
+def test_piggyback_similarity_vector(recording_agent) -> None:
+    agent = recording_agent(piggyback_similarity=True)
+    agent.similarity_manager.function = EuclideanDistanceFunction()
+    receiver = SimilarityManager(model_manager=build_linear_model_manager())
+    neighbours = [JID.fromstr(f"a{i}@localhost") for i in (1, 2)]
+    assert agent.get_neighbours_without_similarity(neighbours) == neighbours
+
+    layers = agent.model_manager.get_all_layers()
+    asyncio.run(
+        agent.send_local_layers_to_neighbours(
+            assignments={n: layers for n in neighbours}, request_reply=True
+        )
+    )
+    consensus = Consensus.from_message(Message(body=agent.bodies["a1@localhost"]))
+    assert consensus.similarity is not None
+    vector = receiver.decode_vector(
+        Message(sender="a0@localhost", body=consensus.similarity)
+    )
+    expected = agent.similarity_manager.get_own_similarity_vector()
+    assert list(vector.vector.keys()) == list(expected.vector.keys())
+
+    # The vectors received with the layers avoid the request of the next iteration
+    agent.similarity_manager.add_similarity_vector(neighbours[0], vector, thread=None)
+    assert agent.get_neighbours_without_similarity(neighbours) == [neighbours[1]]
+
+
+def test_piggyback_keeps_the_newer_vector(recording_agent) -> None:
+    agent = recording_agent()
+    behaviour = agent.layer_receiver_behaviour
+    behaviour.agent = agent
+    sender = SimilarityManager(
+        model_manager=build_linear_model_manager(),
+        function=EuclideanDistanceFunction(),
+    )
+    neighbour = JID.fromstr("a1@localhost")
+    msg = RfMessage.from_message(
+        Message(sender=str(neighbour), to="a0@localhost"),
+        is_multipart=False,
+        is_multipart_completed=False,
+    )
+    now = datetime.now(tz=timezone.utc)
+
+    def encode(sent_time_z: datetime) -> str:
+        vector = sender.get_own_similarity_vector()
+        vector.sent_time_z = sent_time_z
+        return sender.encode_vector(vector, neighbour=JID.fromstr("a0@localhost")).body
+
+    behaviour.accept_similarity(msg=msg, similarity=encode(now))
+    # The reply of a request is newer than the vector attached to layers sent before it
+    behaviour.accept_similarity(msg=msg, similarity=encode(now - timedelta(seconds=5)))
+    assert agent.similarity_manager.get_vector(neighbour).sent_time_z == now
+    later = now + timedelta(seconds=5)
+    behaviour.accept_similarity(msg=msg, similarity=encode(later))
+    assert agent.similarity_manager.get_vector(neighbour).sent_time_z == later
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+from typing import OrderedDict
+
+import pytest
+import torch
+from aioxmpp import JID
+from spade.message import Message
+
+from macofl.behaviour.premiofl.train import TrainAndApplyConsensusState
+from macofl.datatypes.consensus import Consensus
+from macofl.message.message import RfMessage
+from macofl.nn.executor import TrainingExecutor
+
+
+def test_pipelined_training_serves_stable_layers(recording_agent) -> None:
+    agent = recording_agent(
+        pipelined_training=True, training_executor=TrainingExecutor(mode="thread")
+    )
+    state = TrainAndApplyConsensusState()
+    state.agent = agent
+    model_manager = agent.model_manager
+    model_manager.freeze_stable_layers()
+    stable = model_manager.get_stable_layers()
+    neighbour_layers = OrderedDict(
+        (name, torch.zeros_like(tensor)) for name, tensor in stable.items()
+    )
+    agent.consensus_manager.add_consensus(
+        Consensus(layers=neighbour_layers, sender=JID.fromstr("a1@localhost")),
+        thread=None,
+    )
+
+    async def train() -> None:
+        with model_manager.training_session():
+            # The frozen layers can be cached and sent while the model trains
+            assert agent.get_payload_cache_key(stable) is not None
+            await agent.send_local_layers(
+                neighbour=JID.fromstr("a1@localhost"),
+                request_reply=False,
+                layers=stable,
+            )
+            with torch.no_grad():
+                model_manager.model.weight.add_(1)
+
+    async def run() -> None:
+        agent.training_task = asyncio.create_task(train())
+        await state.finish_background_training()
+
+    asyncio.run(run())
+    assert agent.training_task is None
+    assert not model_manager.has_stable_layers()
+    assert agent.consensus_manager.received_consensus.qsize() == 0
+    sent = Consensus.from_message(Message(body=agent.bodies["a1@localhost"]))
+    assert torch.equal(sent.layers["weight"], stable["weight"])
+    # The consensus is merged into the trained weights
+    assert not torch.equal(model_manager.model.weight, stable["weight"] + 1)
+
+
+def test_pipelined_training_needs_a_background_executor(recording_agent) -> None:
+    with pytest.raises(ValueError):
+        recording_agent(pipelined_training=True)
+
+
+def test_pipelined_training_replies_while_training(recording_agent) -> None:
+    executor = TrainingExecutor(mode="thread")
+    agent = recording_agent(pipelined_training=True, training_executor=executor)
+    model_manager = agent.model_manager
+    state = TrainAndApplyConsensusState()
+    state.agent = agent
+    behaviour = agent.layer_receiver_behaviour
+    behaviour.agent = agent
+    release = threading.Event()
+    train = model_manager.train
+
+    def blocked_train(*args, **kwargs):
+        with model_manager.training_session():
+            release.wait(timeout=5)
+        return train(*args, **kwargs)
+
+    model_manager.train = blocked_train  # type: ignore[method-assign]
+    request = Consensus(
+        layers=OrderedDict(
+            [("weight", torch.zeros_like(model_manager.model.weight.detach()))]
+        ),
+        sender=JID.fromstr("a1@localhost"),
+        request_reply=True,
+    ).to_message()
+    request.sender = "a1@localhost"
+    request.to = "a0@localhost"
+
+    async def receive_all(behaviour, timeout=0):
+        return [
+            RfMessage.from_message(
+                request, is_multipart=False, is_multipart_completed=False
+            )
+        ]
+
+    agent.receive_all = receive_all  # type: ignore[method-assign]
+
+    async def run() -> None:
+        await state.run()
+        task = agent.training_task
+        assert task is not None
+        await asyncio.sleep(0.05)
+        assert model_manager.is_training()
+        await behaviour.run()
+        # The reply has been sent while the model is still training
+        assert "a1@localhost" in agent.bodies
+        assert not task.done()
+        release.set()
+        await state.finish_background_training()
+
+    try:
+        asyncio.run(run())
+    finally:
+        release.set()
+        executor.shutdown()
+    sent = Consensus.from_message(Message(body=agent.bodies["a1@localhost"]))
+    assert list(sent.layers.keys()) == ["weight"]
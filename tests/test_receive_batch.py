@@ -0,0 +1,85 @@
+import asyncio
+import logging
+
+from spade.message import Message
+
+from macofl.agent.base import AgentBase
+from macofl.behaviour.observer import ObserverBehaviour
+
+
+class QueueBehaviour:
+    """Stands for a behaviour with the messages already queued in its mailbox."""
+
+    def __init__(self, messages: list[Message]) -> None:
+        self.queue: asyncio.Queue[Message] = asyncio.Queue()
+        for message in messages:
+            self.queue.put_nowait(message)
+
+    async def receive(self, timeout: float | None = None) -> Message | None:
+        if timeout:
+            try:
+                return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        return None if self.queue.empty() else self.queue.get_nowait()
+
+    def mailbox_size(self) -> int:
+        return self.queue.qsize()
+
+
+def test_receive_all_drains_the_mailbox() -> None:
+    agent = AgentBase(jid="a0@localhost", password="123", max_message_size=80)
+    content = "x" * 100
+    base = Message(to="a0@localhost", sender="a1@localhost", body=content)
+
+    def build_messages() -> list[Message]:
+        parts = agent.multipart_handler.iter_multipart_messages(
+            content=content, max_size=80, message_base=base
+        )
+        single = Message(to="a0@localhost", sender="a2@localhost", body="single")
+        return list(parts) + [single]
+
+    num_parts = len(build_messages()) - 1
+
+    async def receive() -> tuple[list, list, list]:
+        behaviour = QueueBehaviour(build_messages())
+        first = await agent.receive_all(behaviour, timeout=1)
+        second = await agent.receive_all(behaviour, timeout=0.01)
+        behaviour = QueueBehaviour(build_messages())
+        limited = await agent.receive_all(behaviour, timeout=1, max_messages=num_parts)
+        return first, second, limited
+
+    first, second, limited = asyncio.run(receive())
+    assert [m.body for m in first] == [content, "single"]
+    assert first[0].is_multipart and first[0].is_multipart_completed
+    assert second == []
+    assert [m.body for m in limited] == [content]
+
+
+def test_receive_all_skips_malformed_messages() -> None:
+    agent = AgentBase(jid="a0@localhost", password="123", max_message_size=80)
+    messages = [
+        Message(to="a0@localhost", sender="a1@localhost", body="first"),
+        Message(
+            to="a0@localhost",
+            sender="a2@localhost",
+            body="multipart#3/2#12345678-1234-4123-8123-123456789012|x",
+        ),
+        Message(to="a0@localhost", sender="a3@localhost", body="last"),
+    ]
+
+    received = asyncio.run(agent.receive_all(QueueBehaviour(messages), timeout=1))
+    assert [m.body for m in received] == ["first", "last"]
+
+
+def test_observer_logs_all_queued_messages(caplog) -> None:
+    async def observe() -> None:
+        behaviour = ObserverBehaviour("rf.test.observer")
+        behaviour.queue = asyncio.Queue()
+        for i in range(25):
+            behaviour.queue.put_nowait(Message(body=f"row{i}"))
+        await behaviour.run()
+
+    with caplog.at_level(logging.INFO, logger="rf.test.observer"):
+        asyncio.run(observe())
+    assert [r.getMessage() for r in caplog.records] == [f"row{i}" for i in range(25)]
@@ -0,0 +1,218 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import OrderedDict
+
+import numpy as np
+import pytest
+import torch
+from aioxmpp import JID
+
+from macofl.similarity.assignment import LayerAssigner
+from macofl.similarity.function import EuclideanDistanceFunction
+from macofl.similarity.similarity_manager import SimilarityManager
+from macofl.similarity.similarity_vector import SimilarityVector
+
+from .test_nn_model import build_linear_model_manager
+
+
+def build_similarity_manager() -> SimilarityManager:
+    return SimilarityManager(
+        model_manager=build_linear_model_manager(),
+        function=EuclideanDistanceFunction(),
+    )
+
+
+def test_wait_similarity_vectors_wakes_up_on_response() -> None:
+    manager = build_similarity_manager()
+    neighbours = [JID.fromstr("a1@localhost"), JID.fromstr("a2@localhost")]
+    manager.clear_waiting_responses(neighbours=neighbours, thread="th")
+
+    async def run() -> tuple[bool, float]:
+        loop = asyncio.get_running_loop()
+        for i, neighbour in enumerate(neighbours):
+            vector = SimilarityVector(vector=OrderedDict({"weight": float(i)}))
+            loop.call_later(
+                0.05 * (i + 1), manager.add_similarity_vector, neighbour, vector, "th"
+            )
+        start = time.perf_counter()
+        received = await manager.wait_similarity_vectors(timeout=10)
+        return received, time.perf_counter() - start
+
+    received, seconds = asyncio.run(run())
+    assert received
+    assert seconds < 1
+    assert set(manager.similarity_vectors.keys()) == set(neighbours)
+
+
+def test_wait_similarity_vectors_timeout() -> None:
+    manager = build_similarity_manager()
+    manager.clear_waiting_responses(
+        neighbours=[JID.fromstr("a1@localhost")], thread="th"
+    )
+
+    start = time.perf_counter()
+    received = asyncio.run(manager.wait_similarity_vectors(timeout=0.2))
+    seconds = time.perf_counter() - start
+
+    assert not received
+    assert 0.2 <= seconds < 1
+
+
+def test_euclidean_distance_function() -> None:
+    layers1 = OrderedDict(
+        {
+            "weight": torch.randn((4, 3)),
+            "bias": torch.randn((4,)),
+            "half": torch.randn((2, 2)).half(),
+            "num_batches_tracked": torch.tensor(3),
+        }
+    )
+    layers2 = OrderedDict(
+        {
+            "weight": torch.randn((4, 3)),
+            "bias": torch.randn((4,)),
+            "half": torch.randn((2, 2)).half(),
+            "num_batches_tracked": torch.tensor(7),
+        }
+    )
+    vector = EuclideanDistanceFunction().get_similarity_vector(layers1, layers2)
+    assert list(vector.vector.keys()) == list(layers1.keys())
+    for name in ["weight", "bias", "half"]:
+        expected = torch.norm(layers1[name] - layers2[name]).item()
+        assert vector.vector[name] == pytest.approx(expected, rel=1e-3)
+    assert vector.vector["num_batches_tracked"] == 4
+
+
+def test_own_similarity_vector_cached_by_model_version() -> None:
+    manager = build_similarity_manager()
+    calls = 0
+    function = manager.function
+    assert function is not None
+    get_similarity_vector = function.get_similarity_vector
+
+    def counting_function(*args, **kwargs) -> SimilarityVector:
+        nonlocal calls
+        calls += 1
+        return get_similarity_vector(*args, **kwargs)
+
+    function.get_similarity_vector = counting_function  # type: ignore
+    first = manager.get_own_similarity_vector()
+    second = manager.get_own_similarity_vector()
+    assert first is not None and second is not None
+    assert calls == 1
+    assert first is not second
+    assert first.vector == second.vector
+    first.request_reply = True
+    first.vector["weight"] = -1.0
+    third = manager.get_own_similarity_vector()
+    assert third is not None
+    assert not third.request_reply
+    assert third.vector == second.vector
+
+    manager.model_manager.train(epochs=1)
+    trained = manager.get_own_similarity_vector()
+    assert trained is not None
+    assert calls == 2
+    assert trained.vector != second.vector
+
+
+def build_vector(values: dict[str, float]) -> SimilarityVector:
+    return SimilarityVector(vector=OrderedDict(values))
+
+
+def test_layer_assigner_min_matches_loop() -> None:
+    names = [f"l{i}" for i in range(6)]
+    generator = torch.Generator().manual_seed(3)
+    own = build_vector(dict(zip(names, torch.rand(6, generator=generator).tolist())))
+    neighbours = [JID.fromstr(f"a{i}@localhost") for i in range(20)]
+    vectors = {
+        n: build_vector(dict(zip(names, torch.rand(6, generator=generator).tolist())))
+        for n in neighbours
+    }
+    result = LayerAssigner(criterion="min").assign(own, vectors, neighbours)
+    for n in neighbours:
+        expected = min(names, key=lambda l: abs(own.vector[l] - vectors[n].vector[l]))
+        assert result[n] == [expected]
+
+
+def test_layer_assigner_top_k_and_max() -> None:
+    own = build_vector({"a": 0.0, "b": 0.0, "c": 0.0, "d": 0.0})
+    neighbour = JID.fromstr("a1@localhost")
+    vectors = {neighbour: build_vector({"a": 4.0, "b": -1.0, "c": 3.0, "d": 2.0})}
+    assert LayerAssigner("min", k=2).assign(own, vectors, [neighbour]) == {
+        neighbour: ["b", "d"]
+    }
+    assert LayerAssigner("max", k=2).assign(own, vectors, [neighbour]) == {
+        neighbour: ["a", "c"]
+    }
+    assert LayerAssigner("min", k=10).assign(own, vectors, [neighbour]) == {
+        neighbour: ["a", "b", "c", "d"]
+    }
+
+
+def test_layer_assigner_missing_values() -> None:
+    own = build_vector({"a": 0.0, "b": 0.0})
+    partial = JID.fromstr("a1@localhost")
+    unknown = JID.fromstr("a2@localhost")
+    vectors = {partial: build_vector({"b": 5.0})}
+    result = LayerAssigner("min", k=2).assign(own, vectors, [partial, unknown])
+    assert result == {partial: ["b"]}
+    with pytest.raises(ValueError):
+        LayerAssigner("median")
+
+
+def test_binary_similarity_vector_negotiates_layer_table() -> None:
+    sender_manager = build_similarity_manager()
+    receiver_manager = SimilarityManager(model_manager=build_linear_model_manager())
+    sender = JID.fromstr("a0@localhost")
+    receiver = JID.fromstr("a1@localhost")
+    vector = SimilarityVector(
+        vector=OrderedDict({"layer.weight": 0.25, "layer.bias": 1.5}),
+        request_reply=True,
+        algorithm_iteration=3,
+        sent_time_z=datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+    )
+
+    def send() -> SimilarityVector:
+        msg = sender_manager.encode_vector(vector=vector, neighbour=receiver)
+        msg.sender = str(sender)
+        return receiver_manager.decode_vector(msg)
+
+    first_body = sender_manager.encode_vector(vector=vector, neighbour=receiver).body
+    second_body = sender_manager.encode_vector(vector=vector, neighbour=receiver).body
+    assert len(second_body) < len(first_body)
+    assert len(second_body) < len(vector.to_message().body)
+
+    sender_manager.forget_neighbour(receiver)
+    received = send()
+    assert received.values is not None
+    assert received.values.dtype == np.float32
+    assert received.vector == OrderedDict({"layer.weight": 0.25, "layer.bias": 1.5})
+    assert received.request_reply
+    assert received.algorithm_iteration == 3
+    assert received.sent_time_z == vector.sent_time_z
+    assert received.owner == sender
+    # The table is not sent again
+    assert send().vector == received.vector
+
+
+def test_binary_similarity_vector_requests_unknown_layer_table() -> None:
+    sender_manager = build_similarity_manager()
+    receiver_manager = build_similarity_manager()
+    sender = JID.fromstr("a0@localhost")
+    receiver = JID.fromstr("a1@localhost")
+    vector = SimilarityVector(vector=OrderedDict({"x": 1.0, "y": 2.0}))
+    sender_manager.encode_vector(vector=vector, neighbour=receiver)  # lost
+    msg = sender_manager.encode_vector(vector=vector, neighbour=receiver)
+    msg.sender = str(sender)
+    with pytest.raises(ValueError):
+        receiver_manager.decode_vector(msg)
+
+    # The receiver asks for the table with its next vector, then the sender sends it again
+    reply = receiver_manager.encode_vector(vector=vector, neighbour=sender)
+    reply.sender = str(receiver)
+    assert sender_manager.decode_vector(reply).request_layer_table
+    msg = sender_manager.encode_vector(vector=vector, neighbour=receiver)
+    msg.sender = str(sender)
+    assert receiver_manager.decode_vector(msg).vector == vector.vector
@@ -0,0 +1,67 @@
+import asyncio
+import copy
+
+import pytest
+import torch
+
+from macofl.nn.executor import TrainingExecutor
+
+from .test_nn_model import build_linear_model_manager
+
+
+@pytest.mark.parametrize("mode", TrainingExecutor.MODES)
+def test_executor_trains_model(mode: str) -> None:
+    model_manager = build_linear_model_manager()
+    initial_weights = copy.deepcopy(model_manager.model.state_dict())
+    executor = TrainingExecutor(mode=mode, max_workers=1)
+    logged_epochs: list[int] = []
+
+    async def run():
+        metrics = await executor.train(
+            model_manager=model_manager,
+            train_logger=lambda epoch, *_: logged_epochs.append(epoch),
+            agent_jid="agent@localhost",
+            current_round=1,
+        )
+        validation = await executor.inference(model_manager)
+        test = await executor.test_inference(model_manager)
+        return metrics, validation, test
+
+    try:
+        metrics, validation, test = asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert len(metrics) == model_manager.training_epochs
+    assert logged_epochs == [1, 2]
+    assert 0 <= validation.accuracy <= 1 and 0 <= test.accuracy <= 1
+    assert not model_manager.is_training()
+    assert not torch.equal(initial_weights["weight"], model_manager.model.weight)
+
+
+def test_thread_executor_does_not_block_event_loop() -> None:
+    model_manager = build_linear_model_manager(samples=4096)
+    executor = TrainingExecutor(mode="thread", max_workers=1)
+    ticks: list[int] = []
+
+    async def ticker():
+        while True:
+            ticks.append(1)
+            await asyncio.sleep(0)
+
+    async def run():
+        task = asyncio.create_task(ticker())
+        await executor.train(model_manager=model_manager, epochs=3)
+        task.cancel()
+
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert len(ticks) > 1
+
+
+def test_invalid_executor_mode() -> None:
+    with pytest.raises(ValueError):
+        TrainingExecutor(mode="gpu")